@@ -0,0 +1 @@
+"""Performance benchmarks for Project MasterMind (not part of the test suite)."""
@@ -0,0 +1,62 @@
+"""Gedeelde helpers voor de benchmarks: percentielen en opslag van resultaten."""
+import json
+import os
+import platform
+import time
+from typing import Any, Dict, List, Sequence
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Percentiel met lineaire interpolatie (pct tussen 0 en 100)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """Vat latency samples (in seconden) samen als milliseconden"""
+    return {
+        "count": len(samples),
+        "mean_ms": 1000 * sum(samples) / len(samples) if samples else 0.0,
+        "p50_ms": 1000 * percentile(samples, 50),
+        "p95_ms": 1000 * percentile(samples, 95),
+        "p99_ms": 1000 * percentile(samples, 99),
+        "max_ms": 1000 * max(samples) if samples else 0.0,
+    }
+
+
+def save_results(name: str, results: Dict[str, Any]) -> str:
+    """Schrijf resultaten als JSON naar benchmarks/results/<name>-<timestamp>.json"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    payload = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    return path
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    """Print een lijst van dicts als eenvoudige tabel"""
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).ljust(widths[c]) for c in columns))
+
+
+def _fmt(value: Any) -> str:
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
@@ -0,0 +1,82 @@
+"""Embedding backend benchmark: throughput en per-request latency.
+
+Voor elke backend wordt gemeten:
+  - load_seconds:   model laden + eerste encode
+  - sentences_per_s: doorvoer bij batches van --batch-size zinnen
+  - p50/p99_ms:     latency van één losse zin (zoals per /chat request)
+
+Backends waarvan de dependencies ontbreken worden overgeslagen.
+
+Gebruik:
+    python -m benchmarks.bench_embeddings [--backends hash,sentence-transformers,onnx-int8]
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from mastermind.embeddings import create_embedding_backend
+
+from ._common import print_table, save_results, summarize
+
+_WORDS = (
+    "memory vector retrieval agent context strategy worker python code model "
+    "latency token cluster knowledge query embedding database server request"
+).split()
+
+
+def make_sentences(count: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(_WORDS, k=rng.randint(8, 40))) for _ in range(count)]
+
+
+def bench_backend(name: str, sentences: List[str], batch_size: int, single_runs: int) -> Dict[str, Any]:
+    backend = create_embedding_backend(name)
+
+    start = time.perf_counter()
+    backend.encode(["warmup"])
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, len(sentences), batch_size):
+        backend.encode(sentences[offset:offset + batch_size])
+    throughput = len(sentences) / (time.perf_counter() - start)
+
+    latencies = []
+    for sentence in sentences[:single_runs]:
+        start = time.perf_counter()
+        backend.encode([sentence])
+        latencies.append(time.perf_counter() - start)
+    stats = summarize(latencies)
+
+    return {
+        "backend": name,
+        "dimension": backend.dimension,
+        "load_seconds": load_seconds,
+        "sentences_per_s": throughput,
+        "p50_ms": stats["p50_ms"],
+        "p99_ms": stats["p99_ms"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", default="hash,sentence-transformers,onnx,onnx-int8")
+    parser.add_argument("--sentences", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--single-runs", type=int, default=200)
+    args = parser.parse_args()
+
+    sentences = make_sentences(args.sentences)
+    rows = []
+    for name in args.backends.split(","):
+        try:
+            rows.append(bench_backend(name.strip(), sentences, args.batch_size, args.single_runs))
+        except Exception as e:  # Ontbrekende dependency of model: rapporteren en doorgaan
+            print(f"Skipping {name}: {type(e).__name__}: {e}")
+    print_table(rows)
+    print(f"Results saved to {save_results('embeddings', {'rows': rows})}")
+
+
+if __name__ == "__main__":
+    main()
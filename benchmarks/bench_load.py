@@ -0,0 +1,157 @@
+"""Load test van /chat, /process_message en Orchestrator.process_task.
+
+Start een lokale nep Messages API (zie fake_anthropic) en stuurt daar alle
+LLM calls naartoe via ANTHROPIC_BASE_URL. De server draait in-process
+(ASGI, inclusief lifespan) op een tijdelijke database met de hash embedding
+backend, zodat de meting over de eigen overhead en concurrency gaat en niet
+over het embedding model. Per target wordt gerapporteerd:
+  - throughput_rps: geslaagde requests per seconde
+  - p50/p95/p99_ms: latency per request
+  - errors:         mislukte requests (na de retries van de SDK)
+
+Gebruik:
+    python -m benchmarks.bench_load [--targets chat,process_message,orchestrator]
+        [--requests 200] [--concurrency 16] [--latency-ms 200] [--error-rate 0.05]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from ._common import print_table, save_results, summarize
+from .fake_anthropic import FakeAnthropicServer, add_arguments, config_from_args
+
+TARGETS = ("chat", "process_message", "orchestrator")
+
+_PROMPTS = [
+    "Hoe schaal ik de vector database naar een miljoen herinneringen?",
+    "Schrijf een plan voor het parallel uitvoeren van MCP tools.",
+    "Welke latency verwacht je van een embedding per request?",
+    "Vat de strategie samen voor het cachen van context.",
+]
+
+
+async def run_load(
+    call: Callable[[int], Awaitable[bool]],
+    requests: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Voer requests calls uit met maximaal concurrency tegelijk"""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal errors, next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                ok = await call(index)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    stats = summarize(latencies)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": stats["p50_ms"],
+        "p95_ms": stats["p95_ms"],
+        "p99_ms": stats["p99_ms"],
+    }
+
+
+async def bench_server(targets: List[str], requests: int, concurrency: int) -> List[Dict[str, Any]]:
+    import httpx
+    from mastermind import server
+
+    rows = []
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://mastermind", timeout=120) as http:
+            if "chat" in targets:
+                async def chat(i: int) -> bool:
+                    response = await http.post("/chat", json={"message": _PROMPTS[i % len(_PROMPTS)]})
+                    return response.status_code == 200
+                rows.append({"target": "chat", **await run_load(chat, requests, concurrency)})
+
+            if "process_message" in targets:
+                async def process_message(i: int) -> bool:
+                    response = await http.post("/process_message", json={
+                        "apiKey": "fake-key",
+                        "message": _PROMPTS[i % len(_PROMPTS)],
+                        "model": "claude-3-haiku"
+                    })
+                    return response.status_code == 200
+                rows.append({"target": "process_message", **await run_load(process_message, requests, concurrency)})
+    return rows
+
+
+async def bench_orchestrator(requests: int, concurrency: int, workers: int) -> Dict[str, Any]:
+    from mastermind.core import Orchestrator
+
+    orchestrator = Orchestrator(api_key="fake-key")
+    for _ in range(workers):
+        orchestrator.add_worker()
+
+    async def process(i: int) -> bool:
+        result = await orchestrator.process_task(_PROMPTS[i % len(_PROMPTS)])
+        return result.success
+
+    # Elke run doet 2 + workers LLM calls; minder runs houden de duur vergelijkbaar
+    runs = max(1, requests // (2 + workers))
+    return {"target": f"orchestrator({workers} workers)", **await run_load(process, runs, concurrency)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=3, help="workers per orchestrator")
+    parser.add_argument("--embedding-backend", default="hash")
+    add_arguments(parser)
+    args = parser.parse_args()
+    targets = [t.strip() for t in args.targets.split(",")]
+
+    config = config_from_args(args)
+    with FakeAnthropicServer(config) as fake:
+        # Vóór het importeren van de server: die leest deze variabelen bij import
+        os.environ["ANTHROPIC_BASE_URL"] = fake.url
+        os.environ.setdefault("ANTHROPIC_API_KEY", "fake-key")
+        os.environ["MASTERMIND_EMBEDDING_BACKEND"] = args.embedding_backend
+        os.environ["MASTERMIND_MODEL_PRELOAD"] = "eager"
+        os.environ.setdefault("MASTERMIND_LOG_LEVEL", "WARNING")
+        os.environ["MASTERMIND_DATABASE_URL"] = (
+            f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_load.db')}"
+        )
+
+        async def run_all() -> List[Dict[str, Any]]:
+            rows = await bench_server(targets, args.requests, args.concurrency)
+            if "orchestrator" in targets:
+                rows.append(await bench_orchestrator(args.requests, args.concurrency, args.workers))
+            return rows
+
+        rows = asyncio.run(run_all())
+        llm_requests = fake.requests
+
+    print_table(rows)
+    print(f"Fake API served {llm_requests} requests")
+    results = {"config": vars(config), "rows": rows}
+    print(f"Results saved to {save_results('load', results)}")
+
+
+if __name__ == "__main__":
+    main()
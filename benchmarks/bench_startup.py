@@ -0,0 +1,91 @@
+"""Import-time en cold-start benchmark.
+
+Meet in verse subprocessen hoe lang imports duren en welke zware modules
+(torch, sentence_transformers, sqlalchemy) ze meeslepen, plus de tijd tot
+de eerste embedding (model laden + eerste encode).
+
+Gebruik:
+    python -m benchmarks.bench_startup [--repeat 5] [--skip-model]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from ._common import print_table, save_results
+
+HEAVY_MODULES = ["mastermind.server", "sentence_transformers", "torch", "sqlalchemy", "anthropic"]
+
+IMPORT_TARGETS = [
+    "mastermind",
+    "mastermind.core",
+    "mastermind.mcp",
+    "mastermind.knowledge_cluster",
+    "mastermind.server",
+]
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_COLD_START_SNIPPET = """
+import asyncio, json, time
+start = time.perf_counter()
+from mastermind.knowledge_cluster import KnowledgeCluster
+cluster = KnowledgeCluster()
+constructed = time.perf_counter()
+asyncio.run(cluster.get_vector_embedding("cold start"))
+first = time.perf_counter()
+asyncio.run(cluster.get_vector_embedding("warm"))
+warm = time.perf_counter()
+print(json.dumps({
+    "construct_seconds": constructed - start,
+    "first_embedding_seconds": first - constructed,
+    "warm_embedding_seconds": warm - first,
+}))
+"""
+
+
+def _run(snippet: str) -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, "-c", snippet], capture_output=True, text=True, check=True
+    ).stdout
+    return dict(json.loads(output.strip().splitlines()[-1]))
+
+
+def bench_imports(repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    for target in IMPORT_TARGETS:
+        runs = [_run(_IMPORT_SNIPPET.format(target=target, heavy=HEAVY_MODULES)) for _ in range(repeat)]
+        rows.append({
+            "import": target,
+            "median_ms": 1000 * statistics.median(r["seconds"] for r in runs),
+            "heavy_modules": ",".join(runs[-1]["loaded"]) or "-",
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-model", action="store_true", help="sla de cold-start meting over")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {"imports": bench_imports(args.repeat)}
+    print_table(results["imports"])
+
+    if not args.skip_model:
+        results["cold_start"] = _run(_COLD_START_SNIPPET)
+        print(json.dumps(results["cold_start"], indent=2))
+
+    print(f"Results saved to {save_results('startup', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Micro-benchmarks voor embedding, query_vectors en cleanup_vectors.
+
+Per tabelgrootte (standaard 10k, 100k en 1M rijen) wordt een eigen
+collectie in een tijdelijke SQLite database gevuld met willekeurige
+genormaliseerde vectoren (direct via executemany, dus zonder embedden).
+Daarna wordt gemeten:
+  - query_ms:   query_vectors met een query embedding (p50/p95/p99)
+  - filtered:   idem, met een categoriefilter dat ~10% van de rijen raakt
+  - cleanup_s:  cleanup_vectors die ~5% van de rijen verwijdert
+Los daarvan meet de embedding stap de doorvoer van get_vector_embeddings.
+
+Gebruik:
+    python -m benchmarks.bench_vectordb [--rows 10000,100000,1000000]
+        [--dimension 384] [--queries 20] [--embedding-backend hash]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ._common import print_table, save_results, summarize
+
+CATEGORIES = [f"category_{i}" for i in range(10)]
+INSERT_BATCH = 10_000
+
+
+async def fill_collection(collection: str, rows: int, dimension: int, seed: int = 42) -> float:
+    """Vul een collectie met rows willekeurige vectoren; geeft de duur in seconden"""
+    from mastermind.database import Memory, engine
+
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        for offset in range(0, rows, INSERT_BATCH):
+            count = min(INSERT_BATCH, rows - offset)
+            vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            importance = rng.random(count)
+            await conn.execute(Memory.__table__.insert(), [
+                {
+                    "content": f"memory {offset + i}",
+                    "category": CATEGORIES[(offset + i) % len(CATEGORIES)],
+                    "importance": float(importance[i]),
+                    "collection": collection,
+                    "embedding": vectors[i].tobytes(),
+                }
+                for i in range(count)
+            ])
+    return time.perf_counter() - start
+
+
+async def bench_size(rows: int, dimension: int, queries: int) -> Dict[str, Any]:
+    from mastermind.vectordb import VectorDatabase
+
+    collection = f"bench_{rows}"
+    fill_seconds = await fill_collection(collection, rows, dimension)
+    db = VectorDatabase(collection_name=collection)
+    rng = np.random.default_rng(7)
+    query_vectors = rng.standard_normal((queries, dimension)).astype(np.float32)
+
+    plain: List[float] = []
+    filtered: List[float] = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        await db.query_vectors(n_results=5, query_embedding=vector.tolist())
+        plain.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await db.query_vectors(n_results=5, query_embedding=vector.tolist(), category=CATEGORIES[0])
+        filtered.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    deleted = await db.cleanup_vectors(min_importance=0.05)
+    cleanup_seconds = time.perf_counter() - start
+
+    plain_stats, filtered_stats = summarize(plain), summarize(filtered)
+    return {
+        "rows": rows,
+        "fill_s": fill_seconds,
+        "query_p50_ms": plain_stats["p50_ms"],
+        "query_p95_ms": plain_stats["p95_ms"],
+        "query_p99_ms": plain_stats["p99_ms"],
+        "filtered_p50_ms": filtered_stats["p50_ms"],
+        "filtered_p99_ms": filtered_stats["p99_ms"],
+        "cleanup_s": cleanup_seconds,
+        "deleted": len(deleted),
+    }
+
+
+async def bench_embedding(backend: str, batches: int, batch_size: int) -> Dict[str, Any]:
+    from mastermind.embeddings import create_embedding_backend
+    from mastermind.knowledge_cluster import KnowledgeCluster
+
+    cluster = KnowledgeCluster(embedding_backend=create_embedding_backend(backend))
+    await cluster.warmup()
+    texts = [f"benchmark sentence {i} about vector retrieval latency" for i in range(batch_size)]
+
+    single: List[float] = []
+    for text in texts[:50]:
+        start = time.perf_counter()
+        await cluster.get_vector_embedding(text)
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(batches):
+        await cluster.get_vector_embeddings(texts)
+    elapsed = time.perf_counter() - start
+    stats = summarize(single)
+    return {
+        "backend": backend,
+        "texts_per_s": batches * batch_size / elapsed,
+        "single_p50_ms": stats["p50_ms"],
+        "single_p99_ms": stats["p99_ms"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000,1000000")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--embedding-backend", default="hash")
+    parser.add_argument("--embedding-batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    # Vóór het importeren van mastermind.database, dat de URL bij import leest
+    os.environ["MASTERMIND_DATABASE_URL"] = (
+        f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_vectordb.db')}"
+    )
+
+    async def run_all() -> Dict[str, Any]:
+        from mastermind.database import init_db
+
+        await init_db()
+        embedding = await bench_embedding(args.embedding_backend, args.embedding_batches, args.batch_size)
+        sizes = []
+        for rows in (int(r) for r in args.rows.split(",")):
+            sizes.append(await bench_size(rows, args.dimension, args.queries))
+            print(f"  {rows} rows done")
+        return {"embedding": [embedding], "rows": sizes}
+
+    results = asyncio.run(run_all())
+    print_table(results["embedding"])
+    print_table(results["rows"])
+    print(f"Results saved to {save_results('vectordb', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Vergelijk benchmark resultaten met een eerdere run.
+
+Zoekt standaard de twee nieuwste resultaten van een benchmark in
+benchmarks/results/ en vergelijkt alle numerieke kolommen per rij (rijen
+worden gekoppeld op hun eerste kolom, bijvoorbeeld target of rows).
+Kolommen op _ms/_s/_seconds zijn lager-is-beter, kolommen op _rps/_per_s
+hoger-is-beter; andere kolommen worden alleen getoond. Een verslechtering
+groter dan --threshold procent geeft exit code 1, zodat dit in CI kan.
+
+Gebruik:
+    python -m benchmarks.compare load [--baseline FILE] [--current FILE] [--threshold 10]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from ._common import RESULTS_DIR, print_table
+
+LOWER_IS_BETTER = ("_ms", "_s", "_seconds")
+HIGHER_IS_BETTER = ("_rps", "_per_s")
+
+
+def result_files(name: str) -> List[str]:
+    """Resultaatbestanden van een benchmark, oudste eerst"""
+    return sorted(glob.glob(os.path.join(RESULTS_DIR, f"{name}-*.json")))
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return dict(json.load(f))
+
+
+def _tables(results: Dict[str, Any]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Tabel naam -> rij sleutel -> rij, voor alle lijsten van dicts in de resultaten"""
+    tables = {}
+    for table, rows in results.items():
+        if isinstance(rows, list) and rows and isinstance(rows[0], dict):
+            key = next(iter(rows[0]))
+            tables[table] = {str(row[key]): row for row in rows}
+    return tables
+
+
+def direction(column: str) -> int:
+    """-1 als lager beter is, 1 als hoger beter is, 0 als onbekend"""
+    if column.endswith(HIGHER_IS_BETTER):
+        return 1
+    if column.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Vergelijk twee resultaatbestanden; geeft tabelrijen en het aantal regressies"""
+    rows = []
+    regressions = 0
+    old_tables = _tables(baseline["results"])
+    for table, current_rows in _tables(current["results"]).items():
+        for key, row in current_rows.items():
+            old_row = old_tables.get(table, {}).get(key)
+            if old_row is None:
+                continue
+            for column, value in row.items():
+                old = old_row.get(column)
+                sign = direction(column)
+                if not sign or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                    continue
+                change = 100.0 * (value - old) / abs(old)
+                regressed = sign * change < -threshold
+                regressions += regressed
+                rows.append({
+                    "table": table,
+                    "row": key,
+                    "metric": column,
+                    "baseline": float(old),
+                    "current": float(value),
+                    "change_%": change,
+                    "status": "REGRESSION" if regressed else "ok",
+                })
+    return rows, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", help="naam van de benchmark, bijvoorbeeld load of vectordb")
+    parser.add_argument("--baseline", help="resultaatbestand om mee te vergelijken")
+    parser.add_argument("--current", help="resultaatbestand dat vergeleken wordt (standaard het nieuwste)")
+    parser.add_argument("--threshold", type=float, default=10.0, help="toegestane verslechtering in procent")
+    args = parser.parse_args()
+
+    files = result_files(args.benchmark)
+    current: Optional[str] = args.current or (files[-1] if files else None)
+    baseline: Optional[str] = args.baseline or next((f for f in reversed(files) if f != current), None)
+    if not current or not baseline:
+        sys.exit(f"Need two results for '{args.benchmark}' in {RESULTS_DIR}")
+
+    rows, regressions = compare(_load(baseline), _load(current), args.threshold)
+    print(f"Baseline: {baseline}\nCurrent:  {current}")
+    print_table(rows)
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Lokale nep Messages API voor load tests en benchmarks.
+
+Beantwoordt POST /v1/messages met een geldig Messages API antwoord, na een
+configureerbare vertraging (basis latency + jitter + output tokens gedeeld
+door de token rate) en met een configureerbaar foutpercentage (529
+overloaded of 500). Input tokens worden geschat uit de prompt, zodat usage
+en kosten in de server realistisch meetellen.
+
+Prompt caching wordt nagebootst: prefixes tot een cache_control breakpoint
+worden onthouden, een herhaalde prefix telt als cache read en alleen de
+niet-gecachete input tokens kosten prefill tijd (--prefill-tokens-per-s).
+
+Als los proces:
+    python -m benchmarks.fake_anthropic --port 8765 --latency-ms 400 --tokens-per-s 80
+
+In-process (zie bench_load):
+    with FakeAnthropicServer(FakeConfig(latency_ms=50)) as fake:
+        os.environ["ANTHROPIC_BASE_URL"] = fake.url
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from mastermind.chunking import estimate_tokens
+
+
+@dataclass
+class FakeConfig:
+    """Gedrag van de nep API
+
+    :param latency_ms: Vaste vertraging per request (tijd tot eerste token)
+    :param jitter_ms: Uniforme extra vertraging tussen 0 en jitter_ms
+    :param tokens_per_s: Generatiesnelheid; 0 betekent direct antwoorden
+    :param output_tokens: Aantal output tokens per antwoord (begrensd door max_tokens)
+    :param error_rate: Fractie requests die met een fout antwoorden
+    :param seed: Seed voor reproduceerbare jitter en fouten
+    :param prefill_tokens_per_s: Verwerkingssnelheid van niet-gecachete
+        input tokens; 0 betekent geen prefill vertraging
+    :param cache_min_tokens: Kortere prefixes worden niet gecachet
+    :param cache_ttl_s: Levensduur van een gecachete prefix
+    :param slow_rate: Fractie requests met slow_ms extra vertraging (tail latency)
+    :param slow_ms: Extra vertraging van een trage request
+    """
+    latency_ms: float = 200.0
+    jitter_ms: float = 50.0
+    tokens_per_s: float = 100.0
+    output_tokens: int = 200
+    error_rate: float = 0.0
+    seed: Optional[int] = 42
+    prefill_tokens_per_s: float = 0.0
+    cache_min_tokens: int = 1024
+    cache_ttl_s: float = 300.0
+    slow_rate: float = 0.0
+    slow_ms: float = 2000.0
+
+
+def _error(status: int, error_type: str, message: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"type": "error", "error": {"type": error_type, "message": message}}
+    )
+
+
+def _prompt_blocks(body: Dict[str, Any]) -> List[Tuple[str, bool]]:
+    """(tekst, breakpoint) per blok in de volgorde waarin de API ze cachet"""
+    def blocks(content: Any) -> List[Tuple[str, bool]]:
+        if not isinstance(content, list):
+            return [(str(content), False)]
+        return [
+            (str(block.get("text", "")), "cache_control" in block) if isinstance(block, dict) else (str(block), False)
+            for block in content
+        ]
+
+    result = blocks(body["system"]) if body.get("system") else []
+    for message in body.get("messages", []):
+        result.extend(blocks(message["content"]))
+    return result
+
+
+class _PromptCache:
+    """Onthoudt prefixes tot breakpoints, zoals de API (met 20 blokken terugkijken)"""
+
+    LOOKBACK = 20
+
+    def __init__(self, config: FakeConfig) -> None:
+        self.config = config
+        self._expires: Dict[str, float] = {}
+
+    def account(self, blocks: List[Tuple[str, bool]]) -> Tuple[int, int, int]:
+        """Geeft (input, cache_write, cache_read) tokens"""
+        digest = hashlib.sha256()
+        keys, totals = [], []
+        total = 0
+        for text, _ in blocks:
+            digest.update(text.encode("utf-8") + b"\0")
+            keys.append(digest.hexdigest())
+            total += estimate_tokens(text)
+            totals.append(total)
+        breakpoints = [
+            i for i, (_, cached) in enumerate(blocks)
+            if cached and totals[i] >= self.config.cache_min_tokens
+        ]
+        if not breakpoints:
+            return total, 0, 0
+
+        now = time.monotonic()
+        last = breakpoints[-1]
+        read = 0
+        for i in range(last, max(-1, last - self.LOOKBACK), -1):
+            if self._expires.get(keys[i], 0) > now:
+                read = totals[i]
+                break
+        for i in breakpoints:
+            self._expires[keys[i]] = now + self.config.cache_ttl_s
+        return total - totals[last], totals[last] - read, read
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake Anthropic Messages API")
+    rng = random.Random(config.seed)
+    cache = _PromptCache(config)
+    app.state.requests = 0
+
+    @app.post("/v1/messages")
+    async def messages(request: Request) -> Any:
+        body: Dict[str, Any] = await request.json()
+        app.state.requests += 1
+        input_tokens, cache_write, cache_read = cache.account(_prompt_blocks(body))
+        output_tokens = min(config.output_tokens, int(body.get("max_tokens", config.output_tokens)))
+        delay = config.latency_ms + rng.uniform(0, config.jitter_ms)
+        if config.prefill_tokens_per_s > 0:
+            delay += 1000 * (input_tokens + cache_write) / config.prefill_tokens_per_s
+        if config.tokens_per_s > 0:
+            delay += 1000 * output_tokens / config.tokens_per_s
+        if config.slow_rate > 0 and rng.random() < config.slow_rate:
+            delay += config.slow_ms
+        failed = rng.random() < config.error_rate
+        await asyncio.sleep(delay / 1000)
+
+        if failed:
+            if rng.random() < 0.5:
+                return _error(529, "overloaded_error", "Overloaded")
+            return _error(500, "api_error", "Internal server error")
+
+        text = " ".join(["lorem"] * output_tokens)
+        return {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn" if output_tokens < int(body.get("max_tokens", 1 << 30)) else "max_tokens",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cache_creation_input_tokens": cache_write,
+                "cache_read_input_tokens": cache_read
+            }
+        }
+
+    return app
+
+
+class FakeAnthropicServer:
+    """Draait de nep API met uvicorn in een achtergrond thread"""
+
+    def __init__(self, config: Optional[FakeConfig] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or FakeConfig()
+        self.app = create_app(self.config)
+        self.host = host
+        self.port = port or _free_port(host)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=self.port, log_level="warning"))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def requests(self) -> int:
+        return int(self.app.state.requests)
+
+    def __enter__(self) -> "FakeAnthropicServer":
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake Anthropic server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.should_exit = True
+        if self._thread:
+            self._thread.join(timeout=10)
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return int(sock.getsockname()[1])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """CLI opties voor FakeConfig, gedeeld met bench_load"""
+    defaults = FakeConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--tokens-per-s", type=float, default=defaults.tokens_per_s)
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=defaults.prefill_tokens_per_s)
+    parser.add_argument("--cache-min-tokens", type=int, default=defaults.cache_min_tokens)
+    parser.add_argument("--slow-rate", type=float, default=defaults.slow_rate)
+    parser.add_argument("--slow-ms", type=float, default=defaults.slow_ms)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_s=args.tokens_per_s,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        prefill_tokens_per_s=args.prefill_tokens_per_s,
+        cache_min_tokens=args.cache_min_tokens,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
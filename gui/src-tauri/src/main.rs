@@ -15,7 +15,8 @@ use serde::{Deserialize, Serialize};
 #[derive(Serialize, Deserialize)]
 struct MessageResponse {
     content: String,
-    memories: Vec<String>,
+    memories: Vec<serde_json::Value>,
+    session_id: Option<String>,
 }
 
 // This command is specific to macOS
@@ -51,7 +52,7 @@ fn get_api_key() -> String {
 }
 
 #[tauri::command]
-async fn process_message(api_key: String, message: String, context: String, model: String) -> Result<MessageResponse, String> {
+async fn process_message(api_key: String, message: String, context: String, model: String, session_id: Option<String>) -> Result<MessageResponse, String> {
     // Proxy het verzoek naar de Python backend
     let client = reqwest::Client::new();
     let response = client
@@ -60,7 +61,8 @@ async fn process_message(api_key: String, message: String, context: String, mode
             "apiKey": api_key,
             "message": message,
             "context": context,
-            "model": model
+            "model": model,
+            "sessionId": session_id
         }))
         .send()
         .await
@@ -1,10 +1,15 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { Database, Circle, ChevronRight, ChevronLeft, Star, StarOff } from 'lucide-react';
 import { useStore } from '../store';
 
 export const MemoryPanel: React.FC = () => {
   const [collapsed, setCollapsed] = useState(false);
-  const { memories, updateMemoryImportance } = useStore();
+  const { memories, memoryCursor, isLoadingMemories, loadMemories, updateMemoryImportance } = useStore();
+
+  // First page from the server; further pages via "Load more"
+  useEffect(() => {
+    loadMemories(true);
+  }, [loadMemories]);
   
   // Group memories by category
   const groupedMemories = memories.reduce((groups, memory) => {
@@ -109,7 +114,20 @@ export const MemoryPanel: React.FC = () => {
           </div>
         ))}
         
-        {memories.length === 0 && !collapsed && (
+        {memoryCursor !== null && memoryCursor !== undefined && !collapsed && (
+          <div className="p-2">
+            <button
+              onClick={() => loadMemories()}
+              disabled={isLoadingMemories}
+              className="w-full py-2 text-sm rounded-lg bg-gray-200 dark:bg-gray-700 dark:text-white
+                         hover:bg-gray-300 dark:hover:bg-gray-600 disabled:opacity-50"
+            >
+              {isLoadingMemories ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
+        
+        {memories.length === 0 && !isLoadingMemories && !collapsed && (
           <div className="text-center text-gray-500 dark:text-gray-400 p-4">
             No memories yet
           </div>
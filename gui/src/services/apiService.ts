@@ -29,3 +29,64 @@ export const chatService = {
     }
   }
 };
+
+/** Memory zoals GET /memories hem streamt (één JSON object per regel) */
+export interface MemoryRecord {
+  id: number;
+  content: string;
+  category: string;
+  importance: number;
+  collection: string | null;
+  attributes: Record<string, any> | null;
+  created_at: string | null;
+  updated_at: string | null;
+}
+
+export interface MemoryPage {
+  memories: MemoryRecord[];
+  /** Cursor voor de volgende pagina, null als er niets meer is */
+  nextCursor: number | null;
+}
+
+export const memoryService = {
+  /**
+   * Haal één pagina herinneringen op. De NDJSON stream wordt regel voor regel
+   * verwerkt; de laatste regel bevat de cursor voor de volgende pagina.
+   */
+  async fetchMemories(
+    params: { cursor?: number; limit?: number; category?: string } = {}
+  ): Promise<MemoryPage> {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined) query.set(key, String(value));
+    });
+    const response = await fetch(`${API_BASE_URL}/memories?${query}`);
+    if (!response.ok || !response.body) {
+      throw new Error(`Memories API Error: ${response.status}`);
+    }
+
+    const page: MemoryPage = { memories: [], nextCursor: null };
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    const handleLine = (line: string) => {
+      if (!line.trim()) return;
+      const record = JSON.parse(line);
+      if ('next_cursor' in record) {
+        page.nextCursor = record.next_cursor;
+      } else {
+        page.memories.push(record);
+      }
+    };
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+      lines.forEach(handleLine);
+    }
+    handleLine(buffer + decoder.decode());
+    return page;
+  }
+};
@@ -22,6 +22,7 @@ import { persist } from 'zustand/middleware';
 import { immer } from 'zustand/middleware/immer';
 import { invoke } from '@tauri-apps/api/tauri';
 import axios from 'axios';
+import { memoryService, MemoryRecord } from './services/apiService';
 
 // Type definitions
 declare global {
@@ -68,6 +69,8 @@ export interface Chat {
   messages: ChatMessage[];
   created: number;
   lastUpdated: number;
+  /** Server-side conversation session, set after the first response */
+  sessionId?: string;
 }
 
 /** Memory interface */
@@ -90,6 +93,9 @@ interface AppState {
   chats: Chat[];
   activeChat?: string;
   memories: Memory[];
+  /** Cursor of the next /memories page: undefined = not loaded yet, null = all loaded */
+  memoryCursor?: number | null;
+  isLoadingMemories: boolean;
   isProcessing: boolean;
   
   // Settings actions
@@ -108,6 +114,7 @@ interface AppState {
   addMemory: (memory: Memory) => void;
   updateMemoryImportance: (id: string, importance: number) => void;
   deleteMemory: (id: string) => void;
+  loadMemories: (reset?: boolean) => Promise<void>;
   
   // Message processing
   processMessage: (chatId: string, message: ChatMessage) => Promise<void>;
@@ -145,6 +152,22 @@ const safeTauriInvoke = async (cmd: string, args: any) => {
   }
 };
 
+/** Convert a streamed /memories record to the store format */
+const fromRecord = (record: MemoryRecord): Memory => ({
+  id: String(record.id),
+  content: record.content,
+  category: record.category,
+  importance: record.importance,
+  // Server timestamps are naive UTC
+  timestamp: record.created_at ? Date.parse(`${record.created_at}Z`) : Date.now(),
+  metadata: {
+    collection: record.collection,
+    ...(record.attributes ?? {})
+  }
+});
+
+const MEMORY_PAGE_SIZE = 100;
+
 // Default settings
 const defaultSettings: Settings = {
   apiKey: '',
@@ -163,6 +186,8 @@ export const useStore = create<AppState>()(
       settings: { ...defaultSettings },
       chats: [],
       memories: [],
+      memoryCursor: undefined,
+      isLoadingMemories: false,
       isProcessing: false,
 
       // Settings actions
@@ -238,6 +263,34 @@ export const useStore = create<AppState>()(
         state.memories = state.memories.filter((memory) => memory.id !== id);
       }),
 
+      // Browse the server store page by page (cursor based)
+      loadMemories: async (reset = false) => {
+        const { memoryCursor, isLoadingMemories } = get();
+        if (isLoadingMemories || (!reset && memoryCursor === null)) return;
+        set((state) => {
+          state.isLoadingMemories = true;
+        });
+        try {
+          const page = await memoryService.fetchMemories({
+            cursor: reset ? 0 : memoryCursor ?? 0,
+            limit: MEMORY_PAGE_SIZE
+          });
+          set((state) => {
+            const loaded = page.memories.map(fromRecord);
+            const ids = new Set(loaded.map((memory) => memory.id));
+            const kept = reset ? [] : state.memories.filter((memory) => !ids.has(memory.id));
+            state.memories = [...kept, ...loaded];
+            state.memoryCursor = page.nextCursor;
+          });
+        } catch (error) {
+          console.error('Error loading memories:', error);
+        } finally {
+          set((state) => {
+            state.isLoadingMemories = false;
+          });
+        }
+      },
+
       // Message processing
       processMessage: async (chatId, message) => {
         set((state) => {
@@ -259,7 +312,8 @@ export const useStore = create<AppState>()(
             apiKey: state.settings.apiKey,
             message: message.content,
             context: relevantMemories,
-            model: modelStrategist
+            model: modelStrategist,
+            sessionId: state.chats.find(c => c.id === chatId)?.sessionId
           });
 
           // Create AI response message
@@ -279,6 +333,7 @@ export const useStore = create<AppState>()(
             if (chat) {
               chat.messages.push(aiMessage);
               chat.lastUpdated = Date.now();
+              chat.sessionId = response.session_id ?? chat.sessionId;
             }
             state.isProcessing = false;
           });
@@ -313,6 +368,8 @@ export const useStore = create<AppState>()(
     })),
     {
       name: 'mastermind-storage',
+      // Server memories are reloaded page by page, not persisted
+      partialize: ({ memories, memoryCursor, isLoadingMemories, ...rest }) => rest,
       migrate: (persistedState: any) => {
         return {
           ...defaultSettings,
@@ -1,79 +1,66 @@
-"""MasterMind - Advanced multi-agent system leveraging different LLM models."""
+"""MasterMind - Advanced multi-agent system leveraging different LLM models.
 
-# Core system imports
-from mastermind.core import (
-    Orchestrator,
-    WorkerAgent,
-    StrategistAgent,
-    TaskResult,
-    ModelType,
-    Agent,
-    ResponseBlock,
-    ToolUseBlock,
-    format_block,
-    is_response_block
-)
+Public names are resolved lazily (PEP 562): importing ``mastermind`` or
+``mastermind.core`` does not pull in the server, sentence_transformers or
+sqlalchemy until one of their components is actually used.
+"""
 
-# MCP protocol imports
-from mastermind.mcp import (
-    MCPManager,
-    MCPProvider,
-    MCPResource,
-    MCPTool,
-    MCPEnabledAgent,
-    FileSystemProvider
-)
-
-# Database and memory management
-from mastermind.database_protocol import DatabaseEntry
-from mastermind.database import Memory
-from mastermind.vectordb import VectorDatabase, VectorEntry
-from mastermind.knowledge_cluster import KnowledgeCluster
-
-# Server componenten toevoegen
-from mastermind.server import (
-    ChatRequest,
-    CodeGenerationRequest,
-    MessageRequest,
-    MemoryManagementRequest
-)
+import importlib
+from typing import Any, Dict, List
 
 __version__ = '0.2.0'
 
-__all__ = [
+# Publieke naam -> submodule waarin die gedefinieerd is
+_LAZY_IMPORTS: Dict[str, str] = {
     # Core system components
-    'Orchestrator',
-    'WorkerAgent',
-    'StrategistAgent',
-    'TaskResult',
-    'ModelType',
-    'Agent',
-    'ResponseBlock',
-    'ToolUseBlock',
-    'format_block',
-    'is_response_block',
-    
+    'Orchestrator': 'mastermind.core',
+    'WorkerAgent': 'mastermind.core',
+    'StrategistAgent': 'mastermind.core',
+    'TaskResult': 'mastermind.core',
+    'ModelType': 'mastermind.core',
+    'Agent': 'mastermind.core',
+    'ResponseBlock': 'mastermind.core',
+    'ToolUseBlock': 'mastermind.core',
+    'format_block': 'mastermind.core',
+    'is_response_block': 'mastermind.core',
+
     # MCP protocol components
-    'MCPManager',
-    'MCPProvider',
-    'MCPResource',
-    'MCPTool',
-    'MCPEnabledAgent',
-    'FileSystemProvider',
-    
+    'MCPManager': 'mastermind.mcp',
+    'MCPProvider': 'mastermind.mcp',
+    'MCPResource': 'mastermind.mcp',
+    'MCPTool': 'mastermind.mcp',
+    'MCPEnabledAgent': 'mastermind.mcp',
+    'FileSystemProvider': 'mastermind.mcp',
+    'FileIndex': 'mastermind.file_index',
+
     # Database components
-    'DatabaseEntry',
-    'Memory',
-    
+    'DatabaseEntry': 'mastermind.database_protocol',
+    'Memory': 'mastermind.database',
+
     # Memory management components
-    'VectorDatabase',
-    'VectorEntry',
-    'KnowledgeCluster',
-    
-    # Server componenten toevoegen
-    'app',
-    'ChatRequest',
-    'CodeGenerationRequest',
-    'MessageRequest',
-    'MemoryManagementRequest',
-]
\ No newline at end of file
+    'VectorDatabase': 'mastermind.vectordb',
+    'VectorEntry': 'mastermind.vectordb',
+    'KnowledgeCluster': 'mastermind.knowledge_cluster',
+
+    # Server componenten
+    'app': 'mastermind.server',
+    'ChatRequest': 'mastermind.server',
+    'CodeGenerationRequest': 'mastermind.server',
+    'MessageRequest': 'mastermind.server',
+    'MemoryManagementRequest': 'mastermind.server',
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value  # Volgende lookups slaan __getattr__ over
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,471 @@
+"""Offline bulk verwerking van orchestrator taken via de Message Batches API
+
+Voor nachtelijke jobs met duizenden taken is process_task per taak vooral
+wachten op round trips. BulkProcessor doet dezelfde drie stappen
+(strategie, workers, synthese) met dezelfde prompts, maar in rondes: elke
+ronde is één batch met alle requests die op dat moment klaar staan, over
+taken en stappen heen. Nieuwe taken schuiven bij zodra er ruimte is in de
+batch, dus de doorvoer wordt bepaald door de batch capaciteit.
+
+- Checkpoint: na elke ronde staat de voortgang in <checkpoint>/state.json
+  (actieve taken, de lopende batch, hoeveel invoer en uitvoer verwerkt
+  is). Een onderbroken run gaat bij dezelfde aanroep verder: een lopende
+  batch wordt opgehaald in plaats van opnieuw ingediend.
+- Uitvoer: één JSON regel per afgeronde taak, zodra hij klaar is. Bij een
+  hervatting wordt het uitvoerbestand eerst teruggezet naar de laatst
+  gecheckpointe lengte, zodat er geen dubbele regels ontstaan.
+- LocalBatchClient voert een batch uit met gewone messages.create calls
+  (voor tests en lokaal draaien); AnthropicBatchClient gebruikt de echte
+  Batches API (50% goedkoper, resultaten binnen 24 uur).
+
+Gebruik:
+    python -m mastermind.bulk tasks.jsonl --output results.jsonl --checkpoint ./bulk-run
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple, Union
+
+from anthropic.types import TextBlock
+
+from .core import STRATEGIST_INSTRUCTIONS, Orchestrator, TaskResult
+from .usage import UsageSummary, record_call, track_usage
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "state.json"
+STATE_VERSION = 1
+
+# Limiet van de Batches API is 100.000 requests (of 256 MB) per batch
+DEFAULT_BATCH_REQUESTS = 10_000
+
+TaskSource = Union[str, "os.PathLike[str]", Iterable[Any]]
+
+
+@dataclass
+class BatchResult:
+    """Resultaat van één request uit een batch"""
+    custom_id: str
+    message: Any = None
+    error: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.message is not None
+
+
+class BatchClient(Protocol):
+    """Dient batches in en haalt de resultaten op"""
+
+    # Of de requests tegen batch korting (usage.BATCH_DISCOUNT) gerekend worden
+    discounted: bool
+
+    async def submit(self, requests: List[Dict[str, Any]]) -> str: ...
+
+    async def results(self, batch_id: str) -> Dict[str, BatchResult]:
+        """Wacht tot de batch klaar is; LookupError als hij onbekend is"""
+        ...
+
+
+async def _call(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Roep een sync of async SDK methode aan zonder de event loop te blokkeren"""
+    if asyncio.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, partial(func, *args, **kwargs))
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class AnthropicBatchClient:
+    """Message Batches API van anthropic.Anthropic of anthropic.AsyncAnthropic
+
+    :param poll_interval: Seconden tussen statuscontroles van een lopende batch
+    """
+    discounted = True
+
+    def __init__(self, client: Any, poll_interval: float = 60.0) -> None:
+        self.client = client
+        self.poll_interval = poll_interval
+
+    async def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch = await _call(self.client.messages.batches.create, requests=requests)
+        return str(batch.id)
+
+    async def results(self, batch_id: str) -> Dict[str, BatchResult]:
+        batches = self.client.messages.batches
+        try:
+            batch = await _call(batches.retrieve, batch_id)
+        except Exception as e:
+            if getattr(e, "status_code", None) == 404:
+                raise LookupError(batch_id) from e
+            raise
+        while batch.processing_status != "ended":
+            logger.debug("Batch %s: %s", batch_id, batch.request_counts)
+            await asyncio.sleep(self.poll_interval)
+            batch = await _call(batches.retrieve, batch_id)
+
+        if asyncio.iscoroutinefunction(batches.results):
+            entries = [entry async for entry in await batches.results(batch_id)]
+        else:
+            loop = asyncio.get_running_loop()
+            entries = await loop.run_in_executor(None, lambda: list(batches.results(batch_id)))
+        results: Dict[str, BatchResult] = {}
+        for entry in entries:
+            result = entry.result
+            if result.type == "succeeded":
+                results[entry.custom_id] = BatchResult(entry.custom_id, message=result.message)
+            else:
+                error = getattr(result, "error", None)
+                results[entry.custom_id] = BatchResult(entry.custom_id, error=str(error or result.type))
+        return results
+
+
+class LocalBatchClient:
+    """Lokale stand-in: voert elke request uit via client.messages.create
+
+    Batches bestaan alleen in dit proces; na een herstart zijn ze onbekend
+    en dient BulkProcessor ze opnieuw in.
+
+    :param client: Object met een (sync of async) messages.create
+    :param max_concurrency: Aantal requests dat tegelijk uitgevoerd wordt
+    """
+    discounted = False
+
+    def __init__(self, client: Any, max_concurrency: int = 16) -> None:
+        self.client = client
+        self.max_concurrency = max_concurrency
+        # Aantal requests per ingediende batch
+        self.submitted: List[int] = []
+        self._batches: Dict[str, "asyncio.Future[Dict[str, BatchResult]]"] = {}
+
+    async def submit(self, requests: List[Dict[str, Any]]) -> str:
+        batch_id = f"local_batch_{len(self.submitted)}"
+        self.submitted.append(len(requests))
+        self._batches[batch_id] = asyncio.ensure_future(self._run(requests))
+        return batch_id
+
+    async def results(self, batch_id: str) -> Dict[str, BatchResult]:
+        if batch_id not in self._batches:
+            raise LookupError(batch_id)
+        return await self._batches.pop(batch_id)
+
+    async def _run(self, requests: List[Dict[str, Any]]) -> Dict[str, BatchResult]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def one(request: Dict[str, Any]) -> BatchResult:
+            async with semaphore:
+                try:
+                    message = await _call(self.client.messages.create, **request["params"])
+                    return BatchResult(request["custom_id"], message=message)
+                except Exception as e:
+                    return BatchResult(request["custom_id"], error=f"{type(e).__name__}: {e}")
+
+        results = await asyncio.gather(*(one(request) for request in requests))
+        return {result.custom_id: result for result in results}
+
+
+@dataclass
+class BulkReport:
+    """Samenvatting van een bulk run (alleen het deel van deze aanroep)"""
+    tasks: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    batches: int = 0
+    requests: int = 0
+    resumed: bool = False
+    seconds: float = 0.0
+    usage: UsageSummary = field(default_factory=UsageSummary)
+
+
+def iter_tasks(source: TaskSource) -> Iterator[Tuple[Optional[str], Any]]:
+    """(id, taak) paren uit een bestand of iterable
+
+    Een .jsonl bestand bevat per regel een JSON waarde: een object met
+    "task" (en optioneel "id") of de taak zelf. Andere bestanden bevatten
+    één taak per regel. Lege regels worden overgeslagen.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if not path.endswith(".jsonl"):
+                    yield None, line
+                    continue
+                value = json.loads(line)
+                if isinstance(value, dict) and "task" in value:
+                    yield value.get("id"), value["task"]
+                else:
+                    yield None, value
+        return
+    for task in source:
+        yield None, task
+
+
+def _text(message: Any) -> str:
+    content = getattr(message, "content", None)
+    if content and isinstance(content[0], TextBlock):
+        return str(content[0].text)
+    return ""
+
+
+class BulkProcessor:
+    """Verwerkt veel taken met de stappen van een Orchestrator, in batches
+
+    :param orchestrator: Levert de strategist, het aantal workers en hun prompts
+    :param batch_client: AnthropicBatchClient of LocalBatchClient
+    :param checkpoint_dir: Map voor state.json; dezelfde map hervat een run
+    :param max_batch_requests: Maximaal aantal requests per batch
+    """
+
+    def __init__(
+        self,
+        orchestrator: Orchestrator,
+        batch_client: BatchClient,
+        checkpoint_dir: str,
+        max_batch_requests: int = DEFAULT_BATCH_REQUESTS
+    ) -> None:
+        self.orchestrator = orchestrator
+        self.batch_client = batch_client
+        self.checkpoint_dir = checkpoint_dir
+        self.max_batch_requests = max_batch_requests
+        self.state_path = os.path.join(checkpoint_dir, STATE_FILE)
+
+    # Checkpoint
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, encoding="utf-8") as f:
+            state: Dict[str, Any] = json.load(f)
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {self.state_path}")
+        return state
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    # Requests per stap, met dezelfde prompts als process_task
+
+    def _requests(self, key: str, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        strategist = self.orchestrator.strategist
+        if job["stage"] == "strategy":
+            params = strategist.message_params(strategist.prompt(job["task"]), STRATEGIST_INSTRUCTIONS)
+            return [{"custom_id": f"{key}-s", "params": params}]
+        if job["stage"] == "workers":
+            return [
+                {"custom_id": f"{key}-w{index}", "params": worker.message_params(str(job["strategy"]))}
+                for index, worker in enumerate(self.orchestrator.workers)
+                if str(index) not in job["workers"]
+            ]
+        worker_results = [
+            TaskResult(**job["workers"][str(index)]) for index in range(len(self.orchestrator.workers))
+        ]
+        params = strategist.message_params(
+            strategist.prompt({
+                "original_task": job["task"],
+                "strategy": job["strategy"],
+                "worker_results": worker_results
+            }),
+            STRATEGIST_INSTRUCTIONS
+        )
+        return [{"custom_id": f"{key}-y", "params": params}]
+
+    def _apply(self, job: Dict[str, Any], step: str, result: BatchResult) -> Optional[Dict[str, Any]]:
+        """Verwerk één resultaat; geeft de uitvoerregel als de taak klaar is"""
+        if result.succeeded:
+            record_call(self._model(step), result.message, 0.0, batch=self.batch_client.discounted)
+        if step == "s":
+            if not result.succeeded:
+                return self._finish(job, False, error=f"Strategic analysis failed: {result.error}")
+            job["strategy"] = _text(result.message)
+            job["stage"] = "workers" if self.orchestrator.workers else "synthesis"
+        elif step.startswith("w"):
+            job["workers"][step[1:]] = (
+                {"success": True, "data": _text(result.message)} if result.succeeded
+                else {"success": False, "data": "", "error": result.error}
+            )
+            if len(job["workers"]) == len(self.orchestrator.workers):
+                job["stage"] = "synthesis"
+        elif result.succeeded:
+            return self._finish(job, True, data=_text(result.message))
+        else:
+            return self._finish(job, False, error=f"Final analysis failed: {result.error}")
+        return None
+
+    def _model(self, step: str) -> str:
+        if step.startswith("w"):
+            return self.orchestrator.workers[int(step[1:])].model.value
+        return self.orchestrator.strategist.model.value
+
+    @staticmethod
+    def _finish(job: Dict[str, Any], success: bool, data: Any = None, error: Optional[str] = None) -> Dict[str, Any]:
+        workers = job["workers"].values()
+        return {
+            "index": job["index"],
+            "id": job["id"],
+            "task": job["task"],
+            "success": success,
+            "data": data,
+            "error": error,
+            "workers": {
+                "completed": sum(1 for w in workers if w["success"]),
+                "failed": sum(1 for w in workers if not w["success"])
+            }
+        }
+
+    async def run(self, tasks: TaskSource, output_path: str) -> BulkReport:
+        """Verwerk alle taken en schrijf de resultaten als JSONL naar output_path
+
+        Roep na een onderbreking opnieuw aan met dezelfde taken, uitvoer en
+        checkpoint map om verder te gaan waar de vorige run stopte. Zonder
+        checkpoint begint de uitvoer leeg. Taken moeten JSON-serialiseerbaar
+        zijn (ze staan in het checkpoint).
+        """
+        started = time.perf_counter()
+        report = BulkReport()
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        state = self._load_state()
+        if state is None:
+            state = {
+                "version": STATE_VERSION,
+                "consumed": 0,
+                "output_bytes": 0,
+                "active": {},
+                "pending": None,
+                "succeeded": 0,
+                "failed": 0
+            }
+        else:
+            report.resumed = True
+            logger.info(
+                "Resuming bulk run: %d tasks read, %d active, batch %s pending",
+                state["consumed"], len(state["active"]),
+                state["pending"]["batch_id"] if state["pending"] else None
+            )
+
+        source = itertools.islice(iter_tasks(tasks), state["consumed"], None)
+        exhausted = False
+        active: Dict[str, Dict[str, Any]] = state["active"]
+
+        with open(output_path, "ab") as output, track_usage() as report.usage:
+            # Alles na het laatste checkpoint wordt opnieuw gedaan
+            output.truncate(state["output_bytes"])
+            output.seek(state["output_bytes"])
+            while True:
+                pending = state["pending"]
+                if pending is not None:
+                    try:
+                        results = await self.batch_client.results(pending["batch_id"])
+                    except LookupError:
+                        logger.warning("Batch %s is unknown, submitting its requests again", pending["batch_id"])
+                        results = None
+                    if results is not None:
+                        for custom_id in pending["custom_ids"]:
+                            result = results.get(custom_id)
+                            key, step = custom_id.rsplit("-", 1)
+                            job = active.get(key)
+                            if job is None or result is None:
+                                # Ontbrekend resultaat: de request komt in een volgende ronde terug
+                                continue
+                            line = self._apply(job, step, result)
+                            if line is not None:
+                                output.write((json.dumps(line, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                                del active[key]
+                                state["succeeded" if line["success"] else "failed"] += 1
+                                report.succeeded += line["success"]
+                                report.failed += not line["success"]
+                        output.flush()
+                        os.fsync(output.fileno())
+                        state["output_bytes"] = output.tell()
+                    state["pending"] = None
+                    self._save_state(state)
+
+                # Volgende ronde: eerst de lopende taken (oudste eerst), dan nieuwe taken
+                requests: List[Dict[str, Any]] = []
+                for key in sorted(active, key=lambda k: active[k]["index"]):
+                    job_requests = self._requests(key, active[key])
+                    if requests and len(requests) + len(job_requests) > self.max_batch_requests:
+                        break
+                    requests.extend(job_requests)
+                while not exhausted and len(requests) < self.max_batch_requests:
+                    try:
+                        task_id, task = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    index = state["consumed"]
+                    state["consumed"] += 1
+                    report.tasks += 1
+                    key = f"t{index}"
+                    active[key] = {
+                        "index": index, "id": task_id, "task": task,
+                        "stage": "strategy", "strategy": None, "workers": {}
+                    }
+                    requests.extend(self._requests(key, active[key]))
+                if not requests:
+                    break
+
+                batch_id = await self.batch_client.submit(requests)
+                state["pending"] = {"batch_id": batch_id, "custom_ids": [r["custom_id"] for r in requests]}
+                self._save_state(state)
+                report.batches += 1
+                report.requests += len(requests)
+                logger.info(
+                    "Submitted batch %s: %d requests, %d active tasks, %d done",
+                    batch_id, len(requests), len(active), state["succeeded"] + state["failed"]
+                )
+
+        report.seconds = time.perf_counter() - started
+        logger.info(
+            "Bulk run finished: %d succeeded, %d failed in %d batches (%.1fs, $%.4f)",
+            state["succeeded"], state["failed"], report.batches, report.seconds, report.usage.cost_usd
+        )
+        return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tasks", help="JSONL (een taak of {\"id\", \"task\"} per regel) of tekst (een taak per regel)")
+    parser.add_argument("--output", required=True, help="JSONL bestand voor de resultaten")
+    parser.add_argument("--checkpoint", required=True, help="map voor de voortgang; hervat een onderbroken run")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-batch-requests", type=int, default=DEFAULT_BATCH_REQUESTS)
+    parser.add_argument("--poll-interval", type=float, default=60.0)
+    parser.add_argument("--local", action="store_true", help="gewone API calls in plaats van de Batches API")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("MASTERMIND_LOG_LEVEL", "INFO").upper())
+    orchestrator = Orchestrator(os.getenv("ANTHROPIC_API_KEY", ""))
+    for _ in range(args.workers):
+        orchestrator.add_worker()
+    batch_client: BatchClient = (
+        LocalBatchClient(orchestrator.client) if args.local
+        else AnthropicBatchClient(orchestrator.client, poll_interval=args.poll_interval)
+    )
+    processor = BulkProcessor(orchestrator, batch_client, args.checkpoint, args.max_batch_requests)
+    report = asyncio.run(processor.run(args.tasks, args.output))
+    print(
+        f"{report.succeeded} succeeded, {report.failed} failed, {report.batches} batches, "
+        f"{report.requests} requests in {report.seconds:.1f}s (${report.usage.cost_usd:.4f})"
+    )
+
+
+if __name__ == "__main__":
+    main()
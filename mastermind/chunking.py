@@ -0,0 +1,169 @@
+"""Token-aware text chunking voor lange content
+
+Lange teksten (zoals LLM responses van 1000+ tokens) worden opgesplitst in
+overlappende vensters die binnen de invoerlimiet van het embedding model
+passen (MiniLM kapt af na 256 word pieces). De chunker werkt streaming: hij
+accepteert een string of een iterable van tekstfragmenten en levert chunks
+zodra een venster vol is, zodat het geheugengebruik begrensd blijft.
+
+Tokens worden benaderd met een regex (woorden en leestekens) waarbij lange
+woorden als meerdere word pieces tellen; dat volgt de WordPiece telling van
+MiniLM goed genoeg om onder de limiet te blijven zonder tokenizer te laden.
+"""
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Tuple, Union
+
+# Een token inclusief voorafgaande witruimte, zodat ''.join(tokens) de tekst teruggeeft
+_TOKEN_PATTERN = re.compile(r"\s*(?:\w+|[^\w\s])", re.UNICODE)
+_SENTENCE_END = (".", "!", "?", ";", ":")
+
+# Maximaal aantal tekens per geschat word piece binnen één woord
+PIECE_CHARS = 8
+
+
+@dataclass
+class Chunk:
+    """Een aaneengesloten venster uit de brontekst"""
+    text: str
+    index: int
+    start_char: int
+    end_char: int
+    token_count: int
+
+
+def _pieces(token: str) -> int:
+    word = token.strip()
+    return 1 + (len(word) - 1) // PIECE_CHARS if word else 0
+
+
+def estimate_tokens(text: str) -> int:
+    """Schat het aantal word pieces van een tekst"""
+    return sum(_pieces(m.group()) for m in _TOKEN_PATTERN.finditer(text))
+
+
+class TextChunker:
+    """Splits tekst in overlappende, token-begrensde chunks
+
+    :param max_tokens: Maximaal aantal (geschatte) tokens per chunk
+    :param overlap_tokens: Aantal tokens dat een chunk deelt met de vorige
+    :param boundary_window: Fractie van het venster waarbinnen bij voorkeur
+        op een zinseinde wordt geknipt
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 200,
+        overlap_tokens: int = 32,
+        boundary_window: float = 0.3
+    ) -> None:
+        if max_tokens <= 0:
+            raise ValueError("max_tokens moet positief zijn")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens moet tussen 0 en max_tokens liggen")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.boundary_window = boundary_window
+
+    def needs_chunking(self, text: str) -> bool:
+        """Of de tekst niet in één chunk past"""
+        return estimate_tokens(text) > self.max_tokens
+
+    def chunk(self, source: Union[str, Iterable[str]]) -> List[Chunk]:
+        """Alle chunks als lijst"""
+        return list(self.iter_chunks(source))
+
+    def iter_chunks(self, source: Union[str, Iterable[str]]) -> Iterator[Chunk]:
+        """Lever chunks zodra ze compleet zijn
+
+        :param source: Volledige tekst of een stroom tekstfragmenten; een
+            woord mag over twee fragmenten verdeeld zijn
+        """
+        # Venster van (token tekst, start offset, pieces)
+        window: List[Tuple[str, int, int]] = []
+        window_tokens = 0
+        index = 0
+
+        for token in self._iter_tokens(source):
+            while window and window_tokens + token[2] > self.max_tokens:
+                cut = self._find_cut(window)
+                emitted = window[:cut]
+                yield self._make_chunk(emitted, index)
+                index += 1
+                window = self._overlap_tail(emitted) + window[cut:]
+                window_tokens = sum(t[2] for t in window)
+            window.append(token)
+            window_tokens += token[2]
+
+        if window:
+            yield self._make_chunk(window, index)
+
+    def _iter_tokens(self, source: Union[str, Iterable[str]]) -> Iterator[Tuple[str, int, int]]:
+        fragments = [source] if isinstance(source, str) else source
+        pending = ""
+        offset = 0  # Offset van pending in de totale tekst
+        for fragment in fragments:
+            pending += fragment
+            matches = list(_TOKEN_PATTERN.finditer(pending))
+            # Het laatste token kan nog doorlopen in het volgende fragment
+            if matches and matches[-1].end() == len(pending):
+                matches = matches[:-1]
+            consumed = 0
+            for m in matches:
+                yield m.group(), offset + m.start(), _pieces(m.group())
+                consumed = m.end()
+            pending = pending[consumed:]
+            offset += consumed
+        for m in _TOKEN_PATTERN.finditer(pending):
+            yield m.group(), offset + m.start(), _pieces(m.group())
+
+    def _find_cut(self, window: List[Tuple[str, int, int]]) -> int:
+        """Index waarop het venster geknipt wordt, bij voorkeur na een zinseinde"""
+        total = sum(t[2] for t in window)
+        min_tokens = max(self.overlap_tokens + 1, int(total * (1 - self.boundary_window)))
+        running = total
+        for i in range(len(window) - 1, 0, -1):
+            running -= window[i][2]
+            if running < min_tokens:
+                break
+            if window[i - 1][0].rstrip().endswith(_SENTENCE_END) or "\n" in window[i][0]:
+                return i
+        return len(window)
+
+    def _overlap_tail(self, emitted: List[Tuple[str, int, int]]) -> List[Tuple[str, int, int]]:
+        """Laatste tokens van een chunk die ook in de volgende chunk komen"""
+        tail: List[Tuple[str, int, int]] = []
+        tokens = 0
+        for token in reversed(emitted[1:]):  # Nooit de hele chunk, anders geen voortgang
+            if tokens + token[2] > self.overlap_tokens:
+                break
+            tail.insert(0, token)
+            tokens += token[2]
+        return tail
+
+    @staticmethod
+    def _make_chunk(tokens: List[Tuple[str, int, int]], index: int) -> Chunk:
+        raw = "".join(t[0] for t in tokens)
+        leading = len(raw) - len(raw.lstrip())
+        text = raw.strip()
+        start = tokens[0][1] + leading
+        return Chunk(
+            text=text,
+            index=index,
+            start_char=start,
+            end_char=start + len(text),
+            token_count=sum(t[2] for t in tokens)
+        )
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Kap tekst af op een tokengrens zodat hij binnen max_tokens past"""
+    used = 0
+    end = 0
+    for m in _TOKEN_PATTERN.finditer(text):
+        pieces = _pieces(m.group())
+        if used + pieces > max_tokens:
+            break
+        used += pieces
+        end = m.end()
+    return text[:end].strip()
@@ -0,0 +1,180 @@
+"""Consolidatie van bijna-identieke herinneringen
+
+Elk chat antwoord wordt opgeslagen, dus dezelfde kennis komt vaak meerdere
+keren in een collectie terecht. De MemoryConsolidator zoekt die duplicaten
+via een similarity drempel over de embedding matrix en voegt elke groep
+samen tot één representatieve rij met gecombineerd belang.
+
+- Chunked: nieuwe rijen worden per batch vergeleken met de bestaande rijen,
+  die ook per batch (keyset paginering) geladen worden. Er staan nooit meer
+  dan twee batches van chunk_size embeddings tegelijk in het geheugen.
+- Incrementeel: per collectie wordt het hoogste verwerkte id onthouden; een
+  volgende run vergelijkt alleen nieuwere rijen (met alles wat ouder is).
+  Na een herstart volgt één volledige run, die idempotent is.
+- Cohesie: de drempel groepeert transitief (A~B, B~C), dus elke groep wordt
+  voor het samenvoegen geverifieerd rond zijn medoid; leden die niet dicht
+  genoeg bij de medoid liggen blijven los bestaan.
+
+Alleen rijen met een eigen embedding doen mee; chunks van lange content
+horen bij hun parent en worden niet los samengevoegd.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import timed
+from .vectordb import EmbeddingBatch, VectorDatabase
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConsolidationReport:
+    """Resultaat van één consolidatie run over een collectie"""
+    scanned: int = 0
+    clusters: int = 0
+    merged: int = 0
+    rejected: int = 0
+    representatives: List[int] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+class _DisjointSet:
+    """Union-find over memory ids"""
+
+    def __init__(self) -> None:
+        self.parent: Dict[int, int] = {}
+
+    def find(self, item: int) -> int:
+        root = self.parent.setdefault(item, item)
+        while root != self.parent[root]:
+            root = self.parent[root]
+        while item != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+    def groups(self) -> List[List[int]]:
+        members: Dict[int, List[int]] = {}
+        for item in self.parent:
+            members.setdefault(self.find(item), []).append(item)
+        return [sorted(group) for group in members.values() if len(group) > 1]
+
+
+def combined_importance(importance: Sequence[float]) -> float:
+    """Belang van een samengevoegde groep: kans dat minstens één lid belangrijk is"""
+    values = np.clip(np.asarray(importance, dtype=np.float64), 0.0, 1.0)
+    return float(1.0 - np.prod(1.0 - values))
+
+
+class MemoryConsolidator:
+    """Vindt en merget bijna-identieke herinneringen per collectie
+
+    :param threshold: Cosine similarity vanaf waar twee rijen duplicaten zijn
+    :param chunk_size: Aantal embeddings per batch bij het vergelijken
+    """
+
+    def __init__(self, threshold: float = 0.95, chunk_size: int = 4096) -> None:
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        # Hoogste verwerkte id per collectie
+        self._watermarks: Dict[Optional[str], int] = {}
+
+    @timed("consolidation")
+    async def consolidate(self, db: VectorDatabase, full: bool = False) -> ConsolidationReport:
+        """Consolideer de rijen van db die sinds de vorige run zijn toegevoegd"""
+        started = time.perf_counter()
+        report = ConsolidationReport()
+        watermark = 0 if full else self._watermarks.get(db.collection_name, 0)
+        pairs = _DisjointSet()
+        async for new in db.iter_embedding_batches(self.chunk_size, after_id=watermark):
+            report.scanned += len(new)
+            upper = int(new.ids[-1]) + 1
+            async for existing in db.iter_embedding_batches(self.chunk_size, before_id=upper):
+                self._link(new, existing, pairs)
+            watermark = upper - 1
+
+        for group in pairs.groups():
+            report.clusters += 1
+            outcome = await self.merge(db, group)
+            if outcome is None:
+                report.rejected += 1
+                continue
+            representative, removed = outcome
+            report.representatives.append(representative)
+            report.merged += removed
+
+        self._watermarks[db.collection_name] = watermark
+        report.seconds = time.perf_counter() - started
+        if report.clusters:
+            logger.info(
+                "Consolidated %s: %d new rows, %d clusters, %d rows merged, %d rejected in %.2fs",
+                db.collection_name, report.scanned, report.clusters, report.merged,
+                report.rejected, report.seconds
+            )
+        return report
+
+    def _link(self, new: EmbeddingBatch, existing: EmbeddingBatch, pairs: _DisjointSet) -> None:
+        """Verbind elk nieuw id met oudere ids boven de drempel (zelfde categorie)"""
+        if new.matrix.shape[1] != existing.matrix.shape[1]:
+            return
+        similar = (new.matrix @ existing.matrix.T) >= self.threshold
+        similar &= new.categories[:, None] == existing.categories[None, :]
+        # Elk paar één keer: het nieuwe id tegen oudere ids
+        similar &= new.ids[:, None] > existing.ids[None, :]
+        for i, j in zip(*np.nonzero(similar)):
+            pairs.union(int(new.ids[i]), int(existing.ids[j]))
+
+    async def merge(self, db: VectorDatabase, ids: Sequence[int]) -> Optional[Tuple[int, int]]:
+        """Verifieer een groep en voeg hem samen rond zijn medoid
+
+        Geeft (representant id, aantal verwijderde rijen), of None als er na
+        de cohesie check geen twee leden overblijven.
+        """
+        batch = await db.load_embeddings(ids)
+        cluster = self.verify(batch)
+        if cluster is None:
+            return None
+        representative, members, cohesion = cluster
+        removed = await db.merge_vectors(
+            representative,
+            members,
+            importance=combined_importance(batch.importance[np.isin(batch.ids, members)]),
+            attributes={'cohesion': round(cohesion, 4)}
+        )
+        return representative, removed
+
+    def verify(self, batch: EmbeddingBatch) -> Optional[Tuple[int, List[int], float]]:
+        """Cohesie check: (medoid id, leden binnen de drempel van de medoid, minimale similarity)
+
+        Leden moeten dezelfde categorie als de medoid hebben.
+        """
+        if len(batch) < 2:
+            return None
+        similarity = batch.matrix @ batch.matrix.T
+        medoid = int(np.argmax(similarity.mean(axis=1)))
+        close = (similarity[medoid] >= self.threshold) & (batch.categories == batch.categories[medoid])
+        if int(close.sum()) < 2:
+            return None
+        members = [int(i) for i in batch.ids[close]]
+        return int(batch.ids[medoid]), members, float(similarity[medoid][close].min())
+
+    async def neighbours(self, db: VectorDatabase, memory_id: int) -> List[int]:
+        """Ids in de collectie die nog boven de drempel bij memory_id liggen"""
+        target = await db.load_embeddings([memory_id])
+        if not len(target):
+            return []
+        found: List[int] = []
+        async for batch in db.iter_embedding_batches(self.chunk_size, category=str(target.categories[0])):
+            if batch.matrix.shape[1] != target.matrix.shape[1]:
+                continue
+            close = (batch.matrix @ target.matrix[0] >= self.threshold) & (batch.ids != memory_id)
+            found.extend(int(i) for i in batch.ids[close])
+        return found
@@ -0,0 +1,166 @@
+"""Token-budgeted context assembly
+
+Gedeeld door de server endpoints: kiest de best scorende herinneringen die
+binnen een token budget passen, laat bijna-identieke herinneringen weg op
+basis van embedding similarity en rapporteert hoeveel tokens de context kost.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Sequence, Set
+
+import numpy as np
+
+from .chunking import estimate_tokens, truncate_to_tokens
+from .llm import cached_content
+from .vectordb import VectorEntry
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("MASTERMIND_CONTEXT_TOKEN_BUDGET", "1500"))
+
+
+@dataclass
+class BuiltContext:
+    """Resultaat van een context opbouw"""
+    text: str
+    tokens_used: int
+    token_budget: int
+    memories: List[VectorEntry] = field(default_factory=list)
+    duplicates_dropped: int = 0
+    over_budget_dropped: int = 0
+    truncated: int = 0
+    # Losse blokken van text; de eerste prefix_blocks zijn stabiel tussen calls
+    blocks: List[str] = field(default_factory=list)
+    prefix_blocks: int = 0
+
+    def content_blocks(self) -> List[Dict[str, Any]]:
+        """Message content met een cache breakpoint na de stabiele prefix"""
+        return cached_content(self.blocks[:self.prefix_blocks], self.blocks[self.prefix_blocks:])
+
+
+class ContextBuilder:
+    """Pakt herinneringen in een token budget
+
+    :param token_budget: Maximaal aantal tokens voor de hele context,
+        inclusief het oorspronkelijke bericht
+    :param dedup_threshold: Cosine similarity vanaf waar twee herinneringen
+        als duplicaat gelden
+    :param min_memory_tokens: Een herinnering die niet meer past wordt
+        afgekapt zolang er minstens zoveel tokens over zijn
+    :param token_counter: Functie die tokens van een tekst telt
+    """
+
+    def __init__(
+        self,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        dedup_threshold: float = 0.95,
+        min_memory_tokens: int = 32,
+        token_counter: Callable[[str], int] = estimate_tokens
+    ) -> None:
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.min_memory_tokens = min_memory_tokens
+        self.count_tokens = token_counter
+
+    def build(
+        self,
+        message: str,
+        memories: Sequence[VectorEntry],
+        memory_label: str = "Relevante herinnering",
+        message_label: str = "Oorspronkelijke bericht",
+        extra_blocks: Sequence[str] = (),
+        pinned_blocks: Sequence[str] = ()
+    ) -> BuiltContext:
+        """Bouw de context: herinneringen op volgorde van score, dan het bericht
+
+        Het bericht gaat altijd mee; herinneringen vullen het resterende budget.
+        extra_blocks (bijvoorbeeld MCP resources) komen na de herinneringen
+        en worden alleen opgenomen als ze nog volledig passen. pinned_blocks
+        (bijvoorbeeld de gespreksgeschiedenis van een sessie) gaan net als het
+        bericht altijd mee; ze staan vooraan, als prefix die tussen calls
+        gelijk blijft en dus gecachet kan worden.
+        """
+        message_block = f"{message_label}: {message}"
+        pinned = [block for block in pinned_blocks if block]
+        used = self.count_tokens(message_block) + sum(self.count_tokens(block) for block in pinned)
+        result = BuiltContext(text="", tokens_used=0, token_budget=self.token_budget)
+
+        blocks: List[str] = list(pinned)
+        kept_vectors: List[np.ndarray] = []
+        kept_texts: Set[str] = set()
+        for memory in self._ranked(memories):
+            content = memory.content
+            if self._is_duplicate(memory, content, kept_vectors, kept_texts):
+                result.duplicates_dropped += 1
+                continue
+
+            block = f"{memory_label}: {content}"
+            tokens = self.count_tokens(block)
+            remaining = self.token_budget - used
+            if tokens > remaining:
+                label_tokens = self.count_tokens(f"{memory_label}:")
+                if remaining - label_tokens < self.min_memory_tokens:
+                    result.over_budget_dropped += 1
+                    continue
+                block = f"{memory_label}: {truncate_to_tokens(content, remaining - label_tokens)}"
+                tokens = self.count_tokens(block)
+                result.truncated += 1
+
+            blocks.append(block)
+            used += tokens
+            result.memories.append(memory)
+            kept_texts.add(self._normalize(content))
+            embedding = memory.embedding
+            if embedding is not None:
+                kept_vectors.append(self._unit(embedding))
+
+        for block in extra_blocks:
+            tokens = self.count_tokens(block)
+            if tokens > self.token_budget - used:
+                result.over_budget_dropped += 1
+                continue
+            blocks.append(block)
+            used += tokens
+
+        blocks.append(message_block)
+        result.blocks = blocks
+        result.prefix_blocks = len(pinned)
+        result.text = "\n\n".join(blocks)
+        result.tokens_used = used
+        return result
+
+    @staticmethod
+    def _ranked(memories: Sequence[VectorEntry]) -> List[VectorEntry]:
+        return sorted(
+            memories,
+            key=lambda m: (m.score or 0.0, m.importance),
+            reverse=True
+        )
+
+    def _is_duplicate(
+        self,
+        memory: VectorEntry,
+        content: str,
+        kept_vectors: List[np.ndarray],
+        kept_texts: Set[str]
+    ) -> bool:
+        if self._normalize(content) in kept_texts:
+            return True
+        embedding = memory.embedding
+        if embedding is None or not kept_vectors:
+            return False
+        similarities = np.vstack(kept_vectors) @ self._unit(embedding)
+        return bool(similarities.max() >= self.dedup_threshold)
+
+    @staticmethod
+    def _normalize(content: str) -> str:
+        return " ".join(content.lower().split())
+
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+
+def memory_payload(memory: VectorEntry) -> Dict[str, Any]:
+    """Metadata van een herinnering voor API responses (zonder embedding)"""
+    return memory.to_dict()
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 import asyncio
 import logging
+import os
+import time
 from typing import List, Dict, Any, Optional, cast, Awaitable, TypeVar, Generic, Union
 from typing_extensions import TypeGuard
 from dataclasses import dataclass
@@ -8,12 +10,25 @@ from enum import Enum
 import anthropic 
 from anthropic.types import Message, MessageParam, TextBlock
 
+from .llm import cached_content, cached_system, create_message
+from .usage import UsageSummary, track_usage
+
 T = TypeVar('T')  # Voor generieke type hints
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("MASTERMIND_LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 
+# Vaste instructies van de strategist: als gecachete system prompt gedeeld
+# door de strategie- en de synthesestap van elke orchestrator run
+STRATEGIST_INSTRUCTIONS = """Task Analysis Required.
+For the task below, please provide:
+1. Task decomposition
+2. Strategic approach
+3. Potential challenges
+4. Recommended solution path"""
+
+
 class ModelType(Enum):
     HAIKU = "claude-3-haiku"
     SONNET = "claude-3.5-sonnet"
@@ -51,11 +66,48 @@ class TaskResult(Generic[T]):
     metadata: Optional[Dict[str, Any]] = None
 
 
+@dataclass
+class TaskBudget:
+    """Grenzen voor één orchestrator run
+
+    :param deadline_s: Totale tijd voor de run in seconden (None = geen limiet)
+    :param synthesis_share: Deel van de deadline dat voor de eindanalyse
+        vrijgehouden wordt; workers die dan nog bezig zijn worden geannuleerd
+    :param max_cost_usd: Kostenplafond; is het bereikt, dan worden lopende
+        workers geannuleerd en volgt meteen de eindanalyse
+    """
+    deadline_s: Optional[float] = None
+    synthesis_share: float = 0.3
+    max_cost_usd: Optional[float] = None
+
+
+class _RunClock:
+    """Resterende tijd van een run ten opzichte van zijn deadline"""
+
+    def __init__(self, deadline_s: Optional[float]) -> None:
+        self.started = time.monotonic()
+        self.deadline_s = deadline_s
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self, reserve: float = 0.0) -> Optional[float]:
+        """Seconden tot de deadline min reserve (None zonder deadline)"""
+        if self.deadline_s is None:
+            return None
+        return max(0.0, self.deadline_s * (1.0 - reserve) - self.elapsed)
+
+
 class Agent(ABC):
     def __init__(self, model_type: ModelType, client: anthropic.Client) -> None:
         self.model = model_type
         self.client = client
         self.context: Dict[str, Any] = {}
+        # Hedged LLM calls: None volgt MASTERMIND_HEDGE (zie mastermind.hedging)
+        self.hedge: Optional[bool] = None
+        # Cumulatieve token usage van deze agent
+        self.usage = UsageSummary()
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
     @abstractmethod
@@ -63,15 +115,40 @@ class Agent(ABC):
         """Process een taak async"""
         pass
 
-    async def think(self, prompt: str) -> str:
+    def message_params(
+        self,
+        prompt: Union[str, List[Dict[str, Any]]],
+        system: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Argumenten voor messages.create; ook gebruikt voor batch requests (bulk.py)"""
+        params: Dict[str, Any] = {
+            "model": self.model.value,
+            "max_tokens": 1024,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if system:
+            params["system"] = cached_system(system)
+        return params
+
+    async def think(
+        self,
+        prompt: Union[str, List[Dict[str, Any]]],
+        system: Optional[str] = None
+    ) -> str:
+        """Eén LLM call; prompt is tekst of een lijst content blokken
+
+        Een system prompt wordt als gecachete prefix meegestuurd.
+        """
         try:
-            self.logger.info(f"Agent {self.model.value} thinking about task")
-            message = self.client.messages.create(
-                model=self.model.value,
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            self.logger.debug(f"Received response from {self.model.value}")
+            self.logger.info("Agent %s thinking about task", self.model.value)
+            with track_usage() as usage:
+                message = await create_message(
+                    self.client,
+                    hedge=self.hedge,
+                    **self.message_params(prompt, system)
+                )
+            self.usage.merge(usage)
+            self.logger.debug("Received response from %s", self.model.value)
             
             if message.content and isinstance(message.content[0], TextBlock):
                 return str(message.content[0].text)
@@ -102,20 +179,23 @@ class StrategistAgent(Agent):
     def __init__(self, client: anthropic.Client) -> None:
         super().__init__(ModelType.SONNET, client)
 
+    def prompt(self, task: Any) -> List[Dict[str, Any]]:
+        """Content blokken voor een taak, of voor de synthese van een run
+
+        De taak is de stabiele prefix: de synthesestap begint met hetzelfde
+        blok en leest het uit de cache.
+        """
+        if isinstance(task, dict) and "original_task" in task:
+            prefix = [f"Task:\n{task['original_task']}"]
+            rest = [f"{key}:\n{value}" for key, value in task.items() if key != "original_task"]
+        else:
+            prefix, rest = [f"Task:\n{task}"], []
+        return cached_content(prefix, rest)
+
     async def process(self, task: Any) -> TaskResult[str]:
         try:
             self.logger.info("StrategistAgent analyzing task")
-            prompt = f"""
-            Task Analysis Required:
-            {task}
-            
-            Please provide:
-            1. Task decomposition
-            2. Strategic approach
-            3. Potential challenges
-            4. Recommended solution path
-            """
-            result = await self.think(prompt)
+            result = await self.think(self.prompt(task), system=STRATEGIST_INSTRUCTIONS)
             return TaskResult(success=True, data=result)
         except Exception as e:
             self.logger.error(f"Error in StrategistAgent: {str(e)}")
@@ -123,10 +203,12 @@ class StrategistAgent(Agent):
 
 
 class Orchestrator:
-    def __init__(self, api_key: str) -> None:
+    def __init__(self, api_key: str, budget: Optional[TaskBudget] = None) -> None:
         self.client = anthropic.Client(api_key=api_key)
         self.workers: List[WorkerAgent] = []
         self.strategist = StrategistAgent(self.client)
+        # Standaard grenzen per run; process_task kan ze per taak overschrijven
+        self.budget = budget or TaskBudget()
         self.logger = logging.getLogger(f"{__name__}.Orchestrator")
 
     def add_worker(self) -> None:
@@ -134,36 +216,153 @@ class Orchestrator:
         self.workers.append(worker)
         self.logger.info(f"Added new worker (total workers: {len(self.workers)})")
 
-    async def process_task(self, task: Any) -> TaskResult[Any]:
+    async def process_task(self, task: Any, budget: Optional[TaskBudget] = None) -> TaskResult[Any]:
+        """Strategie, parallelle workers en een eindanalyse
+
+        De token usage en kosten van alle LLM calls in deze run staan in
+        metadata["usage"] van het resultaat, uitgesplitst per fase in
+        metadata["usage_by_stage"], ook als de run mislukt.
+
+        Met een deadline of kostenplafond (budget, anders self.budget) wacht
+        de run niet op trage workers: bij het naderen van de deadline worden
+        ze geannuleerd en volgt de eindanalyse over de resultaten die er
+        zijn. metadata["partial"] is dan True en metadata["run"] vertelt
+        hoeveel workers er afgerond, mislukt en geannuleerd zijn.
+        """
         self.logger.info("Starting task processing")
+        budget = budget or self.budget
+        stages: Dict[str, UsageSummary] = {}
+        run: Dict[str, Any] = {
+            "deadline_s": budget.deadline_s,
+            "stopped_by": None,
+            "workers_total": len(self.workers),
+            "workers_completed": 0,
+            "workers_failed": 0,
+            "workers_cancelled": 0
+        }
+        clock = _RunClock(budget.deadline_s)
+        with track_usage() as usage:
+            result = await self._run_task(task, stages, budget, clock, usage, run)
+        run["elapsed_s"] = round(clock.elapsed, 3)
+        result.metadata = {
+            **(result.metadata or {}),
+            "partial": run["stopped_by"] is not None,
+            "run": run,
+            "usage": usage.to_dict(),
+            "usage_by_stage": {stage: summary.to_dict() for stage, summary in stages.items()}
+        }
+        self.logger.info(
+            "Task usage: %d calls, %d tokens, $%.4f",
+            usage.calls, usage.total_tokens, usage.cost_usd
+        )
+        return result
+
+    async def _run_task(
+        self,
+        task: Any,
+        stages: Dict[str, UsageSummary],
+        budget: TaskBudget,
+        clock: _RunClock,
+        usage: UsageSummary,
+        run: Dict[str, Any]
+    ) -> TaskResult[Any]:
         try:
             # First, get strategic analysis
             self.logger.debug("Getting strategic analysis")
-            strategy = await self.strategist.process(task)
+            with track_usage() as stages["strategy"]:
+                try:
+                    strategy = await asyncio.wait_for(
+                        self.strategist.process(task),
+                        timeout=clock.remaining(budget.synthesis_share)
+                    )
+                except asyncio.TimeoutError:
+                    run["stopped_by"] = "deadline"
+                    self.logger.warning("Strategic analysis missed the deadline")
+                    return TaskResult(success=False, data=None, error="Deadline exceeded during strategic analysis")
             if not strategy.success:
                 self.logger.error(f"Strategic analysis failed: {strategy.error}")
                 return strategy
 
-            # Distribute subtasks to workers
+            # Distribute subtasks to workers and gather results until the deadline
             self.logger.debug("Distributing tasks to workers")
-            worker_tasks = [
-                worker.process(strategy.data) for worker in self.workers
-            ]
-
-            # Gather results
-            self.logger.debug("Gathering worker results")
-            results = await asyncio.gather(*worker_tasks, return_exceptions=True)
+            with track_usage() as stages["workers"]:
+                results = await self._gather_workers(strategy.data, budget, clock, usage, run)
 
-            # Combine and analyze results
-            self.logger.debug("Performing final analysis")
-            final_analysis = await self.strategist.process({
+            synthesis_input: Dict[str, Any] = {
                 "original_task": task,
                 "strategy": strategy.data,
                 "worker_results": results
-            })
+            }
+            if run["stopped_by"] is not None:
+                synthesis_input["note"] = (
+                    f"Only {len(results)} of {run['workers_total']} worker results arrived "
+                    f"before the {run['stopped_by']} limit; base the analysis on these."
+                )
+
+            # Combine and analyze results
+            self.logger.debug("Performing final analysis")
+            with track_usage() as stages["synthesis"]:
+                try:
+                    final_analysis = await asyncio.wait_for(
+                        self.strategist.process(synthesis_input),
+                        timeout=clock.remaining()
+                    )
+                except asyncio.TimeoutError:
+                    run["stopped_by"] = "deadline"
+                    self.logger.warning("Final analysis missed the deadline")
+                    return TaskResult(success=False, data=None, error="Deadline exceeded during final analysis")
 
             self.logger.info("Task processing completed")
             return final_analysis
         except Exception as e:
             self.logger.error(f"Error in task processing: {str(e)}")
-            return TaskResult(success=False, data=None, error=str(e))
\ No newline at end of file
+            return TaskResult(success=False, data=None, error=str(e))
+
+    async def _gather_workers(
+        self,
+        subtask: Any,
+        budget: TaskBudget,
+        clock: _RunClock,
+        usage: UsageSummary,
+        run: Dict[str, Any]
+    ) -> List[Any]:
+        """Resultaten van de workers die binnen de deadline en het kostenplafond klaar zijn
+
+        Net als gather(return_exceptions=True) staan excepties als waarde in
+        de lijst, in de volgorde van de workers.
+        """
+        tasks = [asyncio.ensure_future(worker.process(subtask)) for worker in self.workers]
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = clock.remaining(budget.synthesis_share)
+                if remaining is not None and remaining <= 0:
+                    run["stopped_by"] = "deadline"
+                    break
+                if budget.max_cost_usd is not None and usage.cost_usd >= budget.max_cost_usd:
+                    run["stopped_by"] = "budget"
+                    break
+                _, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for straggler in pending:
+                straggler.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        results: List[Any] = []
+        for done in tasks:
+            if done.cancelled():
+                run["workers_cancelled"] += 1
+                continue
+            result = done.exception() or done.result()
+            if isinstance(result, TaskResult) and result.success:
+                run["workers_completed"] += 1
+            else:
+                run["workers_failed"] += 1
+            results.append(result)
+        if run["workers_cancelled"]:
+            self.logger.warning(
+                "Cancelled %d of %d workers (%s limit)",
+                run["workers_cancelled"], len(tasks), run["stopped_by"]
+            )
+        return results
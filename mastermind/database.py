@@ -1,10 +1,27 @@
-from typing import List, Optional, Any, Type, cast
-from sqlalchemy import Column, Integer, String, Float
+import asyncio
+import os
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Any, Dict, Type, cast
+from sqlalchemy import Column, DateTime, Integer, String, Float, ForeignKey, Index, JSON, LargeBinary, event, inspect
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.orm import DeclarativeBase, Mapped, defer, mapped_column
 from sqlalchemy.future import select
 
 PERSIST_DIRECTORY = "./chroma_db"
+DATABASE_URL = os.getenv("MASTERMIND_DATABASE_URL", "sqlite+aiosqlite:///memories.db")
+# Met meerdere worker processen: schrijven via een exclusieve lock op <database>.lock
+WRITE_LOCK = os.getenv("MASTERMIND_WRITE_LOCK", "").lower() in ("1", "true", "yes")
+
+try:
+    import fcntl
+except ImportError:  # Windows: alleen de lock binnen het proces
+    fcntl = None  # type: ignore[assignment]
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 # Moderne SQLAlchemy 2.0 aanpak
 class Base(DeclarativeBase):
@@ -12,50 +29,179 @@ class Base(DeclarativeBase):
 
 class Memory(Base):
     __tablename__ = 'memories'
-    
+    __table_args__ = (
+        # Partitie index: filteren op collectie + categorie raakt alleen de
+        # relevante rijen, belang wordt meteen uit de index gelezen
+        Index('ix_memories_partition', 'collection', 'category', 'importance'),
+        # Keyset paginering per categorie (SQLite neemt het id mee in de index)
+        Index('ix_memories_category', 'category'),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     content: Mapped[str] = mapped_column()
     category: Mapped[str] = mapped_column()
     importance: Mapped[float] = mapped_column()
+    collection: Mapped[Optional[str]] = mapped_column(nullable=True)
+    embedding: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    attributes: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True)
+    # Chunks van lange content verwijzen naar hun parent rij (zonder embedding)
+    parent_id: Mapped[Optional[int]] = mapped_column(ForeignKey('memories.id'), nullable=True, index=True)
+    chunk_index: Mapped[Optional[int]] = mapped_column(nullable=True)
+    # UTC; leeg voor rijen van voor deze kolommen
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, default=_utcnow)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, default=_utcnow, onupdate=_utcnow)
 
 # Setup de async SQLite database
-engine = create_async_engine('sqlite+aiosqlite:///memories.db')
+engine = create_async_engine(DATABASE_URL)
 async_session = async_sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+if engine.url.get_backend_name() == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        # WAL: lezers wachten niet op de schrijver; busy_timeout vangt korte lock conflicten op
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
+# Eén schrijver tegelijk: een asyncio lock per event loop binnen het proces,
+# plus (met MASTERMIND_WRITE_LOCK) een flock tussen de worker processen
+_write_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+def _lock_file_path(name: Optional[str] = None) -> Optional[str]:
+    if not WRITE_LOCK or fcntl is None or engine.url.get_backend_name() != "sqlite":
+        return None
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return None
+    return os.path.abspath(database) + (f".{name}.lock" if name else ".lock")
+
+# Leider per periodieke taak: fd van de vastgehouden flock
+_leader_fds: Dict[str, int] = {}
+
+def try_lead(role: str) -> bool:
+    """Of dit proces de periodieke taak role uitvoert (non-blocking flock)
+
+    Met meerdere workers (MASTERMIND_WRITE_LOCK) wordt één proces leider en
+    blijft dat tot release_lead of het einde van het proces; de anderen
+    proberen het bij elke ronde opnieuw. Met één proces altijd True.
+    """
+    if role in _leader_fds:
+        return True
+    path = _lock_file_path(role)
+    if path is None:
+        return True
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    _leader_fds[role] = fd
+    return True
+
+def release_lead(role: str) -> None:
+    fd = _leader_fds.pop(role, None)
+    if fd is not None:
+        os.close(fd)  # Geeft ook de flock vrij
+
+def _acquire_file_lock(path: str) -> int:
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+def _release_file_lock(fd: int) -> None:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def _release_acquired_lock(future: "asyncio.Future[int]") -> None:
+    if not future.cancelled() and future.exception() is None:
+        _release_file_lock(future.result())
+
+@asynccontextmanager
+async def write_lock() -> AsyncIterator[None]:
+    """Exclusieve schrijftoegang tot de database (single writer)"""
+    loop = asyncio.get_running_loop()
+    lock = _write_locks.get(loop)
+    if lock is None:
+        lock = _write_locks[loop] = asyncio.Lock()
+    async with lock:
+        path = _lock_file_path()
+        if path is None:
+            yield
+            return
+        acquire = loop.run_in_executor(None, _acquire_file_lock, path)
+        try:
+            fd = await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # De thread wacht nog in flock; geef de lock vrij zodra hij hem krijgt
+            acquire.add_done_callback(_release_acquired_lock)
+            raise
+        try:
+            yield
+        finally:
+            _release_file_lock(fd)
+
+@asynccontextmanager
+async def write_session() -> AsyncIterator[AsyncSession]:
+    """Sessie voor schrijfacties, onder de write lock"""
+    async with write_lock():
+        async with async_session() as session:
+            yield session
+
+def _migrate_memories_table(conn: Connection) -> None:
+    """Voeg ontbrekende kolommen en indexen toe aan een bestaande memories tabel"""
+    existing = {column['name'] for column in inspect(conn).get_columns(Memory.__tablename__)}
+    for column in Memory.__table__.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(
+                f"ALTER TABLE {Memory.__tablename__} ADD COLUMN {column.name} {column_type}"
+            )
+    for index in Memory.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
 async def init_db() -> None:
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Onder de write lock: met meerdere workers draait dit in elk proces
+    async with write_lock():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_migrate_memories_table)
 
 async def get_session() -> AsyncSession:
     session = async_session()
     return session
 
 async def add_memory(content: str, category: str, importance: float) -> None:
-    async with async_session() as session:
+    async with write_session() as session:
         new_memory = Memory(content=content, category=category, importance=importance)
         session.add(new_memory)
         await session.commit()
 
 async def get_memories_by_category(category: str) -> List[Memory]:
-    async with async_session() as session:
-        result = await session.execute(
-            select(Memory).filter_by(category=category)
-        )
-        return list(result.scalars().all())
+    """Alle herinneringen van een categorie in één lijst; gebruik iter_memories voor grote stores"""
+    return [memory async for memory in iter_memories(category=category, include_embeddings=True)]
 
 async def update_memory_importance(memory_id: int, importance: float) -> None:
-    async with async_session() as session:
+    async with write_session() as session:
         memory = await session.get(Memory, memory_id)
         if memory:
             memory.importance = importance
             await session.commit()
 
 async def delete_memory(memory_id: int) -> None:
-    async with async_session() as session:
+    async with write_session() as session:
         memory = await session.get(Memory, memory_id)
         if memory:
             await session.delete(memory)
@@ -65,6 +211,56 @@ async def create_memory(content: str, category: str, importance: float) -> Memor
     return Memory(content=content, category=category, importance=importance)
 
 async def get_all_memories() -> List[Memory]:
-    async with async_session() as session:
-        result = await session.execute(select(Memory))
-        return list(result.scalars().all())
\ No newline at end of file
+    """Alle herinneringen in één lijst; gebruik iter_memories voor grote stores"""
+    return [memory async for memory in iter_memories(include_embeddings=True)]
+
+async def iter_memory_pages(
+    category: Optional[str] = None,
+    collection: Optional[str] = None,
+    after_id: int = 0,
+    page_size: int = 500,
+    include_chunks: bool = True,
+    include_embeddings: bool = False
+) -> AsyncIterator[List[Memory]]:
+    """Herinneringen op volgorde van id, per pagina van page_size
+
+    Keyset paginering (id > laatste id) met een korte sessie per pagina:
+    constant geheugen en geen lees transactie die de hele scan openstaat.
+    Zonder include_embeddings wordt de embedding kolom niet geladen (en
+    geeft toegang ertoe een fout).
+    """
+    last_id = after_id
+    while True:
+        query = select(Memory).where(Memory.id > last_id)
+        if category is not None:
+            query = query.where(Memory.category == category)
+        if collection is not None:
+            query = query.where(Memory.collection == collection)
+        if not include_chunks:
+            query = query.where(Memory.parent_id.is_(None))
+        if not include_embeddings:
+            query = query.options(defer(Memory.embedding, raiseload=True))
+        async with async_session() as session:
+            result = await session.execute(query.order_by(Memory.id).limit(page_size))
+            page = list(result.scalars().all())
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1].id
+
+async def iter_memories(
+    category: Optional[str] = None,
+    collection: Optional[str] = None,
+    after_id: int = 0,
+    page_size: int = 500,
+    include_chunks: bool = True,
+    include_embeddings: bool = False
+) -> AsyncIterator[Memory]:
+    """Herinneringen één voor één, zie iter_memory_pages"""
+    async for page in iter_memory_pages(
+        category, collection, after_id, page_size, include_chunks, include_embeddings
+    ):
+        for memory in page:
+            yield memory
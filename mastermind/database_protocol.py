@@ -5,14 +5,15 @@ import uuid
 
 @dataclass
 class DatabaseEntry:
-    """Generieke database entry met standaard metadata"""
-    id: str = str(uuid.uuid4())
-    created_at: datetime = datetime.now()
-    updated_at: datetime = datetime.now()
-    metadata: Dict[str, Any] = field(default_factory=dict)
+    """Generieke database entry met standaard metadata
 
-    def __init__(self, metadata: Dict[str, Any]):
-        self.metadata = metadata
+    id en timestamps worden per entry aangemaakt (default_factory), niet
+    één keer bij het laden van de module.
+    """
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: datetime = field(default_factory=datetime.now)
+    updated_at: datetime = field(default_factory=datetime.now)
 
     def to_dict(self) -> Dict[str, Any]:
         """Converteer entry naar dictionary"""
@@ -0,0 +1,368 @@
+"""Gedeelde embedding service voor multi-worker deployments
+
+Eén proces laadt het embedding model en bedient alle uvicorn workers via
+een Unix domain socket, zodat niet elke worker zijn eigen model in het
+geheugen heeft. Gelijktijdige requests van verschillende workers worden
+samengevoegd tot één encode aanroep (micro-batching) en recente teksten
+komen uit een gedeelde LRU cache.
+
+Protocol (per frame een 4-byte big-endian lengte, dan de payload):
+    request:  JSON {"op": "encode", "texts": [...]} of {"op": "info"}
+    response: 1 status byte (0 = ok, 1 = fout), dan voor encode
+              uint32 rijen + uint32 dimensie + float32 data (little endian),
+              voor info JSON, en bij een fout de foutmelding als UTF-8
+
+Starten (doet `python -m mastermind.server --workers N` automatisch):
+    python -m mastermind.embedding_service --socket /tmp/mastermind-embeddings.sock
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embeddings import EmbeddingBackend, create_embedding_backend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.getenv(
+    "MASTERMIND_EMBEDDING_SOCKET",
+    os.path.join(tempfile.gettempdir(), "mastermind-embeddings.sock")
+)
+
+_LENGTH = struct.Struct(">I")
+_SHAPE = struct.Struct("<II")
+_OK, _ERROR = b"\x00", b"\x01"
+
+
+def _frame(payload: bytes) -> bytes:
+    return _LENGTH.pack(len(payload)) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def _encode_matrix(matrix: np.ndarray) -> bytes:
+    rows, dim = matrix.shape
+    return _OK + _SHAPE.pack(rows, dim) + np.ascontiguousarray(matrix, dtype="<f4").tobytes()
+
+
+def _decode_matrix(payload: bytes) -> np.ndarray:
+    rows, dim = _SHAPE.unpack_from(payload, 0)
+    return np.frombuffer(payload, dtype="<f4", offset=_SHAPE.size).reshape(rows, dim)
+
+
+class EmbeddingServer:
+    """Asyncio Unix socket server rond een EmbeddingBackend
+
+    :param backend: Backend die het echte werk doet
+    :param socket_path: Pad van de Unix socket
+    :param max_batch: Maximaal aantal teksten per encode aanroep
+    :param batch_window: Seconden wachten op meer requests voor een batch
+    :param cache_size: Aantal embeddings in de gedeelde LRU cache (0 = uit)
+    """
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        socket_path: str = DEFAULT_SOCKET,
+        max_batch: int = 64,
+        batch_window: float = 0.002,
+        cache_size: int = 10000
+    ) -> None:
+        self.backend = backend
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        # Pas in start() aangemaakt: op Python < 3.10 bindt een Queue aan de loop
+        # van het moment van aanmaken, en de server wordt buiten de loop gebouwd
+        self._queue: "Optional[asyncio.Queue[Tuple[List[str], asyncio.Future[np.ndarray]]]]" = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._batcher: Optional["asyncio.Task[None]"] = None
+        # Open client verbindingen en hun handler taken, om bij close() te sluiten
+        self._clients: Dict[asyncio.StreamWriter, "asyncio.Task[Any]"] = {}
+        # Eén model, één thread: batches worden na elkaar ge-encode
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-service")
+        self.cache_hits = 0
+        self.encoded = 0
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.backend.load)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._queue = asyncio.Queue()
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        self._batcher = asyncio.create_task(self._batch_loop(self._queue))
+        logger.info("Embedding service listening on %s (%s)", self.socket_path, self.backend.name)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        assert self._server is not None
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            handlers = list(self._clients.values())
+            for writer, task in list(self._clients.items()):
+                writer.close()
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+            self._batcher = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed via de cache en de gedeelde batch queue"""
+        keys = [hashlib.sha1(text.encode("utf-8")).digest() for text in texts]
+        result = np.zeros((len(texts), self.backend.dimension), dtype=np.float32)
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self._cache.get(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                self._cache.move_to_end(key)
+                result[i] = cached
+                self.cache_hits += 1
+        if missing:
+            if self._queue is None:
+                raise RuntimeError("EmbeddingServer is not started")
+            future: "asyncio.Future[np.ndarray]" = asyncio.get_running_loop().create_future()
+            await self._queue.put(([texts[i] for i in missing], future))
+            encoded = await future
+            for row, i in enumerate(missing):
+                result[i] = encoded[row]
+                self._remember(keys[i], encoded[row])
+        return result
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = vector
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _batch_loop(self, queue: "asyncio.Queue[Tuple[List[str], asyncio.Future[np.ndarray]]]") -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await queue.get()]
+            count = len(jobs[0][0])
+            # Kort wachten zodat requests van andere workers mee kunnen
+            deadline = loop.time() + self.batch_window
+            while count < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                jobs.append(job)
+                count += len(job[0])
+
+            texts = [text for job_texts, _ in jobs for text in job_texts]
+            try:
+                matrix = await loop.run_in_executor(self._executor, self.backend.encode, texts)
+            except Exception as e:
+                for _, future in jobs:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.encoded += len(texts)
+            offset = 0
+            for job_texts, future in jobs:
+                if not future.done():
+                    future.set_result(matrix[offset:offset + len(job_texts)])
+                offset += len(job_texts)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self._clients[writer] = task
+        try:
+            while True:
+                try:
+                    request = json.loads(await _read_frame(reader))
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                try:
+                    if request.get("op") == "info":
+                        payload = _OK + json.dumps(self.info()).encode("utf-8")
+                    else:
+                        payload = _encode_matrix(await self.encode([str(t) for t in request["texts"]]))
+                except Exception as e:
+                    logger.error(f"Embedding request failed: {str(e)}")
+                    payload = _ERROR + f"{type(e).__name__}: {e}".encode("utf-8")
+                writer.write(_frame(payload))
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError):
+            # Server sluit of client is weg: een gewone disconnect
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "dimension": self.backend.dimension,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "encoded": self.encoded
+        }
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """Embedding backend die een EmbeddingServer aanroept
+
+    Elke thread (de executor van KnowledgeCluster) houdt een eigen
+    verbinding open; na een verbroken verbinding wordt één keer opnieuw
+    verbonden.
+    """
+
+    name = "remote"
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 60.0) -> None:
+        super().__init__()
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._dimension = 0
+
+    def _load(self) -> None:
+        info = json.loads(self._call({"op": "info"}))
+        self._dimension = int(info["dimension"])
+        logger.info("Using embedding service at %s (%s)", self.socket_path, info["backend"])
+
+    @property
+    def dimension(self) -> int:
+        self.load()
+        return self._dimension
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return _decode_matrix(self._call({"op": "encode", "texts": texts}))
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _call(self, request: Dict[str, Any]) -> bytes:
+        data = _frame(json.dumps(request).encode("utf-8"))
+        for attempt in (1, 2):
+            try:
+                conn = self._connection()
+                conn.sendall(data)
+                (length,) = _LENGTH.unpack(self._recv(conn, _LENGTH.size))
+                payload = self._recv(conn, length)
+                break
+            except (ConnectionError, BrokenPipeError, socket.timeout, OSError):
+                self._drop_connection()
+                if attempt == 2:
+                    raise
+        if payload[:1] == _ERROR:
+            raise RuntimeError(f"Embedding service error: {payload[1:].decode('utf-8', 'replace')}")
+        return payload[1:]
+
+    def _drop_connection(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _recv(conn: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = conn.recv(min(size, 1 << 20))
+            if not chunk:
+                raise ConnectionError("Embedding service closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+
+def spawn_embedding_service(
+    socket_path: str = DEFAULT_SOCKET,
+    backend: Optional[str] = None,
+    ready_timeout: float = 600.0
+) -> "subprocess.Popen[bytes]":
+    """Start de service als subprocess en wacht tot hij verbindingen accepteert
+
+    De timeout is ruim omdat de eerste start het model kan downloaden.
+    """
+    command = [sys.executable, "-m", "mastermind.embedding_service", "--socket", socket_path]
+    if backend:
+        command += ["--backend", backend]
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    process = subprocess.Popen(command)
+    deadline = time.monotonic() + ready_timeout
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"Embedding service exited with code {process.returncode}")
+        if os.path.exists(socket_path):
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                    probe.connect(socket_path)
+                return process
+            except OSError:
+                pass
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise RuntimeError("Embedding service did not become ready in time")
+        time.sleep(0.1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared embedding service for MasterMind workers")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--backend", default=None, help="standaard MASTERMIND_EMBEDDING_BACKEND")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--cache-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("MASTERMIND_LOG_LEVEL", "INFO").upper())
+    backend = create_embedding_backend(args.backend)
+    if isinstance(backend, RemoteEmbeddingBackend):
+        parser.error("The embedding service needs a local backend, not 'remote'")
+    server = EmbeddingServer(backend, args.socket, max_batch=args.max_batch, cache_size=args.cache_size)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
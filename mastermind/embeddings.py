@@ -0,0 +1,272 @@
+"""Pluggable embedding backends for KnowledgeCluster
+
+Backends:
+    sentence-transformers - SentenceTransformer in PyTorch (standaard)
+    onnx / onnx-int8      - ONNX Runtime op CPU, optioneel dynamisch int8 gekwantiseerd
+    hash                  - deterministische feature hashing, zonder model (tests)
+    remote                - gedeelde embedding service over een Unix socket
+                            (zie mastermind.embedding_service)
+
+Kies een backend via KnowledgeCluster(embedding_backend=...) of de
+omgevingsvariabele MASTERMIND_EMBEDDING_BACKEND.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "sentence-transformers"
+ONNX_CACHE_DIR = os.path.expanduser(os.getenv("MASTERMIND_ONNX_CACHE", "~/.cache/mastermind/onnx"))
+
+
+def _hub_model_id(model_name: str) -> str:
+    """Korte SentenceTransformer namen (all-MiniLM-L6-v2) naar volledige hub id"""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def _l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingBackend(ABC):
+    """Basis voor embedding backends
+
+    Subklassen implementeren _load() en _encode(); het laden gebeurt lazy en
+    thread-safe bij het eerste gebruik, of vooraf via load().
+    """
+
+    name: str = "base"
+
+    def __init__(self) -> None:
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def load(self) -> None:
+        """Laad model en runtime (idempotent)"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed een batch teksten naar een (n, dim) float32 matrix"""
+        self.load()
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.asarray(self._encode(list(texts)), dtype=np.float32)
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        """Lengte van de embedding vectoren"""
+
+    @abstractmethod
+    def _load(self) -> None:
+        """Laad het model; wordt hooguit één keer aangeroepen"""
+
+    @abstractmethod
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Embed een niet-lege lijst teksten"""
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """SentenceTransformer model in PyTorch"""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', batch_size: int = 32) -> None:
+        super().__init__()
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model: Optional["SentenceTransformer"] = None
+
+    def _load(self) -> None:
+        from sentence_transformers import SentenceTransformer
+        logger.info("Loading SentenceTransformer model %s", self.model_name)
+        self._model = SentenceTransformer(self.model_name)
+
+    @property
+    def dimension(self) -> int:
+        self.load()
+        assert self._model is not None
+        return int(self._model.get_sentence_embedding_dimension() or 0)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        assert self._model is not None
+        return np.asarray(
+            self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+        )
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """Sentence embeddings via ONNX Runtime op CPU
+
+    Het model wordt eenmalig met optimum naar ONNX geëxporteerd (en bij
+    quantize=True dynamisch naar int8 gekwantiseerd) in ONNX_CACHE_DIR.
+    Inference gebruikt daarna alleen onnxruntime en de tokenizer, met mean
+    pooling en L2 normalisatie zoals de MiniLM SentenceTransformer modellen.
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        model_name: str = 'all-MiniLM-L6-v2',
+        quantize: bool = True,
+        max_length: int = 256,
+        batch_size: int = 32,
+        intra_op_threads: Optional[int] = None,
+        cache_dir: str = ONNX_CACHE_DIR
+    ) -> None:
+        super().__init__()
+        self.model_name = _hub_model_id(model_name)
+        self.quantize = quantize
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.intra_op_threads = intra_op_threads
+        self.cache_dir = cache_dir
+        self._session: Any = None
+        self._tokenizer: Any = None
+        self._input_names: List[str] = []
+        self._dimension = 0
+
+    @property
+    def model_dir(self) -> str:
+        suffix = "-int8" if self.quantize else ""
+        return os.path.join(self.cache_dir, self.model_name.replace("/", "__") + suffix)
+
+    def _export(self) -> str:
+        """Exporteer (en kwantiseer) het model naar ONNX als dat nog niet gebeurd is"""
+        model_file = os.path.join(self.model_dir, "model_quantized.onnx" if self.quantize else "model.onnx")
+        if os.path.exists(model_file):
+            return model_file
+
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "ONNX export requires optimum: pip install 'project-mastermind[onnx]'"
+            ) from e
+
+        logger.info("Exporting %s to ONNX in %s", self.model_name, self.model_dir)
+        export_dir = self.model_dir if not self.quantize else self.model_dir + "-fp32"
+        model = ORTModelForFeatureExtraction.from_pretrained(self.model_name, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(self.model_name).save_pretrained(self.model_dir)
+        if self.quantize:
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=self.model_dir, quantization_config=config)
+        return model_file
+
+    def _load(self) -> None:
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_file = self._export()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        self._session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self._input_names = [i.name for i in self._session.get_inputs()]
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        self._dimension = int(self._session.get_outputs()[0].shape[-1])
+
+    @property
+    def dimension(self) -> int:
+        self.load()
+        return self._dimension
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self._tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self._input_names if name in encoded}
+            if "token_type_ids" in self._input_names and "token_type_ids" not in feed:
+                feed["token_type_ids"] = np.zeros_like(encoded["input_ids"], dtype=np.int64)
+            hidden = self._session.run(None, feed)[0]
+
+            # Mean pooling over de niet-padding tokens
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(_l2_normalize(pooled.astype(np.float32)))
+        return np.vstack(batches)
+
+
+class HashEmbeddingBackend(EmbeddingBackend):
+    """Deterministische feature-hashing embeddings zonder model
+
+    Elk woord (lowercase) wordt met blake2b op een index en een teken
+    gehasht. Teksten met overlappende woorden krijgen dus een hogere cosine
+    similarity, wat genoeg is voor tests en lokale ontwikkeling.
+    """
+
+    name = "hash"
+    _token_pattern = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, dimension: int = 384) -> None:
+        super().__init__()
+        self._dimension = dimension
+
+    def _load(self) -> None:
+        pass
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self._dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in self._token_pattern.findall(text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                matrix[row, value % self._dimension] += 1.0 if (value >> 63) & 1 else -1.0
+        return _l2_normalize(matrix)
+
+
+def create_embedding_backend(
+    name: Optional[str] = None,
+    model_name: str = 'all-MiniLM-L6-v2',
+    **kwargs: Any
+) -> EmbeddingBackend:
+    """Maak een backend op naam (standaard MASTERMIND_EMBEDDING_BACKEND)"""
+    name = (name or os.getenv("MASTERMIND_EMBEDDING_BACKEND") or DEFAULT_BACKEND).lower()
+    if name in ("sentence-transformers", "sentence_transformers", "torch"):
+        return SentenceTransformerBackend(model_name, **kwargs)
+    if name == "onnx":
+        return OnnxEmbeddingBackend(model_name, quantize=False, **kwargs)
+    if name in ("onnx-int8", "onnx_int8"):
+        return OnnxEmbeddingBackend(model_name, quantize=True, **kwargs)
+    if name == "hash":
+        return HashEmbeddingBackend(**kwargs)
+    if name == "remote":
+        from .embedding_service import RemoteEmbeddingBackend
+        return RemoteEmbeddingBackend(**kwargs)
+    raise ValueError(f"Onbekende embedding backend: {name}")
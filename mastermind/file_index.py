@@ -0,0 +1,366 @@
+"""Incrementele index van projectbestanden
+
+De FileIndex doorloopt een projectmap, hasht en chunkt tekstbestanden en
+embedt ze via de KnowledgeCluster in een eigen collectie. Een manifest met
+mtime, grootte en sha256 per bestand zorgt dat een volgende scan alleen
+gewijzigde, nieuwe en verwijderde bestanden verwerkt: onveranderde mtime en
+grootte slaan zelfs het hashen over. Met start_watching() pollt de index de
+map periodiek, zodat de FileSystemProvider altijd een actuele zoekindex heeft.
+
+Het manifest staat naast de database (niet in de projectmap) en wordt bij
+elke scan tegen de memories tabel gecontroleerd: bestanden waarvan de rijen
+ontbreken of dubbel staan (na een lege database of een snapshot import)
+worden opnieuw geïndexeerd, rijen van onbekende bestanden verwijderd.
+
+Met meerdere worker processen scant alleen het proces dat de lock op het
+manifest heeft; de andere lezen het manifest opnieuw als het verandert.
+"""
+import asyncio
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .database import engine
+from .vectordb import Glob, VectorDatabase
+
+try:
+    import fcntl
+except ImportError:  # Windows: elk proces scant zelf
+    fcntl = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from .knowledge_cluster import KnowledgeCluster
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATTERNS: Tuple[str, ...] = (
+    "*.py", "*.md", "*.txt", "*.rst", "*.toml", "*.cfg", "*.ini", "*.yaml", "*.yml",
+    "*.json", "*.js", "*.jsx", "*.ts", "*.tsx", "*.css", "*.html", "*.sh", "*.sql"
+)
+DEFAULT_EXCLUDE_DIRS: Tuple[str, ...] = (
+    ".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv",
+    ".mypy_cache", ".pytest_cache", "dist", "build", "target"
+)
+
+# Blokgrootte voor het hashen van bestanden
+_HASH_BLOCK = 1024 * 1024
+# Hoeveel bytes aan het begin van een bestand op NUL bytes gecontroleerd worden
+_BINARY_SNIFF = 8192
+
+
+def default_manifest_path(root: str, collection: str) -> str:
+    """Manifest naast de SQLite database, per projectmap en collectie
+
+    Zonder databasebestand (een andere backend of :memory:) komt het in
+    ~/.cache/mastermind terecht.
+    """
+    database = engine.url.database if engine.url.get_backend_name() == "sqlite" else None
+    key = hashlib.sha1(
+        f"{engine.url.render_as_string(hide_password=True)}\0{os.path.abspath(root)}".encode("utf-8")
+    ).hexdigest()[:12]
+    if database and database != ":memory:":
+        database = os.path.abspath(database)
+        return f"{database}.{collection}-{key}.index.json"
+    directory = os.path.join(os.path.expanduser("~"), ".cache", "mastermind")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{collection}-{key}.index.json")
+
+
+@dataclass
+class FileRecord:
+    """Manifest regel voor één geïndexeerd bestand"""
+    path: str
+    mtime_ns: int
+    size: int
+    sha256: str
+    chunks: int
+
+
+@dataclass
+class IndexStats:
+    """Resultaat van één scan"""
+    scanned: int = 0
+    indexed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+
+class FileIndex:
+    """Zoekindex over de tekstbestanden in een projectmap
+
+    :param cluster: KnowledgeCluster die de embeddings maakt
+    :param root: Projectmap die geïndexeerd wordt
+    :param patterns: Glob patronen van bestanden die meegenomen worden
+    :param exclude_dirs: Mapnamen die overgeslagen worden (naast verborgen mappen)
+    :param manifest_path: JSON manifest; standaard naast de database (zie default_manifest_path)
+    :param max_file_bytes: Grotere bestanden worden niet geïndexeerd
+    :param collection: Collectie in de memories tabel
+    :param importance: Belang van geïndexeerde bestanden
+    """
+
+    def __init__(
+        self,
+        cluster: "KnowledgeCluster",
+        root: str,
+        patterns: Sequence[str] = DEFAULT_PATTERNS,
+        exclude_dirs: Sequence[str] = DEFAULT_EXCLUDE_DIRS,
+        manifest_path: Optional[str] = None,
+        max_file_bytes: int = 1024 * 1024,
+        collection: str = "project_files",
+        importance: float = 0.5
+    ) -> None:
+        self.cluster = cluster
+        self.root = os.path.abspath(root)
+        self.patterns = tuple(patterns)
+        self.exclude_dirs = set(exclude_dirs)
+        self.manifest_path = manifest_path or default_manifest_path(self.root, collection)
+        self.max_file_bytes = max_file_bytes
+        self.importance = importance
+        self.db = VectorDatabase(collection_name=collection)
+        self.files: Dict[str, FileRecord] = self._load_manifest()
+        self.last_stats: Optional[IndexStats] = None
+        self._lock = asyncio.Lock()
+        self._manifest_dirty = False
+        self._watch_task: Optional["asyncio.Task[None]"] = None
+        self._leader_fd: Optional[int] = None
+        self._manifest_mtime = self._manifest_version()
+        self._listeners: List[Callable[[IndexStats], None]] = []
+
+    def add_listener(self, callback: Callable[[IndexStats], None]) -> None:
+        """Roep callback aan na elke scan die de index veranderde"""
+        self._listeners.append(callback)
+
+    async def scan(self) -> IndexStats:
+        """Indexeer nieuwe en gewijzigde bestanden, vergeet verwijderde"""
+        async with self._lock:
+            started = time.perf_counter()
+            stats = IndexStats()
+            loop = asyncio.get_running_loop()
+            found = await loop.run_in_executor(None, lambda: dict(self._walk()))
+            stored = await self.db.count_by_attribute('path')
+            self._reconcile(stored)
+
+            for rel_path, stat in found.items():
+                stats.scanned += 1
+                try:
+                    changed = await self._index_file(rel_path, stat)
+                except (OSError, UnicodeDecodeError) as e:
+                    logger.warning("Kan %s niet indexeren: %s", rel_path, e)
+                    changed = None
+                if changed is None:
+                    stats.skipped += 1
+                elif changed:
+                    stats.indexed += 1
+                else:
+                    stats.unchanged += 1
+
+            for rel_path in sorted((set(self.files) | set(stored)) - set(found)):
+                await self.db.delete_vectors({'path': rel_path})
+                self.files.pop(rel_path, None)
+                stats.removed += 1
+
+            if stats.indexed or stats.removed or self._manifest_dirty:
+                await loop.run_in_executor(None, self._save_manifest)
+                self._manifest_dirty = False
+            stats.seconds = time.perf_counter() - started
+            self.last_stats = stats
+            logger.info(
+                "File index %s: %d indexed, %d unchanged, %d removed, %d skipped in %.2fs",
+                self.root, stats.indexed, stats.unchanged, stats.removed, stats.skipped, stats.seconds
+            )
+
+        if stats.indexed or stats.removed:
+            for callback in self._listeners:
+                callback(stats)
+        return stats
+
+    async def search(
+        self,
+        query: str,
+        max_results: int = 5,
+        pattern: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Zoek bestanden op inhoud; geeft pad, score en best passende fragmenten
+
+        :param pattern: Optioneel glob patroon op het relatieve pad
+        """
+        query_embedding = await self.cluster.get_vector_embedding(query)
+        # Het padfilter gaat mee in de SQL, zodat alleen passende bestanden gerankt worden
+        entries = await self.db.query_vectors(
+            n_results=max_results,
+            query_embedding=query_embedding,
+            metadata_filter={'path': Glob(pattern)} if pattern else None
+        )
+        return [
+            {
+                'path': (entry.attributes or {}).get('path', ''),
+                'score': entry.score,
+                'snippet': entry.content,
+                'chunk_indices': (entry.extra or {}).get('chunk_indices')
+            }
+            for entry in entries
+        ]
+
+    def start_watching(self, interval: float = 30.0) -> None:
+        """Scan periodiek op de achtergrond (polling op mtime en grootte)"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch(interval))
+
+    async def stop_watching(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        if self._leader_fd is not None:
+            os.close(self._leader_fd)  # Geeft ook de flock vrij
+            self._leader_fd = None
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            try:
+                if self._try_lead():
+                    await self.scan()
+                else:
+                    self._follow_manifest()
+            except Exception as e:
+                # Niet fatale fout: de volgende ronde probeert het opnieuw
+                logger.error(f"File index scan failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def _try_lead(self) -> bool:
+        """Of dit proces de scans doet (non-blocking flock op het manifest)"""
+        if fcntl is None or self._leader_fd is not None:
+            return True
+        fd = os.open(self.manifest_path + ".lock", os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        return True
+
+    def _reconcile(self, stored: Dict[str, int]) -> None:
+        """Vergeet manifest regels waarvan de rijen niet (precies één keer) in de database staan"""
+        for rel_path, record in list(self.files.items()):
+            if stored.get(rel_path, 0) != (1 if record.chunks else 0):
+                logger.info("Index manifest en database lopen uiteen voor %s, opnieuw indexeren", rel_path)
+                del self.files[rel_path]
+                self._manifest_dirty = True
+
+    def _follow_manifest(self) -> None:
+        """Herlaad het manifest dat een ander proces bijwerkt"""
+        version = self._manifest_version()
+        if version == self._manifest_mtime:
+            return
+        self._manifest_mtime = version
+        self.files = self._load_manifest()
+        stats = IndexStats(scanned=len(self.files))
+        for callback in self._listeners:
+            callback(stats)
+
+    def _manifest_version(self) -> Optional[int]:
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return None
+
+    async def _index_file(self, rel_path: str, stat: os.stat_result) -> Optional[bool]:
+        """Geeft True als opnieuw geïndexeerd, False als ongewijzigd, None als overgeslagen"""
+        record = self.files.get(rel_path)
+        if record and record.mtime_ns == stat.st_mtime_ns and record.size == stat.st_size:
+            return False
+        if stat.st_size > self.max_file_bytes:
+            return None
+
+        loop = asyncio.get_running_loop()
+        full_path = os.path.join(self.root, rel_path)
+        digest, data = await loop.run_in_executor(None, self._read_and_hash, full_path)
+        if record and record.sha256 == digest:
+            # Alleen aangeraakt: manifest bijwerken zodat de volgende scan niet hasht
+            record.mtime_ns, record.size = stat.st_mtime_ns, stat.st_size
+            self._manifest_dirty = True
+            return False
+        if b"\0" in data[:_BINARY_SNIFF]:
+            return None
+
+        content = data.decode("utf-8")
+        await self.db.delete_vectors({'path': rel_path})
+        chunks = 0
+        if content.strip():
+            chunks = await self._store(rel_path, content, digest)
+        self.files[rel_path] = FileRecord(
+            path=rel_path, mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=digest, chunks=chunks
+        )
+        return True
+
+    async def _store(self, rel_path: str, content: str, digest: str) -> int:
+        # Het pad staat boven de inhoud zodat ook de bestandsnaam meetelt in de embedding
+        text = f"{rel_path}\n\n{content}"
+        attributes = {'path': rel_path, 'sha256': digest}
+        if not self.cluster.chunker.needs_chunking(text):
+            embedding = await self.cluster.get_vector_embedding(text)
+            await self.db.store_vector(
+                content=text, embedding=embedding, category='file',
+                importance=self.importance, attributes=attributes
+            )
+            return 1
+        chunks, embeddings = await self.cluster.embed_chunks(text)
+        await self.db.store_chunked_vector(
+            content=text, chunks=chunks, embeddings=embeddings, category='file',
+            importance=self.importance, attributes=attributes
+        )
+        return len(chunks)
+
+    def _walk(self) -> Iterator[Tuple[str, os.stat_result]]:
+        manifest = os.path.abspath(self.manifest_path)
+        for directory, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(
+                d for d in dirnames if d not in self.exclude_dirs and not d.startswith(".")
+            )
+            for filename in sorted(filenames):
+                if not any(fnmatch.fnmatch(filename, p) for p in self.patterns):
+                    continue
+                full_path = os.path.join(directory, filename)
+                if full_path == manifest:
+                    continue
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                yield os.path.relpath(full_path, self.root), stat
+
+    @staticmethod
+    def _read_and_hash(path: str) -> Tuple[str, bytes]:
+        digest = hashlib.sha256()
+        blocks = []
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                digest.update(block)
+                blocks.append(block)
+        return digest.hexdigest(), b"".join(blocks)
+
+    def _load_manifest(self) -> Dict[str, FileRecord]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {path: FileRecord(**record) for path, record in data.get('files', {}).items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ongeldig index manifest {self.manifest_path}, opnieuw indexeren: {str(e)}")
+            return {}
+
+    def _save_manifest(self) -> None:
+        # Atomisch vervangen, zodat een onderbroken scan geen half manifest achterlaat
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'root': self.root, 'files': {p: asdict(r) for p, r in self.files.items()}}, f)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,105 @@
+"""Hedged LLM requests tegen trage uitschieters
+
+De p99 van een endpoint wordt bepaald door de enkele upstream call die
+veel langer duurt dan normaal. Met hedging start create_message een
+tweede, identieke call als de eerste niet binnen een adaptieve deadline
+antwoordt; het eerste antwoord wint en de andere call wordt geannuleerd.
+
+- Deadline: het kwantiel (standaard p95) van de recente latencies per
+  model, begrensd tussen min_delay en max_delay. Zolang er te weinig
+  metingen zijn wordt er niet gehedged (tenzij initial_delay gezet is).
+- Budget: een token bucket. Elke call voegt `budget` toe (maximaal burst),
+  een hedge kost 1. Extra requests blijven zo onder budget x het aantal
+  calls, ook als de upstream in zijn geheel traag wordt.
+
+Hedging staat standaard uit (MASTERMIND_HEDGE=1 zet het aan). De
+latencies worden altijd bijgehouden, zodat de deadline meteen klopt.
+"""
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import numpy as np
+
+
+class HedgePolicy:
+    """Wanneer en hoe vaak een tweede poging gestart mag worden
+
+    :param enabled: Standaard voor calls die niet zelf hedge= meegeven
+    :param quantile: Kwantiel van de recente latencies dat als deadline dient
+    :param budget: Maximale verhouding extra requests / calls
+    :param burst: Maximaal aantal hedges dat achter elkaar gespaard kan worden
+    :param window: Aantal recente latencies per model
+    :param min_samples: Minimum aantal metingen voor een adaptieve deadline
+    :param min_delay: Ondergrens van de deadline in seconden
+    :param max_delay: Bovengrens van de deadline in seconden
+    :param initial_delay: Deadline zolang er te weinig metingen zijn (None = niet hedgen)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        quantile: float = 0.95,
+        budget: float = 0.05,
+        burst: float = 5.0,
+        window: int = 500,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        max_delay: float = 60.0,
+        initial_delay: Optional[float] = None
+    ) -> None:
+        self.enabled = enabled
+        self.quantile = quantile
+        self.budget = budget
+        self.burst = burst
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._tokens = 0.0
+        # create_message draait ook vanuit executor threads (sync agents)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy":
+        return cls(
+            enabled=os.getenv("MASTERMIND_HEDGE", "").lower() in ("1", "true", "yes"),
+            quantile=float(os.getenv("MASTERMIND_HEDGE_QUANTILE", "0.95")),
+            budget=float(os.getenv("MASTERMIND_HEDGE_BUDGET", "0.05"))
+        )
+
+    def observe(self, model: str, seconds: float) -> None:
+        """Latency van een geslaagde call"""
+        with self._lock:
+            latencies = self._latencies.get(model)
+            if latencies is None:
+                latencies = self._latencies[model] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def delay(self, model: str) -> Optional[float]:
+        """Seconden waarna een hedge gestart wordt, of None"""
+        with self._lock:
+            latencies = list(self._latencies.get(model, ()))
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+        deadline = float(np.quantile(latencies, self.quantile))
+        return min(max(deadline, self.min_delay), self.max_delay)
+
+    def on_call(self) -> None:
+        """Elke (gehedgede) call spaart budget voor een hedge"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.budget)
+
+    def try_acquire(self) -> bool:
+        """Neem budget voor één hedge, als dat er is"""
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+hedge_policy = HedgePolicy.from_env()
@@ -1,10 +1,13 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Awaitable
+from typing import List, Dict, Any, Optional, Awaitable, Sequence, Tuple
 
-from sentence_transformers import SentenceTransformer
-from .vectordb import VectorDatabase, VectorEntry
+from .chunking import TextChunker
+from .consolidation import ConsolidationReport, MemoryConsolidator
+from .embeddings import EmbeddingBackend, create_embedding_backend
+from .metrics import span, timed
+from .vectordb import CategoryFilter, VectorDatabase, VectorEntry
 
 class KnowledgeCluster:
     """Layered Knowledge Storage System
@@ -21,7 +24,11 @@ class KnowledgeCluster:
         self, 
         embedding_model: str = 'all-MiniLM-L6-v2',
         short_term_retention_hours: int = 24,
-        long_term_retention_days: int = 365
+        long_term_retention_days: int = 365,
+        embedding_backend: Optional[EmbeddingBackend] = None,
+        chunker: Optional[TextChunker] = None,
+        embedding_batch_size: int = 32,
+        consolidator: Optional[MemoryConsolidator] = None
     ):
         """
         Initialiseer kenniscluster met verschillende geheugenniveaus
@@ -29,21 +36,48 @@ class KnowledgeCluster:
         :param embedding_model: Model voor vector generatie
         :param short_term_retention_hours: Retentie voor korte termijn geheugen
         :param long_term_retention_days: Retentie voor lange termijn geheugen
+        :param embedding_backend: Embedding backend; standaard gekozen via
+            MASTERMIND_EMBEDDING_BACKEND (zie mastermind.embeddings)
+        :param chunker: Splitst lange content in chunks voor het embedden
+        :param embedding_batch_size: Aantal chunks per embedding aanroep
+        :param consolidator: Voegt bijna-identieke herinneringen samen
+            (zie consolidate_memories)
+
+        Het embedding model wordt pas bij het eerste gebruik geladen, of
+        vooraf via warmup() (zie server.lifespan).
         """
         self.logger = logging.getLogger(__name__)
         
-        # Embedding generator
-        self.embedding_model = SentenceTransformer(embedding_model)
+        # Embedding generator (lazy geladen)
+        self.embedding_model_name = embedding_model
+        self.embedding_backend = embedding_backend or create_embedding_backend(model_name=embedding_model)
+        self.chunker = chunker or TextChunker()
+        self.embedding_batch_size = embedding_batch_size
         
         # Vector databases voor verschillende lagen
         self.short_term_db = VectorDatabase(collection_name="short_term_memory")
         self.long_term_db = VectorDatabase(collection_name="long_term_memory")
         self.context_db = VectorDatabase(collection_name="context_memory")
+        self.consolidator = consolidator or MemoryConsolidator()
         
         # Retentie parameters
         self.short_term_retention = short_term_retention_hours
         self.long_term_retention = long_term_retention_days
-    
+
+    @property
+    def is_model_loaded(self) -> bool:
+        """Of het embedding model al in het geheugen staat"""
+        return self.embedding_backend.is_loaded
+
+    async def warmup(self) -> None:
+        """Laad het embedding model en voer een eerste encode uit
+
+        Draait in een executor zodat de event loop vrij blijft terwijl het
+        model laadt.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.embedding_backend.encode, ["warmup"])
+
     async def get_vector_embedding(self, text: str) -> List[float]:
         """
         Genereer vector embedding voor tekst
@@ -51,16 +85,29 @@ class KnowledgeCluster:
         :param text: Invoer tekst
         :return: Embedding vector
         """
+        embeddings = await self.get_vector_embeddings([text])
+        return embeddings[0]
+
+    async def get_vector_embeddings(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Genereer embeddings voor een batch teksten in één model aanroep
+        
+        :param texts: Invoer teksten
+        :return: Embedding vectoren, in dezelfde volgorde
+        """
         loop = asyncio.get_running_loop()
-        embedding = await loop.run_in_executor(None, self.embedding_model.encode, text)
-        return [float(x) for x in embedding]
+        with span("embedding"):
+            matrix = await loop.run_in_executor(None, self.embedding_backend.encode, list(texts))
+        return [[float(x) for x in row] for row in matrix]
     
+    @timed("knowledge_write")
     async def store_knowledge(
         self, 
         content: str, 
         category: str = 'general',
         importance: float = 0.5,
-        is_context_specific: bool = False
+        is_context_specific: bool = False,
+        metadata: Optional[Dict[str, Any]] = None
     ) -> str:
         """Store knowledge in the appropriate memory database
         
@@ -72,31 +119,61 @@ class KnowledgeCluster:
             category: Knowledge category
             importance: Importance score (0-1)
             is_context_specific: Whether this is context-specific knowledge
+            metadata: Extra attributes, filterable via metadata_filter
+
+        Content longer than the chunker's token window is split into
+        overlapping chunks that are embedded in batches and stored with a
+        reference to a parent row holding the full text.
         """
-        embedding = await self.get_vector_embedding(content)
-        
         if is_context_specific:
-            return await self.context_db.store_vector(
-                content=content,
-                embedding=embedding,
-                category=category,
-                importance=importance
-            )
+            target_db = self.context_db
         elif importance > 0.7:  # Hoge belangrijkheid naar lange termijn
-            return await self.long_term_db.store_vector(
-                content=content,
-                embedding=embedding,
-                category=category,
-                importance=importance
-            )
+            target_db = self.long_term_db
         else:
-            return await self.short_term_db.store_vector(
+            target_db = self.short_term_db
+
+        if not self.chunker.needs_chunking(content):
+            embedding = await self.get_vector_embedding(content)
+            return await target_db.store_vector(
                 content=content,
                 embedding=embedding,
                 category=category,
-                importance=importance
+                importance=importance,
+                attributes=metadata
             )
+
+        chunks, embeddings = await self.embed_chunks(content)
+        return await target_db.store_chunked_vector(
+            content=content,
+            chunks=chunks,
+            embeddings=embeddings,
+            category=category,
+            importance=importance,
+            attributes=metadata
+        )
+
+    async def embed_chunks(self, content: str) -> Tuple[List[str], List[List[float]]]:
+        """
+        Splits lange content in chunks en embed die per batch
+
+        :param content: Invoer tekst
+        :return: Chunk teksten en hun embeddings, in volgorde van de brontekst
+        """
+        chunks: List[str] = []
+        embeddings: List[List[float]] = []
+        batch: List[str] = []
+        for chunk in self.chunker.iter_chunks(content):
+            batch.append(chunk.text)
+            if len(batch) >= self.embedding_batch_size:
+                embeddings.extend(await self.get_vector_embeddings(batch))
+                chunks.extend(batch)
+                batch = []
+        if batch:
+            embeddings.extend(await self.get_vector_embeddings(batch))
+            chunks.extend(batch)
+        return chunks, embeddings
     
+    @timed("retrieval")
     async def retrieve_knowledge(
         self, 
         query: str, 
@@ -104,7 +181,11 @@ class KnowledgeCluster:
         include_short_term: bool = True,
         include_long_term: bool = True,
         include_context: bool = True,
-        min_importance: float = 0.3
+        min_importance: float = 0.3,
+        category: Optional[CategoryFilter] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
+        query_embedding: Optional[List[float]] = None
     ) -> List[VectorEntry]:
         """Search for relevant knowledge across memory layers
         
@@ -114,27 +195,51 @@ class KnowledgeCluster:
         Args:
             query: The search query
             max_results: Maximum number of results to return
+            category: One category or a list of categories to search in
+            metadata_filter: Attribute values the results must match; a list
+                value matches any of its items
+            include_embeddings: Attach each result's embedding to its metadata
+            query_embedding: Precomputed embedding of query, skips embedding
+                it again (used by sessions)
+
+        Filters are applied inside each memory layer before ranking, so a
+        filtered search only scans the matching partition. Chunked content
+        is returned per parent, with only its best-matching chunks as
+        content.
         """
-        query_embedding = await self.get_vector_embedding(query)
+        if query_embedding is None:
+            query_embedding = await self.get_vector_embedding(query)
         results: List[VectorEntry] = []
         
         tasks = []
         if include_short_term:
             tasks.append(self.short_term_db.query_vectors(
                 n_results=max_results,
-                min_importance=min_importance
+                category=category,
+                min_importance=min_importance,
+                query_embedding=query_embedding,
+                metadata_filter=metadata_filter,
+                include_embeddings=include_embeddings
             ))
         
         if include_long_term:
             tasks.append(self.long_term_db.query_vectors(
                 n_results=max_results,
-                min_importance=min_importance
+                category=category,
+                min_importance=min_importance,
+                query_embedding=query_embedding,
+                metadata_filter=metadata_filter,
+                include_embeddings=include_embeddings
             ))
         
         if include_context:
             tasks.append(self.context_db.query_vectors(
                 n_results=max_results,
-                min_importance=min_importance
+                category=category,
+                min_importance=min_importance,
+                query_embedding=query_embedding,
+                metadata_filter=metadata_filter,
+                include_embeddings=include_embeddings
             ))
         
         if tasks:
@@ -143,8 +248,8 @@ class KnowledgeCluster:
                 results.extend(result_set)
         
         return sorted(
-            results, 
-            key=lambda x: x.metadata.get('importance', 0), 
+            results,
+            key=lambda x: (x.score or 0.0, x.importance),
             reverse=True
         )[:max_results]
     
@@ -192,12 +297,41 @@ class KnowledgeCluster:
             self.logger.error(f"Error updating importance: {e}")
             return False
     
-    async def process_cluster(self, cluster_ids: List[int]) -> Any:
-        """Process een cluster van geheugens"""
-        # Implementatie hier
-        pass
+    async def consolidate_memories(self, full: bool = False) -> Dict[str, ConsolidationReport]:
+        """Voeg bijna-identieke herinneringen per geheugenlaag samen
+
+        Verwerkt alleen rijen die sinds de vorige run zijn toegevoegd, tenzij
+        full gezet is.
+        """
+        reports: Dict[str, ConsolidationReport] = {}
+        for db in (self.short_term_db, self.long_term_db, self.context_db):
+            reports[str(db.collection_name)] = await self.consolidator.consolidate(db, full=full)
+        return reports
+
+    async def process_cluster(self, cluster_ids: List[int]) -> Optional[int]:
+        """Process een cluster van geheugens
+
+        Verifieert de cohesie van de gegeven herinneringen en voegt ze samen
+        tot de medoid. Geeft het id van de representant, of None als ze niet
+        dicht genoeg bij elkaar liggen.
+        """
+        ids = [int(i) for i in cluster_ids]
+        for db in (self.short_term_db, self.long_term_db, self.context_db):
+            # Een cluster ligt altijd binnen één laag
+            batch = await db.load_embeddings(ids)
+            if len(batch) >= 2:
+                outcome = await self.consolidator.merge(db, [int(i) for i in batch.ids])
+                return outcome[0] if outcome else None
+        return None
     
     async def verify_cluster(self, cluster_id: int) -> bool:
-        """Verifieer een specifieke cluster"""
-        # Implementatie hier
-        return True
\ No newline at end of file
+        """Verifieer een specifieke cluster
+
+        Een cluster (het id van zijn representant) is in orde als de
+        representant bestaat en er in zijn laag geen bijna-duplicaten meer
+        naast staan.
+        """
+        for db in (self.short_term_db, self.long_term_db, self.context_db):
+            if len(await db.load_embeddings([cluster_id])):
+                return not await self.consolidator.neighbours(db, cluster_id)
+        return False
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""Gemeenschappelijk pad voor LLM API calls
+
+Alle Messages API aanroepen (Agent.think en de server endpoints) lopen via
+create_message. Synchrone clients draaien in een executor zodat de event
+loop niet blokkeert; async clients worden direct ge-await. Elke call wordt
+gemeten als span ("llm") en per model in de latency histogram geschreven;
+de token usage en kosten gaan naar mastermind.usage.
+
+Prompt caching: zet stabiele delen van een prompt (instructies, vaste
+context, gespreksgeschiedenis) vooraan en markeer het laatste stabiele blok
+met een cache breakpoint (cached_content/cached_system). De API verwerkt een
+herhaalde prefix dan niet opnieuw; de cache read/write tokens komen in de
+usage terecht. Prefixes korter dan het minimum van het model (1024 tokens,
+2048 voor Haiku) worden door de API gewoon niet gecachet.
+
+Hedging (zie mastermind.hedging): duurt een call langer dan de p95 van het
+model, dan wordt een identieke tweede call gestart en wint het eerste
+antwoord. Bij een async client wordt de verliezer echt afgebroken; bij een
+sync client loopt zijn thread nog uit, maar er wordt niet meer op gewacht.
+Een verliezer die toch een antwoord krijgt telt mee in de usage en kosten.
+Een afgebroken trage eerste poging levert een gecensureerde latency meting
+op (minstens de tijd tot het afbreken), zodat de p95 niet wegzakt doordat
+juist de trage calls nooit gemeten worden.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from anthropic.types import Message
+
+from .hedging import HedgePolicy, hedge_policy
+from .metrics import LLM_ERRORS, LLM_HEDGES, LLM_SECONDS, span
+from .usage import record_call
+
+logger = logging.getLogger(__name__)
+
+# Cache breakpoint (de API houdt een prefix ongeveer 5 minuten vast)
+CACHE_CONTROL: Dict[str, str] = {"type": "ephemeral"}
+
+
+def text_block(text: str, cache: bool = False) -> Dict[str, Any]:
+    """Een text content blok, optioneel met cache breakpoint"""
+    block: Dict[str, Any] = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = dict(CACHE_CONTROL)
+    return block
+
+
+def cached_content(prefix: Sequence[str], rest: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """Content blokken met een breakpoint na de stabiele prefix
+
+    Elk blok blijft een eigen content blok: de API zoekt bij een breakpoint
+    ook terug naar eerdere blokgrenzen, zodat een prefix die sinds de vorige
+    call alleen gegroeid is (zoals een gesprek) toch uit de cache komt.
+    """
+    blocks = [text_block(text) for text in prefix if text]
+    if blocks:
+        blocks[-1]["cache_control"] = dict(CACHE_CONTROL)
+    blocks.extend(text_block(text) for text in rest if text)
+    return blocks
+
+
+def cached_system(text: str) -> List[Dict[str, Any]]:
+    """System prompt als één gecachet blok"""
+    return [text_block(text, cache=True)]
+
+
+def _record_late(model: str, started: float, future: "asyncio.Future[Any]") -> None:
+    """Usage van een afgebroken sync call waarvan de thread alsnog antwoordde"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    record_call(model, future.result(), time.perf_counter() - started)
+
+
+async def _attempt(create: Callable[..., Any], model: str, kwargs: Dict[str, Any], policy: HedgePolicy) -> Message:
+    """Eén aanroep van messages.create; de latency gaat naar de hedge policy"""
+    started = time.perf_counter()
+    if asyncio.iscoroutinefunction(create):
+        response = await create(model=model, **kwargs)
+    else:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, partial(create, model=model, **kwargs))
+        try:
+            response = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # De thread is niet te stoppen; zijn antwoord kost wel tokens
+            future.add_done_callback(partial(_record_late, model, started))
+            raise
+        if inspect.isawaitable(response):
+            response = await response
+    policy.observe(model, time.perf_counter() - started)
+    return response
+
+
+async def _hedged(create: Callable[..., Any], model: str, kwargs: Dict[str, Any], policy: HedgePolicy) -> Message:
+    """Start een tweede poging na de deadline van het model; het eerste antwoord wint"""
+    policy.on_call()
+    delay = policy.delay(model)
+    attempts = [asyncio.ensure_future(_attempt(create, model, kwargs, policy))]
+    started = [time.perf_counter()]
+    winner: Optional["asyncio.Future[Message]"] = None
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                if policy.try_acquire():
+                    LLM_HEDGES.inc(model=model, outcome="fired")
+                    logger.debug("Hedging %s call after %.0fms", model, 1000 * delay)
+                    attempts.append(asyncio.ensure_future(_attempt(create, model, kwargs, policy)))
+                    started.append(time.perf_counter())
+                else:
+                    LLM_HEDGES.inc(model=model, outcome="budget_exhausted")
+        pending = set(attempts)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Bij een gelijke finish gaat de eerste poging voor
+            for attempt in sorted(done, key=attempts.index):
+                failure = attempt.exception()
+                if failure is None:
+                    if len(attempts) > 1:
+                        LLM_HEDGES.inc(model=model, outcome="won" if attempt is attempts[1] else "lost")
+                    winner = attempt
+                    return attempt.result()
+                # Een mislukte poging: wacht op de andere, als die er is
+                error = error or failure
+        assert error is not None
+        raise error
+    finally:
+        now = time.perf_counter()
+        for index, attempt in enumerate(attempts):
+            if attempt is winner:
+                continue
+            if not attempt.done():
+                attempt.cancel()
+                if index == 0 and len(attempts) > 1:
+                    # Gecensureerd: de eerste poging duurde minstens tot nu
+                    policy.observe(model, now - started[0])
+            elif not attempt.cancelled() and attempt.exception() is None:
+                # Tegelijk klaar met de winnaar: ook dit antwoord is betaald
+                record_call(model, attempt.result(), now - started[index])
+
+
+async def create_message(client: Any, *, model: str, hedge: Optional[bool] = None, **kwargs: Any) -> Message:
+    """Roep client.messages.create aan en meet de latency per model
+
+    :param client: anthropic.Anthropic of anthropic.AsyncAnthropic (of een
+        object met dezelfde messages.create interface)
+    :param model: Model identifier
+    :param hedge: Hedging voor deze call; None volgt MASTERMIND_HEDGE
+    :param kwargs: Overige argumenten voor messages.create
+    """
+    create = client.messages.create
+    policy = hedge_policy
+    started = time.perf_counter()
+    try:
+        with span("llm"):
+            if policy.enabled if hedge is None else hedge:
+                response = await _hedged(create, model, kwargs, policy)
+            else:
+                response = await _attempt(create, model, kwargs, policy)
+    except Exception as e:
+        LLM_ERRORS.inc(model=model, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        LLM_SECONDS.observe(elapsed, model=model)
+        logger.debug("LLM call %s took %.1fms", model, 1000 * elapsed)
+    record_call(model, response, elapsed)
+    return response
@@ -1,10 +1,38 @@
-from typing import Dict, List, Any, Optional, Callable, TypeVar, Protocol, Union, Awaitable, Generic
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Any, AsyncIterable, AsyncIterator, Optional, Callable, TypeVar, Protocol, Sequence, Set, Hashable, Tuple, Union, Awaitable, Generic
+from dataclasses import dataclass, field
 import asyncio
+import glob
+import logging
+import mmap
+import os
+import re
+import secrets
+import shutil
+import stat as os_stat
+import time
 from abc import ABC, abstractmethod
-from .knowledge_cluster import KnowledgeCluster
+from collections import defaultdict
 from aiofiles import open as aio_open
 
+from .tool_executor import ToolCall, ToolCallResult, ToolExecutor
+
+if TYPE_CHECKING:
+    # Alleen voor type hints: houdt sqlalchemy buiten `import mastermind.mcp`
+    from .context import BuiltContext, ContextBuilder
+    from .file_index import FileIndex
+    from .knowledge_cluster import KnowledgeCluster
+    from .vectordb import VectorEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL = float(os.getenv("MASTERMIND_MCP_CACHE_TTL", "300"))
+# Eerste wachttijd na een mislukte laadpoging; verdubbelt per poging tot de TTL
+RETRY_DELAY = 1.0
+
+# Hoeveel tekens van een resource in de zoekindex komen
+_INDEX_CONTENT_CHARS = 10000
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
 T_co = TypeVar('T_co', covariant=True)  # Covariant type variable
 
 class AsyncCallable(Protocol[T_co]):
@@ -20,14 +48,30 @@ class MCPResource:
 
 @dataclass
 class MCPTool:
-    """Represents a tool that LLMs can use"""
+    """Represents a tool that LLMs can use
+
+    Optionele uitvoeringsopties (zie ToolExecutor):
+        timeout: Seconden voordat de call wordt afgebroken
+        max_concurrency: Maximaal aantal gelijktijdige calls van deze tool
+        pure: Resultaat hangt alleen af van de cache key en mag hergebruikt worden
+        cache_key: Maakt de cache key uit de argumenten (standaard de argumenten zelf)
+    """
     name: str
     description: str
     function: AsyncCallable[Any]
     parameters: Dict[str, Any]
+    timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    pure: bool = False
+    cache_key: Optional[Callable[..., Hashable]] = None
 
 class MCPProvider(ABC):
     """Base class for MCP resource and tool providers"""
+    @property
+    def name(self) -> str:
+        """Unieke naam van de provider in het register"""
+        return type(self).__name__
+
     @abstractmethod
     async def get_resources(self) -> List[MCPResource]:
         """Get all available resources"""
@@ -38,37 +82,307 @@ class MCPProvider(ABC):
         """Get all available tools"""
         pass
 
+@dataclass
+class _ProviderCache:
+    """Gecachte resources en tools van één provider"""
+    resources: List[MCPResource] = field(default_factory=list)
+    tools: List[MCPTool] = field(default_factory=list)
+    loaded_at: float = 0.0
+    stale: bool = True
+    # Laatste laadpoging (ook mislukte) en het aantal mislukte pogingen op rij
+    attempted_at: float = 0.0
+    failures: int = 0
+
+class ResourceIndex:
+    """Inverted index over resource naam, type, metadata en content"""
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._resources: Dict[str, MCPResource] = {}
+
+    @staticmethod
+    def _terms(text: str) -> Set[str]:
+        return {t for t in _WORD_PATTERN.findall(text.lower()) if len(t) > 1}
+
+    def rebuild(self, resources: Dict[str, MCPResource]) -> None:
+        postings: Dict[str, Set[str]] = defaultdict(set)
+        for name, resource in resources.items():
+            text = " ".join([
+                resource.name,
+                resource.type,
+                " ".join(f"{k} {v}" for k, v in resource.metadata.items()),
+                str(resource.content)[:_INDEX_CONTENT_CHARS]
+            ])
+            for term in self._terms(text):
+                postings[term].add(name)
+        self._postings = postings
+        self._resources = dict(resources)
+
+    def search(self, query: str, max_results: int = 5) -> List[MCPResource]:
+        """Resources met de meeste gedeelde termen, beste eerst"""
+        hits: Dict[str, int] = defaultdict(int)
+        for term in self._terms(query):
+            for name in self._postings.get(term, ()):
+                hits[name] += 1
+        ranked = sorted(hits.items(), key=lambda item: (-item[1], item[0]))
+        return [self._resources[name] for name, _ in ranked[:max_results]]
+
 class MCPManager:
-    """Beheer van Multi-Context Processing (MCP)"""
+    """Beheer van Multi-Context Processing (MCP)
+
+    Langlevend register (één per proces): resources en tools van alle
+    providers worden bij startup gelijktijdig geladen en met een TTL
+    gecachet. Verlopen caches worden op de achtergrond ververst terwijl
+    requests de bestaande cache blijven gebruiken, zodat get_context per
+    request alleen de retrieval en een index lookup kost.
+    """
     
-    def __init__(self, knowledge_cluster: KnowledgeCluster):
+    def __init__(
+        self,
+        knowledge_cluster: "KnowledgeCluster",
+        context_builder: Optional["ContextBuilder"] = None,
+        cache_ttl: float = DEFAULT_CACHE_TTL
+    ):
         self.knowledge_cluster = knowledge_cluster
         self.resources: Dict[str, MCPResource] = {}
         self.tools: Dict[str, MCPTool] = {}
+        self.cache_ttl = cache_ttl
+        self.providers: Dict[str, MCPProvider] = {}
+        self._provider_cache: Dict[str, _ProviderCache] = {}
+        self._registered_tools: Dict[str, MCPTool] = {}
+        self._resource_index = ResourceIndex()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.executor = ToolExecutor(lambda: self.tools)
+        if context_builder is None:
+            from .context import ContextBuilder
+            context_builder = ContextBuilder()
+        self.context_builder = context_builder
     
     async def register_tool(self, tool: MCPTool) -> None:
         """Registreer een nieuw hulpmiddel"""
+        self._registered_tools[tool.name] = tool
         self.tools[tool.name] = tool
+
+    async def register_provider(self, provider: MCPProvider) -> None:
+        """Registreer een provider; resources en tools laden via load_providers()"""
+        self.providers[provider.name] = provider
+        self._provider_cache[provider.name] = _ProviderCache()
+
+    def invalidate(self, provider_name: Optional[str] = None) -> None:
+        """Markeer de cache van één of alle providers als verouderd"""
+        names = [provider_name] if provider_name else list(self._provider_cache)
+        for name in names:
+            if name in self._provider_cache:
+                self._provider_cache[name].stale = True
+
+    def _is_expired(self, cache: _ProviderCache) -> bool:
+        now = time.monotonic()
+        if cache.failures:
+            # Niet bij elk request opnieuw proberen: exponentiële backoff
+            backoff = min(self.cache_ttl, RETRY_DELAY * 2 ** (cache.failures - 1))
+            return now - cache.attempted_at >= backoff
+        return cache.stale or now - cache.loaded_at > self.cache_ttl
+
+    async def load_providers(self, force: bool = False) -> None:
+        """Laad resources en tools van alle (verlopen) providers gelijktijdig"""
+        names = [
+            name for name, cache in self._provider_cache.items()
+            if force or self._is_expired(cache)
+        ]
+        if not names:
+            return
+        await asyncio.gather(*(self._load_provider(name) for name in names))
+        self._rebuild()
+
+    async def _load_provider(self, name: str) -> None:
+        provider = self.providers[name]
+        attempted_at = time.monotonic()
+        try:
+            resources, tools = await asyncio.gather(provider.get_resources(), provider.get_tools())
+        except Exception as e:
+            # Houd de vorige cache aan; een refresh na de backoff probeert het opnieuw
+            cache = self._provider_cache[name]
+            cache.attempted_at = attempted_at
+            cache.failures += 1
+            logger.error("Loading MCP provider %s failed (attempt %d): %s", name, cache.failures, e)
+            return
+        self._provider_cache[name] = _ProviderCache(
+            resources=list(resources),
+            tools=list(tools),
+            loaded_at=time.monotonic(),
+            stale=False,
+            attempted_at=attempted_at
+        )
+
+    def _rebuild(self) -> None:
+        resources: Dict[str, MCPResource] = {}
+        tools: Dict[str, MCPTool] = {}
+        for cache in self._provider_cache.values():
+            resources.update((r.name, r) for r in cache.resources)
+            tools.update((t.name, t) for t in cache.tools)
+        tools.update(self._registered_tools)
+        self.resources = resources
+        self.tools = tools
+        self._resource_index.rebuild(resources)
+
+    async def ensure_fresh(self) -> None:
+        """Zorg voor bruikbare caches zonder requests te laten wachten
+
+        Providers zonder laadpoging worden direct geladen; verlopen caches
+        en mislukte providers (na hun backoff) worden op de achtergrond
+        ververst (stale-while-revalidate).
+        """
+        if any(cache.attempted_at == 0.0 for cache in self._provider_cache.values()):
+            await self.load_providers()
+        expired = any(self._is_expired(cache) for cache in self._provider_cache.values())
+        if expired and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self.load_providers())
+
+    async def close(self) -> None:
+        """Stop een lopende achtergrond refresh (bij shutdown)"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    def search_resources(self, query: str, max_results: int = 5) -> List[MCPResource]:
+        """Zoek resources in de index"""
+        return self._resource_index.search(query, max_results)
+
+    async def get_context(
+        self,
+        query: str,
+        max_results: int = 5,
+        memories: Optional[Sequence["VectorEntry"]] = None,
+        pinned_blocks: Sequence[str] = ()
+    ) -> "BuiltContext":
+        """Bouw prompt context uit relevante herinneringen en resources
+
+        De herinneringen komen uit de retrieval index van het
+        KnowledgeCluster, de resources uit de resource index. Het resultaat
+        bevat ook het oorspronkelijke bericht en blijft binnen het token
+        budget van de context builder. Een sessie geeft zijn eigen
+        (incrementeel opgehaalde) memories en geschiedenis als pinned_blocks mee.
+        """
+        await self.ensure_fresh()
+        if memories is None:
+            memories = await self.knowledge_cluster.retrieve_knowledge(
+                query=query,
+                max_results=max_results,
+                include_embeddings=True
+            )
+        resource_blocks = [
+            f"Relevante resource ({resource.type}) {resource.name}: {resource.content}"
+            for resource in self.search_resources(query, max_results)
+        ]
+        return self.context_builder.build(
+            query, memories, extra_blocks=resource_blocks, pinned_blocks=pinned_blocks
+        )
     
     async def use_tool(self, tool_name: str, *args: Any, **kwargs: Any) -> Any:
         """Gebruik een specifiek hulpmiddel binnen MCP"""
-        if tool_name in self.tools:
-            tool = self.tools[tool_name]
-            return await tool.function(*args, **kwargs)
-        raise ValueError(f"Hulpmiddel {tool_name} niet gevonden")
+        if tool_name not in self.tools:
+            raise ValueError(f"Hulpmiddel {tool_name} niet gevonden")
+        outcome = await self.executor.execute(ToolCall(name=tool_name, arguments=kwargs, args=args))
+        if outcome.exception is not None:
+            raise outcome.exception
+        return outcome.result
+
+    async def use_tools(
+        self,
+        calls: Sequence[ToolCall],
+        cancel_on_failure: bool = False
+    ) -> List[ToolCallResult]:
+        """Voer de tool calls van één model-beurt parallel uit"""
+        return await self.executor.execute_batch(calls, cancel_on_failure=cancel_on_failure)
+
+def _file_version(path: str, *args: Any, **kwargs: Any) -> Hashable:
+    """Cache key voor bestandsinhoud: pad, inode, mtime en grootte plus de call argumenten"""
+    stat = os.stat(path)
+    return (
+        os.path.abspath(path), stat.st_ino, stat.st_mtime_ns, stat.st_size,
+        args, tuple(sorted(kwargs.items()))
+    )
+
+def _create_temp_file(directory: str) -> str:
+    """Maak een leeg tijdelijk bestand in directory met de standaard mode
+
+    Anders dan mkstemp (altijd 0600) krijgt het bestand 0666 minus de umask,
+    net als een gewone open(); die toepassing doet de kernel.
+    """
+    while True:
+        tmp_path = os.path.join(directory, f".tmp-{secrets.token_hex(8)}")
+        try:
+            fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return tmp_path
 
 class FileSystemProvider(MCPProvider):
-    """Provides file system access via MCP"""
+    """Provides file system access via MCP
+
+    Naast read_file/write_file zijn er tools om grote bestanden in stukken te
+    lezen (byte ranges en regelvensters, via mmap boven mmap_threshold), een
+    async generator voor streaming reads, atomische chunked writes en een
+    directory listing met gecachte stat resultaten.
+
+    Met een FileIndex worden de geïndexeerde bestanden als resources
+    aangeboden en krijgen agents een search_files tool die op inhoud zoekt.
+
+    :param root: Basismap voor relatieve paden in list_directory
+    :param mmap_threshold: Bestanden vanaf deze grootte worden via mmap gelezen
+    :param stat_cache_ttl: Hoe lang stat resultaten geldig blijven (seconden)
+    :param chunk_size: Blokgrootte voor streaming reads en chunked writes
+    :param index: Optionele FileIndex over (een deel van) de projectmap
+    """
+
+    # Elke zoveel regels wordt de byte offset onthouden voor snelle regelvensters
+    LINE_CHECKPOINT_INTERVAL = 1000
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        mmap_threshold: int = 8 * 1024 * 1024,
+        stat_cache_ttl: float = 5.0,
+        chunk_size: int = 1024 * 1024,
+        index: Optional["FileIndex"] = None
+    ) -> None:
+        self.root = os.path.abspath(root or (index.root if index else os.getcwd()))
+        self.index = index
+        self.mmap_threshold = mmap_threshold
+        self.stat_cache_ttl = stat_cache_ttl
+        self.chunk_size = chunk_size
+        self._stat_cache: Dict[str, Tuple[float, os.stat_result]] = {}
+        # pad -> (versie, byte offsets van regel 0, N, 2N, ...)
+        self._line_checkpoints: Dict[str, Tuple[Hashable, List[int]]] = {}
+
     async def get_resources(self) -> List[MCPResource]:
         """Get file system resources"""
-        return [
+        resources = [
             MCPResource(
                 name="project_files",
                 type="directory",
-                content="/path/to/project",
-                metadata={"readable": True, "writable": True}
+                content=self.root,
+                metadata={
+                    "readable": True,
+                    "writable": True,
+                    "indexed_files": len(self.index.files) if self.index else 0
+                }
             )
         ]
+        if self.index:
+            # Alleen pad en manifest gegevens; de inhoud zit in de vector index
+            resources.extend(
+                MCPResource(
+                    name=record.path,
+                    type="file",
+                    content=record.path,
+                    metadata={"size": record.size, "sha256": record.sha256, "chunks": record.chunks}
+                )
+                for record in self.index.files.values()
+            )
+        return resources
     
     async def get_tools(self) -> List[MCPTool]:
         """Get file system tools"""
@@ -77,7 +391,31 @@ class FileSystemProvider(MCPProvider):
                 name="read_file",
                 description="Read contents of a file",
                 function=self._read_file,
-                parameters={"path": "str"}
+                parameters={"path": "str"},
+                pure=True,
+                cache_key=_file_version
+            ),
+            MCPTool(
+                name="read_range",
+                description="Read a byte range of a (large) file",
+                function=self._read_range,
+                parameters={"path": "str", "offset": "int", "length": "int"},
+                pure=True,
+                cache_key=_file_version
+            ),
+            MCPTool(
+                name="read_lines",
+                description="Read a window of lines from a (large) file",
+                function=self._read_lines,
+                parameters={"path": "str", "start_line": "int", "max_lines": "int"},
+                pure=True,
+                cache_key=_file_version
+            ),
+            MCPTool(
+                name="list_directory",
+                description="List files in a directory, optionally matching a glob pattern",
+                function=self._list_directory,
+                parameters={"path": "str", "pattern": "str", "recursive": "bool", "max_entries": "int"}
             ),
             MCPTool(
                 name="write_file",
@@ -85,18 +423,200 @@ class FileSystemProvider(MCPProvider):
                 function=self._write_file,
                 parameters={"path": "str", "content": "str"}
             )
-        ]
+        ] + ([
+            MCPTool(
+                name="search_files",
+                description="Search indexed project files by content",
+                function=self.index.search,
+                parameters={"query": "str", "max_results": "int", "pattern": "str"}
+            )
+        ] if self.index else [])
     
     async def _read_file(self, path: str) -> str:
         """Read file contents"""
         async with aio_open(path, 'r') as f:
             content = await f.read()
             return str(content)
+
+    async def _read_range(self, path: str, offset: int = 0, length: int = 64 * 1024) -> Dict[str, Any]:
+        """Lees length bytes vanaf offset; grote bestanden via mmap
+
+        Een multibyte teken op de rand van de range wordt als U+FFFD gedecodeerd.
+        """
+        async with aio_open(path, 'rb') as f:
+            # Grootte van het geopende bestand, niet uit de stat cache: na een
+            # append zou een verouderde grootte onder de nieuwe versie gememoized worden
+            size = os.fstat(f.fileno()).st_size
+            offset = max(0, min(offset, size))
+            length = max(0, min(length, size - offset))
+            if size >= self.mmap_threshold:
+                loop = asyncio.get_running_loop()
+                data = await loop.run_in_executor(None, self._mmap_slice, f.fileno(), offset, length)
+            else:
+                await f.seek(offset)
+                data = await f.read(length)
+        return {
+            "path": path,
+            "offset": offset,
+            "length": len(data),
+            "size": size,
+            "eof": offset + len(data) >= size,
+            "data": data.decode("utf-8", errors="replace")
+        }
+
+    async def _read_lines(self, path: str, start_line: int = 0, max_lines: int = 100) -> Dict[str, Any]:
+        """Lees een venster van regels zonder het hele bestand te laden"""
+        loop = asyncio.get_running_loop()
+        lines, eof = await loop.run_in_executor(
+            None, self._line_window, path, max(0, start_line), max(0, max_lines)
+        )
+        return {
+            "path": path,
+            "start_line": start_line,
+            "lines": lines,
+            "next_line": start_line + len(lines),
+            "eof": eof
+        }
+
+    async def stream_file(self, path: str, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Async generator over de inhoud van een bestand in blokken"""
+        size = chunk_size or self.chunk_size
+        async with aio_open(path, 'rb') as f:
+            while True:
+                block = await f.read(size)
+                if not block:
+                    return
+                yield block
     
     async def _write_file(self, path: str, content: str) -> None:
-        """Write file contents"""
-        async with aio_open(path, 'w') as f:
-            await f.write(content)
+        """Write file contents (atomisch, in blokken)"""
+        async def blocks() -> AsyncIterator[str]:
+            for start in range(0, len(content), self.chunk_size):
+                yield content[start:start + self.chunk_size]
+        await self.write_chunks(path, blocks())
+
+    async def write_chunks(self, path: str, chunks: AsyncIterable[str]) -> int:
+        """Schrijf een stroom tekstblokken atomisch naar path
+
+        Schrijft naar een tijdelijk bestand in dezelfde map en vervangt het
+        doel pas na fsync, zodat lezers nooit een half geschreven bestand
+        zien. Geeft het aantal geschreven bytes terug.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        tmp_path = _create_temp_file(directory)
+        loop = asyncio.get_running_loop()
+        written = 0
+        try:
+            async with aio_open(tmp_path, 'wb') as f:
+                async for chunk in chunks:
+                    data = chunk.encode("utf-8")
+                    await f.write(data)
+                    written += len(data)
+                await f.flush()
+                await loop.run_in_executor(None, os.fsync, f.fileno())
+            # os.replace neemt de mode van het tijdelijke bestand over
+            if os.path.exists(path):
+                shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._forget(path)
+        return written
+
+    async def _list_directory(
+        self,
+        path: str = ".",
+        pattern: str = "*",
+        recursive: bool = False,
+        max_entries: int = 1000
+    ) -> List[Dict[str, Any]]:
+        """Lijst bestanden die op pattern passen, met grootte en mtime"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._scan, path, pattern, recursive, max_entries)
+
+    def _scan(self, path: str, pattern: str, recursive: bool, max_entries: int) -> List[Dict[str, Any]]:
+        base = path if os.path.isabs(path) else os.path.join(self.root, path)
+        expression = os.path.join(base, "**", pattern) if recursive else os.path.join(base, pattern)
+        entries = []
+        for match in glob.iglob(expression, recursive=recursive):
+            try:
+                stat = self._stat(match)
+            except OSError:
+                continue
+            entries.append({
+                "path": os.path.relpath(match, self.root),
+                "is_dir": os_stat.S_ISDIR(stat.st_mode),
+                "size": stat.st_size,
+                "modified": stat.st_mtime
+            })
+            if len(entries) >= max_entries:
+                break
+        return entries
+
+    def _stat(self, path: str) -> os.stat_result:
+        """os.stat met een korte TTL cache, alleen voor directory listings"""
+        key = os.path.abspath(path)
+        now = time.monotonic()
+        cached = self._stat_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        stat = os.stat(key)
+        self._stat_cache[key] = (now + self.stat_cache_ttl, stat)
+        return stat
+
+    def _forget(self, path: str) -> None:
+        key = os.path.abspath(path)
+        self._stat_cache.pop(key, None)
+        self._line_checkpoints.pop(key, None)
+
+    @staticmethod
+    def _mmap_slice(fileno: int, offset: int, length: int) -> bytes:
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mm:
+            return mm[offset:offset + length]
+
+    def _line_window(self, path: str, start_line: int, max_lines: int) -> Tuple[List[str], bool]:
+        key = os.path.abspath(path)
+        with open(key, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == 0:
+                return [], True
+            # Versie van precies het bestand dat we lezen (zie _file_version)
+            version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            cached = self._line_checkpoints.get(key)
+            checkpoints = cached[1] if cached and cached[0] == version else [0]
+            self._line_checkpoints[key] = (version, checkpoints)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return self._scan_lines(mm, checkpoints, start_line, max_lines)
+
+    def _scan_lines(
+        self,
+        mm: mmap.mmap,
+        checkpoints: List[int],
+        start_line: int,
+        max_lines: int
+    ) -> Tuple[List[str], bool]:
+        interval = self.LINE_CHECKPOINT_INTERVAL
+        # Spring naar het dichtstbijzijnde bekende checkpoint en scan verder
+        slot = min(start_line // interval, len(checkpoints) - 1)
+        line, position = slot * interval, checkpoints[slot]
+        while line < start_line:
+            newline = mm.find(b"\n", position)
+            if newline < 0:
+                return [], True
+            position = newline + 1
+            line += 1
+            if line % interval == 0 and line // interval == len(checkpoints):
+                checkpoints.append(position)
+
+        lines = []
+        while len(lines) < max_lines and position < len(mm):
+            newline = mm.find(b"\n", position)
+            end = newline if newline >= 0 else len(mm)
+            lines.append(mm[position:end].decode("utf-8", errors="replace").rstrip("\r"))
+            position = end + 1
+        return lines, position >= len(mm)
 
 class MCPEnabledAgent:
     """Mixin to add MCP capabilities to agents"""
@@ -105,11 +625,8 @@ class MCPEnabledAgent:
     
     async def get_context(self, query: str) -> List[MCPResource]:
         """Get relevant resources for a given query"""
-        resources = []
-        for resource in self.mcp.resources.values():
-            if query.lower() in str(resource.content).lower():
-                resources.append(resource)
-        return resources
+        await self.mcp.ensure_fresh()
+        return self.mcp.search_resources(query, max_results=len(self.mcp.resources))
     
     async def use_tool(self, name: str, **kwargs: Any) -> Any:
         """Use an MCP tool"""
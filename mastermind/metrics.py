@@ -0,0 +1,265 @@
+"""Lichtgewicht latency instrumentatie
+
+Spans meten hoe lang een fase duurt (embedding, database query, retrieval,
+LLM call, kennis opslaan) en schrijven dat in histogrammen per fase en per
+model. Het register rendert alles in het Prometheus tekstformaat voor het
+/metrics endpoint, zonder externe afhankelijkheden.
+
+Een span kost twee perf_counter aanroepen en een bucket lookup. Binnen een
+request (zie server.py) worden de spans daarnaast in een trace verzameld,
+zodat zichtbaar is waar de tijd van één /chat aanroep heen gaat.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# Seconden; van snelle database queries tot trage LLM calls
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} verwacht labels {self.labelnames}, kreeg {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotoon stijgende teller per labelcombinatie"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Latency histogram met vaste buckets per labelcombinatie"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per labelcombinatie: (aantal per bucket plus overflow, [som])
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][slot] += 1
+            series[1][0] += value
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def total(self, **labels: Any) -> float:
+        series = self._series.get(self._key(labels))
+        return series[1][0] if series else 0.0
+
+    def quantile(self, q: float, **labels: Any) -> Optional[float]:
+        """Schat een kwantiel uit de buckets (bovengrens van de bucket)"""
+        series = self._series.get(self._key(labels))
+        if not series:
+            return None
+        counts = series[0]
+        target = q * sum(counts)
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            if running >= target and count:
+                return bound
+        return None
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+class MetricsRegistry:
+    """Verzameling metrics die samen gerenderd worden"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def _register(self, metric: Any) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} bestaat al met een ander type of labels")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Alle metrics in het Prometheus tekstformaat"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "mastermind_stage_seconds",
+    "Duration of internal stages (embedding, db_query, db_write, retrieval, llm, knowledge_write)",
+    ("stage",)
+)
+LLM_SECONDS = registry.histogram(
+    "mastermind_llm_request_seconds",
+    "Duration of LLM API calls per model",
+    ("model",)
+)
+LLM_ERRORS = registry.counter(
+    "mastermind_llm_errors_total",
+    "Failed LLM API calls per model and error type",
+    ("model", "error")
+)
+LLM_HEDGES = registry.counter(
+    "mastermind_llm_hedges_total",
+    "Hedged LLM calls per model and outcome (fired, won, lost, budget_exhausted)",
+    ("model", "outcome")
+)
+HTTP_SECONDS = registry.histogram(
+    "mastermind_http_request_seconds",
+    "Duration of HTTP requests per endpoint and status code",
+    ("path", "status")
+)
+
+# Spans van het huidige request: lijst van (fase, seconden), of None buiten een trace
+_current_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("mastermind_trace", default=None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Meet de duur van een fase, ook als die met een exceptie eindigt"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((stage, elapsed))
+
+
+def timed(stage: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator: meet een async functie als span"""
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with span(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace() -> Iterator[List[Tuple[str, float]]]:
+    """Verzamel alle spans binnen dit blok (en de taken die het start)"""
+    spans: List[Tuple[str, float]] = []
+    token = _current_trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+
+def summarize(spans: Sequence[Tuple[str, float]]) -> Dict[str, float]:
+    """Totale tijd per fase in milliseconden"""
+    totals: Dict[str, float] = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + 1000 * seconds
+    return totals
@@ -3,27 +3,83 @@ import os
 # Stel de milieuvariabele in om parallelisme waarschuwingen te onderdrukken
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 load_dotenv()
 import anthropic 
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Literal, List, Dict, Any, Optional
+from typing import Literal, List, Dict, Any, AsyncIterator, Optional, Sequence
+import argparse
+import asyncio
+import json
 import logging
+import tempfile
+import time
 import uvicorn
 from contextlib import asynccontextmanager
 
 # Nieuwe imports
 from .knowledge_cluster import KnowledgeCluster
 from .vectordb import VectorEntry
-from .mcp import MCPManager
-from .database import add_memory, get_memories_by_category, init_db
+from .chunking import truncate_to_tokens
+from .context import BuiltContext, ContextBuilder, memory_payload
+from .mcp import FileSystemProvider, MCPManager
+from .file_index import FileIndex
+from .llm import create_message
+from .metrics import HTTP_SECONDS, registry as metrics_registry, summarize, trace
+from .usage import track_usage
+from .sessions import Session, SessionStore
+from .database import Memory, init_db, iter_memories, release_lead, try_lead
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (MASTERMIND_LOG_LEVEL, standaard INFO)
+logging.basicConfig(level=os.getenv("MASTERMIND_LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
+# Wanneer het embedding model geladen wordt:
+#   eager      - tijdens startup, de server accepteert pas daarna requests
+#   background - startup gaat meteen door, het model laadt op de achtergrond
+#   lazy       - bij het eerste request dat een embedding nodig heeft
+MODEL_PRELOAD = os.getenv("MASTERMIND_MODEL_PRELOAD", "background").lower()
+
+# Projectmap waarvan de bestanden doorzoekbaar worden (leeg = geen index)
+FILE_INDEX_ROOT = os.getenv("MASTERMIND_FILE_INDEX_ROOT", "")
+FILE_INDEX_INTERVAL = float(os.getenv("MASTERMIND_FILE_INDEX_INTERVAL", "60"))
+
+# Seconden tussen consolidatie runs over nieuwe herinneringen (0 = uit)
+CONSOLIDATION_INTERVAL = float(os.getenv("MASTERMIND_CONSOLIDATION_INTERVAL", "600"))
+
+# Paginagrootte van /memories (standaard en maximum)
+MEMORY_PAGE_SIZE = int(os.getenv("MASTERMIND_MEMORY_PAGE_SIZE", "200"))
+MEMORY_PAGE_MAX = 5000
+
+# Gesprekssessies: maximaal aantal in het geheugen en verlooptijd in seconden
+SESSION_MAX = int(os.getenv("MASTERMIND_SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("MASTERMIND_SESSION_TTL", "3600"))
+
+async def _warmup_in_background() -> None:
+    try:
+        await knowledge_cluster.warmup()
+        logger.info("Embedding model loaded")
+    except Exception as e:
+        # Niet fataal: het model wordt dan bij het eerste request opnieuw geladen
+        logger.error(f"Embedding model warmup failed: {str(e)}")
+
+async def _consolidate_periodically(interval: float) -> None:
+    # Met meerdere workers consolideert alleen de leider (flock naast de database)
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            if not try_lead("consolidation"):
+                continue
+            try:
+                await knowledge_cluster.consolidate_memories()
+            except Exception as e:
+                logger.error(f"Memory consolidation failed: {str(e)}")
+    finally:
+        release_lead("consolidation")
+
 # Startup en shutdown handlers
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -31,11 +87,46 @@ async def lifespan(app: FastAPI):
     logger.info("Initializing database...")
     await init_db()
     logger.info("Database initialized")
+
+    # MCP providers eenmalig en gelijktijdig laden
+    file_index: Optional[FileIndex] = None
+    if FILE_INDEX_ROOT:
+        file_index = FileIndex(knowledge_cluster, FILE_INDEX_ROOT)
+        file_provider = FileSystemProvider(index=file_index)
+        # Na een scan met wijzigingen de gecachte resources verversen
+        file_index.add_listener(lambda stats: mcp_manager.invalidate(file_provider.name))
+    else:
+        file_provider = FileSystemProvider()
+    await mcp_manager.register_provider(file_provider)
+    await mcp_manager.load_providers()
+    logger.info(f"MCP registry loaded ({len(mcp_manager.resources)} resources, {len(mcp_manager.tools)} tools)")
+
+    warmup_task: Optional[asyncio.Task] = None
+    if MODEL_PRELOAD == "eager":
+        await knowledge_cluster.warmup()
+        logger.info("Embedding model loaded")
+    elif MODEL_PRELOAD == "background":
+        warmup_task = asyncio.create_task(_warmup_in_background())
+
+    if file_index:
+        file_index.start_watching(FILE_INDEX_INTERVAL)
+
+    consolidation_task: Optional[asyncio.Task] = None
+    if CONSOLIDATION_INTERVAL > 0:
+        consolidation_task = asyncio.create_task(_consolidate_periodically(CONSOLIDATION_INTERVAL))
     
     yield
     
     # Shutdown
     logger.info("Cleaning up...")
+    if file_index:
+        await file_index.stop_watching()
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    if consolidation_task:
+        consolidation_task.cancel()
+        await asyncio.gather(consolidation_task, return_exceptions=True)
+    await mcp_manager.close()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -43,9 +134,24 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Initialize Knowledge Cluster
+# Initialize Knowledge Cluster (het embedding model laadt pas in lifespan of bij eerste gebruik)
 knowledge_cluster = KnowledgeCluster()
 
+# Context builder: herinneringen binnen een token budget (MASTERMIND_CONTEXT_TOKEN_BUDGET)
+context_builder = ContextBuilder()
+
+# Aantal kandidaat herinneringen per request; de builder kiest wat in het budget past
+CONTEXT_CANDIDATES = 5
+
+# Langlevend MCP register, gevuld in lifespan
+mcp_manager = MCPManager(knowledge_cluster, context_builder=context_builder)
+
+# Sessies per gesprek (per proces; met meerdere workers sticky routing gebruiken)
+sessions = SessionStore(max_sessions=SESSION_MAX, ttl_seconds=SESSION_TTL)
+
+# Maximaal aantal tokens van het context veld dat de client meestuurt
+CLIENT_CONTEXT_TOKENS = context_builder.token_budget // 4
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -55,6 +161,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency per endpoint en een Server-Timing header met de tijd per fase
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    with trace() as spans:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            elapsed = time.perf_counter() - started
+            HTTP_SECONDS.observe(elapsed, path=path, status=status)
+    stages = summarize(spans)
+    if stages:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{stage};dur={ms:.1f}" for stage, ms in stages.items()
+        )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s %s %d in %.1fms %s", request.method, path, status, 1000 * elapsed, stages)
+    return response
+
 # Initialize Anthropic client
 client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
@@ -69,6 +198,7 @@ MODELS = {
 class ChatRequest(BaseModel):
     message: str
     context: str = ""
+    session_id: Optional[str] = None
 
 class CodeGenerationRequest(BaseModel):
     prompt: str
@@ -79,6 +209,7 @@ class MessageRequest(BaseModel):
     message: str
     context: str = ""
     model: Literal["claude-3-haiku", "claude-3-sonnet", "claude-3-opus"] = "claude-3-sonnet"
+    sessionId: Optional[str] = None
 
 class MemoryManagementRequest(BaseModel):
     entry_id: str
@@ -89,29 +220,27 @@ class MemoryManagementRequest(BaseModel):
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
     try:
-        logger.debug(f"Received chat request: {request}")
-        
-        # Voeg een nieuwe herinnering toe
-        await add_memory(content="Voorbeeld content", category="chat_response", importance=0.5)
-        
-        # Haal herinneringen op
-        memories = await get_memories_by_category("chat_response")
-        logger.debug(f"Retrieved memories: {memories}")
+        logger.debug("Received chat request: %s", request)
         
-        # Zoek relevante herinneringen
-        relevant_memories = await knowledge_cluster.retrieve_knowledge(
-            query=request.message,
-            max_results=3
-        )
-        
-        # Bereid context voor
-        enhanced_context = await prepare_context(request.message, relevant_memories)
-        
-        # API call
-        response = await process_api_call(
-            model=MODELS["claude-3-opus"],
-            context=enhanced_context
-        )
+        session = sessions.get(request.session_id)
+        async with session.lock:
+            # Zoek relevante herinneringen, incrementeel via de sessie
+            relevant_memories = await session_memories(session, request.message)
+
+            # Bereid context voor, met de gespreksgeschiedenis
+            built_context = await prepare_context(
+                request.message,
+                relevant_memories,
+                pinned_blocks=session_blocks(session, request.context)
+            )
+
+            # API call
+            with track_usage(endpoint="/chat", api_key=client.api_key) as usage:
+                response = await process_api_call(
+                    model=MODELS["claude-3-opus"],
+                    context=built_context
+                )
+            await record_turn(session, request.message, response.content[0].text)
         
         # Sla nieuwe kennis op
         await knowledge_cluster.store_knowledge(
@@ -122,7 +251,10 @@ async def chat_endpoint(request: ChatRequest):
         
         return {
             "response": response.content[0].text,
-            "memories": [memory.metadata for memory in relevant_memories]
+            "memories": [memory_payload(memory) for memory in built_context.memories],
+            "context_tokens": built_context.tokens_used,
+            "usage": usage.to_dict(),
+            "session_id": session.id
         }
     except Exception as e:
         logger.error(f"Chat error: {str(e)}", exc_info=True)
@@ -132,48 +264,88 @@ async def chat_endpoint(request: ChatRequest):
         )
 
 # Helper functies
-async def prepare_context(message: str, memories: List[VectorEntry]) -> str:
-    return "\n\n".join([
-        f"Relevante herinnering: {memory.metadata.get('content', '')}" 
-        for memory in memories
-    ]) + f"\n\nOorspronkelijke bericht: {message}"
-
-async def process_api_call(model: str, context: str):
-    return client.messages.create(
+async def prepare_context(
+    message: str,
+    memories: List[VectorEntry],
+    pinned_blocks: Sequence[str] = ()
+) -> BuiltContext:
+    built = context_builder.build(message, memories, pinned_blocks=pinned_blocks)
+    logger.debug(
+        "Context: %d/%d tokens, %d memories (%d duplicates, %d over budget)",
+        built.tokens_used, built.token_budget, len(built.memories),
+        built.duplicates_dropped, built.over_budget_dropped
+    )
+    return built
+
+async def session_memories(session: Session, message: str) -> List[VectorEntry]:
+    """Herinneringen voor een sessie beurt; de database alleen als het nodig is"""
+    query_embedding = await knowledge_cluster.get_vector_embedding(message)
+
+    async def fetch(embedding: List[float]) -> List[VectorEntry]:
+        return await knowledge_cluster.retrieve_knowledge(
+            query=message,
+            max_results=CONTEXT_CANDIDATES,
+            include_embeddings=True,
+            query_embedding=embedding
+        )
+
+    return await session.relevant_memories(query_embedding, fetch, max_results=CONTEXT_CANDIDATES)
+
+def session_blocks(session: Session, client_context: str = "") -> List[str]:
+    """Vaste prompt blokken: het context veld van de client en de sessie geschiedenis"""
+    blocks = []
+    if client_context.strip():
+        blocks.append(f"Context van de gebruiker: {truncate_to_tokens(client_context, CLIENT_CONTEXT_TOKENS)}")
+    return blocks + session.history_blocks()
+
+async def record_turn(session: Session, message: str, answer: str) -> None:
+    await session.add_turn("user", message)
+    await session.add_turn("assistant", answer)
+    logger.debug("Session %s: %s", session.id, session.stats())
+
+async def process_api_call(model: str, context: BuiltContext):
+    # Vaste context en sessie geschiedenis als gecachete prefix; met
+    # MASTERMIND_HEDGE=1 krijgt een trage call een tweede poging
+    return await create_message(
+        client,
         model=model,
         max_tokens=1000,
-        messages=[{"role": "user", "content": context}]
+        messages=[{"role": "user", "content": context.content_blocks()}]
     )
 
 # Code Generation Endpoint met geheugen context
 @app.post("/generate-code")
 async def generate_code_endpoint(request: CodeGenerationRequest):
     try:
-        logger.debug(f"Received code generation request: {request}")
+        logger.debug("Received code generation request: %s", request)
         
         # Zoek relevante code herinneringen
         relevant_memories = await knowledge_cluster.retrieve_knowledge(
             query=f"Code generatie voor {request.language}: {request.prompt}",
-            max_results=3,
-            category='code'
+            max_results=CONTEXT_CANDIDATES,
+            category='code',
+            include_embeddings=True
         )
-        logger.debug(f"Relevant code memories: {relevant_memories}")
         
         # Bereid context voor met code herinneringen
-        enhanced_context = "\n\n".join([
-            f"Relevante code herinnering: {memory.metadata.get('content', '')}" 
-            for memory in relevant_memories
-        ]) + f"\n\nGeneratie opdracht: {request.prompt}"
-        logger.debug(f"Enhanced code context: {enhanced_context}")
-        
-        response = client.messages.create(
-            model=MODELS["claude-3-opus"],
-            max_tokens=1000,
-            messages=[
-                {"role": "user", "content": enhanced_context}
-            ]
+        built_context = context_builder.build(
+            request.prompt,
+            relevant_memories,
+            memory_label="Relevante code herinnering",
+            message_label="Generatie opdracht"
         )
-        logger.debug(f"API Response: {response.content[0].text}")
+        logger.debug("Enhanced code context: %d tokens", built_context.tokens_used)
+        
+        with track_usage(endpoint="/generate-code", api_key=client.api_key) as usage:
+            response = await create_message(
+                client,
+                model=MODELS["claude-3-opus"],
+                max_tokens=1000,
+                messages=[
+                    {"role": "user", "content": built_context.content_blocks()}
+                ]
+            )
+        logger.debug("API Response: %s", response.content[0].text)
         
         # Sla nieuwe code kennis op
         await knowledge_cluster.store_knowledge(
@@ -185,7 +357,9 @@ async def generate_code_endpoint(request: CodeGenerationRequest):
         logger.debug("Code generation processed successfully")
         return {
             "code": response.content[0].text,
-            "memories": [memory.metadata for memory in relevant_memories]
+            "memories": [memory_payload(memory) for memory in built_context.memories],
+            "context_tokens": built_context.tokens_used,
+            "usage": usage.to_dict()
         }
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
@@ -195,7 +369,7 @@ async def generate_code_endpoint(request: CodeGenerationRequest):
 @app.post("/process_message")
 async def process_message(request: MessageRequest):
     try:
-        logger.debug(f"Received message request: {request}")
+        logger.debug("Received message request: %s", request)
 
         # API key verificatie
         api_key = request.apiKey or os.getenv('ANTHROPIC_API_KEY')
@@ -205,27 +379,33 @@ async def process_message(request: MessageRequest):
 
         client = anthropic.Anthropic(api_key=api_key)
         
-        # Initialiseer MCPManager met KnowledgeCluster
-        mcp_manager = MCPManager(knowledge_cluster)
-        enhanced_context = await mcp_manager.get_context(request.message)
-        logger.debug(f"Enhanced context from MCPManager: {enhanced_context}")
-        
-        # Voeg originele bericht toe aan de context
-        enhanced_context += f"\n\nOorspronkelijke bericht: {request.message}"
-        
         # Get model string
         model_version = MODELS.get(request.model)
         if not model_version:
             raise HTTPException(status_code=400, detail=f"Invalid model: {request.model}")
         
-        response = client.messages.create(
-            model=model_version,
-            max_tokens=1000,
-            messages=[
-                {"role": "user", "content": enhanced_context}
-            ]
-        )
-        logger.debug(f"API Response: {response.content[0].text}")
+        session = sessions.get(request.sessionId)
+        async with session.lock:
+            # Context uit herinneringen, MCP resources en de sessie, binnen het token budget
+            built_context = await mcp_manager.get_context(
+                request.message,
+                max_results=CONTEXT_CANDIDATES,
+                memories=await session_memories(session, request.message),
+                pinned_blocks=session_blocks(session, request.context)
+            )
+            logger.debug("Enhanced context from MCPManager: %d tokens", built_context.tokens_used)
+
+            with track_usage(endpoint="/process_message", api_key=api_key) as usage:
+                response = await create_message(
+                    client,
+                    model=model_version,
+                    max_tokens=1000,
+                    messages=[
+                        {"role": "user", "content": built_context.content_blocks()}
+                    ]
+                )
+            logger.debug("API Response: %s", response.content[0].text)
+            await record_turn(session, request.message, response.content[0].text)
         
         # Sla nieuwe kennis op
         await knowledge_cluster.store_knowledge(
@@ -236,12 +416,12 @@ async def process_message(request: MessageRequest):
         
         logger.debug("Message processed successfully")
         
-        relevant_memories = await knowledge_cluster.retrieve_knowledge(request.message, 3)
-        logger.debug(f"Relevant memories: {relevant_memories}")
-        
         return {
             "content": response.content[0].text,
-            "memories": [memory.metadata for memory in relevant_memories]
+            "memories": [memory_payload(memory) for memory in built_context.memories],
+            "context_tokens": built_context.tokens_used,
+            "usage": usage.to_dict(),
+            "session_id": session.id
         }
     except anthropic.APIError as e:
         logger.error(f"Anthropic API Error: {str(e)}")
@@ -268,6 +448,71 @@ async def manage_memory(request: MemoryManagementRequest):
         logger.error(f"Memory management error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Status en opruimen van gesprekssessies
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = sessions.peek(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {**session.stats(), "summary": session.summary}
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"status": "success", "message": "Session deleted"}
+
+# Herinneringen doorbladeren: NDJSON stream met cursor paginering
+def memory_record(memory: Memory) -> Dict[str, Any]:
+    return {
+        "id": memory.id,
+        "content": memory.content,
+        "category": memory.category,
+        "importance": memory.importance,
+        "collection": memory.collection,
+        "attributes": memory.attributes,
+        "created_at": memory.created_at.isoformat() if memory.created_at else None,
+        "updated_at": memory.updated_at.isoformat() if memory.updated_at else None,
+    }
+
+@app.get("/memories")
+async def list_memories(
+    cursor: int = Query(0, ge=0, description="id van de laatst ontvangen herinnering"),
+    limit: int = Query(MEMORY_PAGE_SIZE, ge=1, le=MEMORY_PAGE_MAX),
+    category: Optional[str] = None,
+    collection: Optional[str] = None
+):
+    """Eén pagina herinneringen (zonder chunks), één JSON object per regel
+
+    De laatste regel is {"next_cursor": id}, of null als er niets meer is;
+    de volgende pagina vraag je op met ?cursor=<next_cursor>.
+    """
+    async def lines() -> AsyncIterator[str]:
+        sent, last_id, more = 0, cursor, False
+        async for memory in iter_memories(
+            category=category,
+            collection=collection,
+            after_id=cursor,
+            page_size=min(limit + 1, 500),
+            include_chunks=False
+        ):
+            if sent == limit:
+                more = True
+                break
+            yield json.dumps(memory_record(memory), ensure_ascii=False) + "\n"
+            sent, last_id = sent + 1, memory.id
+        yield json.dumps({"next_cursor": last_id if more else None}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Prometheus metrics (latency per fase, model en endpoint)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 # Health Check met geheugen status
 @app.get("/health")
 async def health_check():
@@ -288,5 +533,41 @@ async def health_check():
         logger.error(f"Health check error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def main() -> None:
+    """Start de server, optioneel met meerdere worker processen
+
+    Met --workers N > 1 laadt één gedeelde embedding service het model
+    (Unix socket, met micro-batching en een gedeelde LRU cache) en gebruiken
+    alle workers die via de remote backend. Schrijfacties naar SQLite lopen
+    via een lock bestand, zodat er steeds één schrijver is.
+    """
+    parser = argparse.ArgumentParser(description="Mastermind AI API server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MASTERMIND_WORKERS", "1")))
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port)
+        return
+
+    from .embedding_service import spawn_embedding_service
+
+    service = None
+    if os.getenv("MASTERMIND_EMBEDDING_BACKEND", "").lower() != "remote":
+        # Anders draait er al een service op MASTERMIND_EMBEDDING_SOCKET
+        socket_path = os.path.join(tempfile.mkdtemp(prefix="mastermind-"), "embeddings.sock")
+        service = spawn_embedding_service(socket_path, os.getenv("MASTERMIND_EMBEDDING_BACKEND"))
+        os.environ["MASTERMIND_EMBEDDING_BACKEND"] = "remote"
+        os.environ["MASTERMIND_EMBEDDING_SOCKET"] = socket_path
+    # Workers importeren de server opnieuw en lezen deze instellingen bij import
+    os.environ["MASTERMIND_WRITE_LOCK"] = "1"
+    try:
+        uvicorn.run("mastermind.server:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait(timeout=10)
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    main()
\ No newline at end of file
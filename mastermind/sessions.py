@@ -0,0 +1,250 @@
+"""Gesprekssessies met incrementele context
+
+Een sessie bewaart de geschiedenis van één gesprek aan de serverkant, zodat
+de client niet elke beurt alles opnieuw hoeft te sturen. Om de prompt per
+beurt even groot te houden:
+
+- blijven alleen de laatste beurten letterlijk bewaard, binnen een token
+  budget; oudere beurten worden in een doorlopende samenvatting gevouwen
+- onthoudt de sessie de herinneringen (met embeddings) die eerder zijn
+  opgehaald; elke beurt worden die lokaal opnieuw gerankt tegen de nieuwe
+  vraag en alleen aangevuld uit de database, en als de vraag vrijwel gelijk
+  is aan de vorige wordt de database helemaal overgeslagen
+
+De SessionStore ruimt sessies op volgens LRU (max_sessions) en TTL. De
+store leeft per proces: met meerdere workers is een sticky load balancer
+nodig om een gesprek bij dezelfde worker te houden.
+"""
+import asyncio
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .chunking import estimate_tokens, truncate_to_tokens
+from .vectordb import VectorEntry
+
+logger = logging.getLogger(__name__)
+
+# Vat een lijst beurten samen, gegeven de vorige samenvatting
+Summarizer = Callable[[str, Sequence["SessionTurn"]], Awaitable[str]]
+# Haalt herinneringen op voor een query embedding
+MemoryFetcher = Callable[[List[float]], Awaitable[List[VectorEntry]]]
+
+# Maximale lengte van één regel in de standaard samenvatting
+SUMMARY_LINE_TOKENS = 40
+
+_SENTENCE = re.compile(r"(.+?[.!?])(\s|$)", re.DOTALL)
+
+
+@dataclass
+class SessionTurn:
+    """Eén bericht in een gesprek"""
+    role: str
+    content: str
+    tokens: int
+    timestamp: float = field(default_factory=time.time)
+
+
+async def extractive_summarizer(summary: str, turns: Sequence[SessionTurn]) -> str:
+    """Standaard samenvatting zonder LLM call: de eerste zin van elke beurt"""
+    lines = [summary] if summary else []
+    for turn in turns:
+        text = " ".join(turn.content.split())
+        match = _SENTENCE.match(text)
+        first = match.group(1) if match else text
+        lines.append(f"{turn.role}: {truncate_to_tokens(first, SUMMARY_LINE_TOKENS)}")
+    return "\n".join(lines)
+
+
+class Session:
+    """Geschiedenis en gecachte herinneringen van één gesprek
+
+    :param session_id: Sleutel van de sessie
+    :param history_token_budget: Tokens voor samenvatting plus recente beurten
+    :param summary_token_budget: Maximale lengte van de samenvatting
+    :param max_cached_memories: Aantal herinneringen dat de sessie onthoudt
+    :param reuse_threshold: Cosine similarity met de vorige vraag vanaf waar
+        de database niet opnieuw doorzocht wordt
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        history_token_budget: int = 600,
+        summary_token_budget: int = 200,
+        max_cached_memories: int = 20,
+        reuse_threshold: float = 0.9
+    ) -> None:
+        self.id = session_id
+        self.history_token_budget = history_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.max_cached_memories = max_cached_memories
+        self.reuse_threshold = reuse_threshold
+        self.turns: List[SessionTurn] = []
+        self.summary = ""
+        self.summarized_turns = 0
+        self.memories: Dict[int, VectorEntry] = {}
+        self.last_query: Optional[np.ndarray] = None
+        self.retrievals = 0
+        self.reused_retrievals = 0
+        self.created = time.time()
+        self.last_used = time.monotonic()
+        # Beurten van dezelfde sessie na elkaar afhandelen
+        self.lock = asyncio.Lock()
+
+    @property
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(turn.tokens for turn in self.turns)
+
+    def history_blocks(self) -> List[str]:
+        """Samenvatting en recente beurten als prompt blokken
+
+        Eén blok per beurt: tot de volgende compactie groeit de lijst alleen
+        aan het eind, zodat de vorige geschiedenis een gecachete prefix blijft.
+        """
+        blocks = []
+        if self.summary:
+            blocks.append(f"Samenvatting van het gesprek tot nu toe:\n{self.summary}")
+        for i, turn in enumerate(self.turns):
+            header = "Recente berichten:\n" if i == 0 else ""
+            blocks.append(f"{header}{turn.role}: {turn.content}")
+        return blocks
+
+    async def add_turn(self, role: str, content: str, summarizer: Summarizer = extractive_summarizer) -> None:
+        """Voeg een bericht toe en vouw oudere beurten in de samenvatting"""
+        self.turns.append(SessionTurn(role=role, content=content, tokens=estimate_tokens(content)))
+        await self._compact(summarizer)
+
+    async def _compact(self, summarizer: Summarizer) -> None:
+        if self.history_tokens <= self.history_token_budget or len(self.turns) <= 1:
+            return
+        # Oudste beurten eruit tot de rest (zonder samenvatting) in de helft van het budget past
+        folded: List[SessionTurn] = []
+        target = self.history_token_budget // 2
+        while len(self.turns) > 1 and sum(turn.tokens for turn in self.turns) > target:
+            folded.append(self.turns.pop(0))
+        if not folded:
+            return
+        summary = await summarizer(self.summary, folded)
+        # Houd het einde: de meest recente samenvatting is het relevantst
+        if estimate_tokens(summary) > self.summary_token_budget:
+            tail = truncate_to_tokens(summary[::-1], self.summary_token_budget)[::-1]
+            summary = tail.split("\n", 1)[-1] if "\n" in tail else tail
+        self.summary = summary
+        self.summarized_turns += len(folded)
+
+    async def relevant_memories(
+        self,
+        query_embedding: List[float],
+        fetch: MemoryFetcher,
+        max_results: int = 5
+    ) -> List[VectorEntry]:
+        """Herinneringen voor deze beurt, incrementeel uit de sessie cache
+
+        Nieuwe resultaten uit fetch worden aan de cache toegevoegd; alle
+        gecachte herinneringen worden tegen de nieuwe vraag gerankt.
+        """
+        query = _unit(query_embedding)
+        similar = (
+            self.last_query is not None
+            and self.memories
+            and float(self.last_query @ query) >= self.reuse_threshold
+        )
+        self.retrievals += 1
+        if similar:
+            self.reused_retrievals += 1
+        else:
+            for memory in await fetch(query_embedding):
+                if memory.id is not None and memory.embedding is not None:
+                    self.memories[int(memory.id)] = memory
+        self.last_query = query
+
+        ranked = []
+        for key, memory in self.memories.items():
+            score = float(_unit(memory.embedding) @ query)
+            ranked.append((score, key, memory))
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        # Cache begrenzen tot de herinneringen die nu het best passen
+        for _, key, _ in ranked[self.max_cached_memories:]:
+            del self.memories[key]
+        # Kopieën met de score voor deze vraag; de cache blijft ongewijzigd
+        return [memory.with_score(score) for score, _, memory in ranked[:max_results]]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "session_id": self.id,
+            "turns": len(self.turns),
+            "summarized_turns": self.summarized_turns,
+            "history_tokens": self.history_tokens,
+            "cached_memories": len(self.memories),
+            "retrievals": self.retrievals,
+            "reused_retrievals": self.reused_retrievals
+        }
+
+
+class SessionStore:
+    """Sessies per gesprek met LRU en TTL eviction
+
+    :param max_sessions: Maximaal aantal sessies in het geheugen
+    :param ttl_seconds: Sessies die zo lang niet gebruikt zijn vervallen
+    :param session_options: Extra argumenten voor nieuwe Session objecten
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600.0, **session_options: object) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.session_options = session_options
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        """Bestaande sessie of een nieuwe (met een gegenereerd id als dat ontbreekt)"""
+        self._evict_expired()
+        session_id = session_id or uuid.uuid4().hex
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(session_id, **self.session_options)  # type: ignore[arg-type]
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                _, oldest = self._sessions.popitem(last=False)
+                self.evicted += 1
+                logger.debug("Evicted session %s (LRU)", oldest.id)
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def peek(self, session_id: str) -> Optional[Session]:
+        """Sessie opzoeken zonder hem aan te maken of te verversen"""
+        self._evict_expired()
+        return self._sessions.get(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def _evict_expired(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Op volgorde van gebruik: de oudste staan vooraan
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+            logger.debug("Evicted session %s (TTL)", session.id)
+
+
+def _unit(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
@@ -0,0 +1,293 @@
+"""Snapshots van de memory store: export en import zonder opnieuw te embedden
+
+Een snapshot is een map met per deel van chunk_rows rijen:
+    part-00000.npz    kolommen als NumPy arrays: id, parent_id, chunk_index,
+                      importance en de embeddings als één float32 array met
+                      offsets (rij i = embedding[offset[i]:offset[i+1]],
+                      leeg voor rijen zonder embedding)
+    part-00000.jsonl  per rij content, category, collection, attributes en
+                      timestamps, in dezelfde volgorde
+en een manifest.json die als laatste geschreven wordt: een snapshot zonder
+manifest is onvolledig. De embeddings gaan als ruwe (genormaliseerde)
+float32 bytes terug de tabel in, dus een restore kost geen model aanroep.
+Export en import lopen via ruwe SQL op de SQLite driver (executemany), de
+ORM conversie per rij zou anders het grootste deel van de tijd kosten.
+
+Bij een import in een database die al rijen heeft worden alle ids (en
+parent_ids) verschoven voorbij het hoogste bestaande id; in een lege
+database blijven ze gelijk.
+
+Gebruik:
+    python -m mastermind.snapshot export DIR [--collection NAAM] [--chunk-rows 50000]
+    python -m mastermind.snapshot import DIR [--verify]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+
+from .database import Memory, engine, init_db, write_lock
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+# Volgorde van de kolommen in de ruwe SQL; waarden gaan ongewijzigd (timestamps
+# als SQLite tekst, attributes als JSON tekst) door de driver, zonder de per-rij
+# conversie van de ORM types.
+_COLUMNS = (
+    "id", "parent_id", "chunk_index", "importance", "embedding",
+    "content", "category", "collection", "attributes", "created_at", "updated_at"
+)
+_TEXT_COLUMNS = _COLUMNS[5:]
+_TABLE = Memory.__tablename__
+
+
+@dataclass
+class SnapshotStats:
+    """Resultaat van een export of import"""
+    rows: int = 0
+    embeddings: int = 0
+    parts: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+def _part_name(index: int) -> str:
+    return f"part-{index:05d}"
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_part(directory: str, index: int, rows: Sequence[Any], compress: bool) -> Dict[str, Any]:
+    """Schrijf één deel naar disk (draait in een executor)"""
+    count = len(rows)
+    ids, parent_ids, chunk_indices, importance, blobs = zip(*(row[:5] for row in rows))
+    lengths = np.fromiter((len(blob or b"") // 4 for blob in blobs), dtype=np.int64, count=count)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    columns = {
+        "id": np.array(ids, dtype=np.int64),
+        "parent_id": np.array([-1 if v is None else v for v in parent_ids], dtype=np.int64),
+        "chunk_index": np.array([-1 if v is None else v for v in chunk_indices], dtype=np.int64),
+        "importance": np.array(importance, dtype=np.float64),
+        "embedding": np.frombuffer(b"".join(blob or b"" for blob in blobs), dtype=np.float32),
+        "embedding_offsets": offsets,
+    }
+    name = _part_name(index)
+    arrays_path = os.path.join(directory, f"{name}.npz")
+    with open(arrays_path, "wb") as f:
+        (np.savez_compressed if compress else np.savez)(f, **columns)
+    text_path = os.path.join(directory, f"{name}.jsonl")
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.writelines(
+            json.dumps(dict(zip(_TEXT_COLUMNS, row[5:])), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+    return {
+        "name": name,
+        "rows": count,
+        "embeddings": int(np.count_nonzero(lengths)),
+        "first_id": int(columns["id"][0]),
+        "last_id": int(columns["id"][-1]),
+        "files": {
+            path_name: {"bytes": os.path.getsize(path), "sha256": _sha256(path)}
+            for path_name, path in ((f"{name}.npz", arrays_path), (f"{name}.jsonl", text_path))
+        },
+    }
+
+
+async def export_snapshot(
+    directory: str,
+    collections: Optional[Sequence[str]] = None,
+    chunk_rows: int = 50_000,
+    compress: bool = False
+) -> SnapshotStats:
+    """Exporteer de memories tabel (of enkele collecties) naar directory
+
+    Leest met keyset paginering binnen één lees transactie, dus een
+    consistente momentopname terwijl de server gewoon blijft schrijven.
+    """
+    started = time.perf_counter()
+    await init_db()
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.unlink(manifest_path)
+
+    loop = asyncio.get_running_loop()
+    stats = SnapshotStats()
+    parts: List[Dict[str, Any]] = []
+    last_id = 0
+    sql = f"SELECT {', '.join(_COLUMNS)} FROM {_TABLE} WHERE id > ?"
+    if collections:
+        # Chunks hebben dezelfde collectie als hun parent en gaan dus mee
+        sql += f" AND collection IN ({', '.join('?' * len(collections))})"
+    sql += " ORDER BY id LIMIT ?"
+    async with engine.connect() as conn:
+        # pysqlite start zelf geen transactie voor een SELECT: zonder expliciete
+        # BEGIN ziet elke pagina een andere stand van de tabel
+        await conn.exec_driver_sql("BEGIN")
+        while True:
+            result = await conn.exec_driver_sql(sql, (last_id, *(collections or ()), chunk_rows))
+            rows = result.all()
+            if not rows:
+                break
+            part = await loop.run_in_executor(None, _write_part, directory, len(parts), rows, compress)
+            parts.append(part)
+            stats.rows += part["rows"]
+            stats.embeddings += part["embeddings"]
+            stats.bytes += sum(f["bytes"] for f in part["files"].values())
+            last_id = part["last_id"]
+            logger.debug("Exported %s (%d rows)", part["name"], part["rows"])
+            if len(rows) < chunk_rows:
+                break
+        await conn.rollback()
+
+    manifest = {
+        "format": "mastermind-snapshot",
+        "version": FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "collections": list(collections) if collections else None,
+        "rows": stats.rows,
+        "embeddings": stats.embeddings,
+        "parts": parts,
+    }
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    stats.parts = len(parts)
+    stats.seconds = time.perf_counter() - started
+    logger.info(
+        "Exported %d memories (%d embeddings) in %d parts to %s in %.2fs",
+        stats.rows, stats.embeddings, stats.parts, directory, stats.seconds
+    )
+    return stats
+
+
+def load_manifest(directory: str) -> Dict[str, Any]:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        raise ValueError(f"No {MANIFEST} in {directory}: not a (complete) snapshot")
+    with open(path, encoding="utf-8") as f:
+        manifest: Dict[str, Any] = json.load(f)
+    if manifest.get("format") != "mastermind-snapshot" or manifest.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format in {directory}")
+    return manifest
+
+
+def _read_part(directory: str, part: Dict[str, Any], offset: int, verify: bool) -> List[Tuple[Any, ...]]:
+    """Lees één deel als insert parameters (draait in een executor)"""
+    if verify:
+        for file_name, info in part["files"].items():
+            if _sha256(os.path.join(directory, file_name)) != info["sha256"]:
+                raise ValueError(f"Checksum mismatch for {file_name}")
+    with np.load(os.path.join(directory, f"{part['name']}.npz")) as arrays:
+        ids = arrays["id"]
+        parent_ids = arrays["parent_id"]
+        chunk_indices = arrays["chunk_index"]
+        importance = arrays["importance"]
+        embedding = arrays["embedding"]
+        offsets = arrays["embedding_offsets"]
+    raw = embedding.tobytes()
+    with open(os.path.join(directory, f"{part['name']}.jsonl"), encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    if len(records) != len(ids):
+        raise ValueError(f"{part['name']}: {len(ids)} array rows but {len(records)} text rows")
+
+    ids = (ids + offset).tolist()
+    parent_ids = np.where(parent_ids >= 0, parent_ids + offset, -1).tolist()
+    chunk_indices = chunk_indices.tolist()
+    importance = importance.tolist()
+    offsets = (offsets * 4).tolist()
+    params = []
+    for i, record in enumerate(records):
+        start, end = offsets[i], offsets[i + 1]
+        params.append((
+            ids[i],
+            parent_ids[i] if parent_ids[i] >= 0 else None,
+            chunk_indices[i] if chunk_indices[i] >= 0 else None,
+            importance[i],
+            raw[start:end] if end > start else None,
+            *(record[column] for column in _TEXT_COLUMNS)
+        ))
+    return params
+
+
+async def import_snapshot(directory: str, verify: bool = False) -> SnapshotStats:
+    """Lees een snapshot in de memories tabel, zonder te embedden
+
+    Alle delen gaan in één transactie onder de write lock: een mislukte
+    import laat de database ongewijzigd.
+    """
+    started = time.perf_counter()
+    manifest = load_manifest(directory)
+    await init_db()
+    loop = asyncio.get_running_loop()
+    stats = SnapshotStats()
+    insert = f"INSERT INTO {_TABLE} ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+    async with write_lock():
+        async with engine.begin() as conn:
+            offset = int((await conn.execute(select(func.max(Memory.id)))).scalar() or 0)
+            parts = manifest["parts"]
+            # Het volgende deel wordt al gelezen terwijl SQLite het huidige inserteert
+            pending = loop.run_in_executor(None, _read_part, directory, parts[0], offset, verify) if parts else None
+            for index, part in enumerate(parts):
+                params = await pending
+                if index + 1 < len(parts):
+                    pending = loop.run_in_executor(None, _read_part, directory, parts[index + 1], offset, verify)
+                await conn.exec_driver_sql(insert, params)
+                stats.rows += len(params)
+                stats.embeddings += part["embeddings"]
+                stats.bytes += sum(f["bytes"] for f in part["files"].values())
+                stats.parts += 1
+    stats.seconds = time.perf_counter() - started
+    logger.info(
+        "Imported %d memories (%d embeddings) from %s in %.2fs (id offset %d)",
+        stats.rows, stats.embeddings, directory, stats.seconds, offset
+    )
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="schrijf een snapshot")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--collection", action="append", help="alleen deze collectie (herhaalbaar)")
+    export_parser.add_argument("--chunk-rows", type=int, default=50_000)
+    export_parser.add_argument("--compress", action="store_true", help="gecomprimeerde .npz (trager)")
+    import_parser = commands.add_parser("import", help="lees een snapshot in")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--verify", action="store_true", help="controleer de sha256 van elk bestand")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("MASTERMIND_LOG_LEVEL", "INFO").upper())
+    if args.command == "export":
+        stats = asyncio.run(export_snapshot(args.directory, args.collection, args.chunk_rows, args.compress))
+    else:
+        stats = asyncio.run(import_snapshot(args.directory, verify=args.verify))
+    print(f"{args.command}: {stats.rows} rows, {stats.embeddings} embeddings, "
+          f"{stats.parts} parts, {stats.bytes / 1e6:.1f} MB in {stats.seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Concurrent tool execution for MCP tools
+
+Voert tool calls uit één model-beurt parallel uit, met per tool een
+concurrency limiet en timeout, optioneel annuleren van de overige calls bij
+een fout, en memoization van tools die als pure zijn gedeclareerd
+(bijvoorbeeld read_file, gesleuteld op pad + mtime). Elke call levert een
+ToolCallResult met wachttijd en latency.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Hashable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .mcp import MCPTool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ToolCall:
+    """Eén aanroep van een tool, zoals gevraagd door het model"""
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    args: Tuple[Any, ...] = ()
+    id: Optional[str] = None
+
+
+@dataclass
+class ToolCallResult:
+    """Uitkomst en timing van een ToolCall"""
+    call: ToolCall
+    success: bool
+    result: Any = None
+    error: Optional[str] = None
+    exception: Optional[BaseException] = None
+    cached: bool = False
+    cancelled: bool = False
+    queued_seconds: float = 0.0
+    latency_seconds: float = 0.0
+
+
+class ToolExecutor:
+    """Voert MCP tool calls uit met limieten, timeouts en memoization
+
+    :param tools: Functie die de actuele tools per naam teruggeeft
+    :param default_timeout: Timeout in seconden voor tools zonder eigen timeout
+    :param cache_size: Maximaal aantal gememoiseerde resultaten (LRU)
+    :param trace_size: Aantal recente call traces dat bewaard blijft
+    """
+
+    def __init__(
+        self,
+        tools: Callable[[], Dict[str, "MCPTool"]],
+        default_timeout: Optional[float] = 30.0,
+        cache_size: int = 256,
+        trace_size: int = 1000
+    ) -> None:
+        self._tools = tools
+        self.default_timeout = default_timeout
+        self.cache_size = cache_size
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._cache: "OrderedDict[Tuple[str, Hashable], Any]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, Hashable], "asyncio.Future[Any]"] = {}
+        self.traces: Deque[ToolCallResult] = deque(maxlen=trace_size)
+
+    def clear_cache(self, tool_name: Optional[str] = None) -> None:
+        """Vergeet gememoiseerde resultaten van één of alle tools"""
+        for key in [k for k in self._cache if tool_name is None or k[0] == tool_name]:
+            del self._cache[key]
+
+    async def execute(self, call: ToolCall) -> ToolCallResult:
+        """Voer één call uit; fouten komen in het resultaat, niet als exceptie"""
+        started = time.perf_counter()
+        outcome = ToolCallResult(call=call, success=False)
+        try:
+            tool = self._tools().get(call.name)
+            if tool is None:
+                raise ValueError(f"Hulpmiddel {call.name} niet gevonden")
+            outcome.result, outcome.cached, outcome.queued_seconds = await self._run(tool, call)
+            outcome.success = True
+        except asyncio.CancelledError:
+            outcome.cancelled = True
+            outcome.error = "cancelled"
+            raise
+        except asyncio.TimeoutError as e:
+            outcome.exception = e
+            outcome.error = f"Tool {call.name} timed out"
+        except Exception as e:
+            outcome.exception = e
+            outcome.error = str(e)
+        finally:
+            outcome.latency_seconds = time.perf_counter() - started
+            self.traces.append(outcome)
+            logger.debug(
+                "Tool %s: success=%s cached=%s queued=%.1fms latency=%.1fms",
+                call.name, outcome.success, outcome.cached,
+                1000 * outcome.queued_seconds, 1000 * outcome.latency_seconds
+            )
+        return outcome
+
+    async def execute_batch(
+        self,
+        calls: Sequence[ToolCall],
+        cancel_on_failure: bool = False
+    ) -> List[ToolCallResult]:
+        """Voer calls parallel uit; resultaten in dezelfde volgorde als calls
+
+        Met cancel_on_failure worden de nog lopende calls geannuleerd zodra
+        er één mislukt; die krijgen cancelled=True.
+        """
+        tasks = [asyncio.ensure_future(self.execute(call)) for call in calls]
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            failed = any(not task.cancelled() and not task.result().success for task in done)
+            if cancel_on_failure and failed:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                break
+
+        results = []
+        for call, task in zip(calls, tasks):
+            if task.cancelled():
+                results.append(ToolCallResult(call=call, success=False, cancelled=True, error="cancelled"))
+            else:
+                results.append(task.result())
+        return results
+
+    async def _run(self, tool: "MCPTool", call: ToolCall) -> Tuple[Any, bool, float]:
+        """Geeft (resultaat, uit cache, wachttijd voor de semaphore)"""
+        if not tool.pure:
+            result, queued = await self._invoke(tool, call)
+            return result, False, queued
+
+        key = (tool.name, self._cache_key(tool, call))
+        while True:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key], True, 0.0
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            # Identieke pure call loopt al: deel het resultaat
+            try:
+                return await asyncio.shield(inflight), True, 0.0
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # Niet deze call maar de oorspronkelijke werd geannuleerd: de
+                # eerste wachtende start hem opnieuw, de rest deelt daarin
+
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result, queued = await self._invoke(tool, call)
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Markeer als opgehaald als niemand meeluisterde
+            raise
+        finally:
+            del self._inflight[key]
+
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result, False, queued
+
+    async def _invoke(self, tool: "MCPTool", call: ToolCall) -> Tuple[Any, float]:
+        waited = time.perf_counter()
+        semaphore = self._semaphore(tool)
+        if semaphore is None:
+            return await self._with_timeout(tool, call), 0.0
+        async with semaphore:
+            queued = time.perf_counter() - waited
+            return await self._with_timeout(tool, call), queued
+
+    async def _with_timeout(self, tool: "MCPTool", call: ToolCall) -> Any:
+        timeout = tool.timeout if tool.timeout is not None else self.default_timeout
+        return await asyncio.wait_for(tool.function(*call.args, **call.arguments), timeout)
+
+    def _semaphore(self, tool: "MCPTool") -> Optional[asyncio.Semaphore]:
+        if not tool.max_concurrency:
+            return None
+        if tool.name not in self._semaphores:
+            self._semaphores[tool.name] = asyncio.Semaphore(tool.max_concurrency)
+        return self._semaphores[tool.name]
+
+    @staticmethod
+    def _cache_key(tool: "MCPTool", call: ToolCall) -> Hashable:
+        if tool.cache_key is not None:
+            return tool.cache_key(*call.args, **call.arguments)
+        return (repr(call.args), repr(sorted(call.arguments.items())))
@@ -0,0 +1,231 @@
+"""Token- en kostenregistratie van LLM calls
+
+Elke call via llm.create_message wordt met model, input/output tokens,
+latency en geschatte kosten vastgelegd. track_usage() opent een scope
+(een orchestrator run, een agent taak of een HTTP request) die alle calls
+daarbinnen optelt, ook als ze in parallelle taken gebeuren. Scopes mogen
+genest zijn: een call telt mee in elke actieve scope.
+
+Bij prompt caching telt de API gecachete tokens apart: cache writes kosten
+1.25x en cache reads 0.1x de input prijs. input_tokens is alleen het deel
+dat niet uit of naar de cache ging.
+
+Totalen gaan ook naar de metrics: per model, en per endpoint en API key
+(als vingerafdruk, nooit de key zelf) voor scopes die die labels hebben.
+"""
+import hashlib
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# USD per miljoen (input, output) tokens, op prefix van de model identifier
+MODEL_PRICING: Dict[str, Tuple[float, float]] = {
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-sonnet": (3.0, 15.0),
+    "claude-3.5-sonnet": (3.0, 15.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-opus": (15.0, 75.0),
+}
+
+# Prijs van cache writes en reads als factor van de input prijs
+CACHE_WRITE_FACTOR = 1.25
+CACHE_READ_FACTOR = 0.1
+# Requests via de Message Batches API kosten de helft
+BATCH_DISCOUNT = 0.5
+
+LLM_TOKENS = registry.counter(
+    "mastermind_llm_tokens_total",
+    "Tokens used by LLM calls per model and direction (input/output/cache_write/cache_read)",
+    ("model", "direction")
+)
+LLM_COST = registry.counter(
+    "mastermind_llm_cost_usd_total",
+    "Estimated LLM cost in USD per model",
+    ("model",)
+)
+ENDPOINT_TOKENS = registry.counter(
+    "mastermind_endpoint_tokens_total",
+    "Tokens used per endpoint, API key fingerprint and direction",
+    ("endpoint", "api_key", "direction")
+)
+ENDPOINT_COST = registry.counter(
+    "mastermind_endpoint_cost_usd_total",
+    "Estimated LLM cost in USD per endpoint and API key fingerprint",
+    ("endpoint", "api_key")
+)
+
+
+def model_price(model: str) -> Optional[Tuple[float, float]]:
+    """Prijs per miljoen (input, output) tokens, via de langste passende prefix"""
+    matches = [prefix for prefix in MODEL_PRICING if model.startswith(prefix)]
+    return MODEL_PRICING[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    cache_write_tokens: int = 0,
+    cache_read_tokens: int = 0
+) -> float:
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    input_equivalent = (
+        input_tokens
+        + CACHE_WRITE_FACTOR * cache_write_tokens
+        + CACHE_READ_FACTOR * cache_read_tokens
+    )
+    return (input_equivalent * price[0] + output_tokens * price[1]) / 1_000_000
+
+
+def api_key_id(api_key: Optional[str]) -> str:
+    """Niet-omkeerbare vingerafdruk van een API key voor labels en logs"""
+    if not api_key:
+        return "none"
+    return "sha256:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def _as_int(value: Any) -> int:
+    return value if isinstance(value, int) and not isinstance(value, bool) else 0
+
+
+@dataclass
+class LLMCall:
+    """Eén LLM call"""
+    model: str
+    input_tokens: int
+    output_tokens: int
+    latency_seconds: float
+    cost_usd: float
+    cache_write_tokens: int = 0
+    cache_read_tokens: int = 0
+
+
+@dataclass
+class UsageSummary:
+    """Opgetelde usage van alle calls in een scope"""
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_write_tokens: int = 0
+    cache_read_tokens: int = 0
+    cost_usd: float = 0.0
+    latency_seconds: float = 0.0
+    by_model: Dict[str, "UsageSummary"] = field(default_factory=dict)
+
+    @property
+    def prompt_tokens(self) -> int:
+        """Alle input tokens, ook die uit of naar de cache gingen"""
+        return self.input_tokens + self.cache_write_tokens + self.cache_read_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Fractie van de prompt tokens die uit de cache kwam"""
+        return self.cache_read_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def add(self, call: LLMCall, per_model: bool = True) -> None:
+        self.calls += 1
+        self.input_tokens += call.input_tokens
+        self.output_tokens += call.output_tokens
+        self.cache_write_tokens += call.cache_write_tokens
+        self.cache_read_tokens += call.cache_read_tokens
+        self.cost_usd += call.cost_usd
+        self.latency_seconds += call.latency_seconds
+        if per_model:
+            self.by_model.setdefault(call.model, UsageSummary()).add(call, per_model=False)
+
+    def merge(self, other: "UsageSummary") -> None:
+        """Tel de usage van een andere scope hierbij op"""
+        self.calls += other.calls
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_write_tokens += other.cache_write_tokens
+        self.cache_read_tokens += other.cache_read_tokens
+        self.cost_usd += other.cost_usd
+        self.latency_seconds += other.latency_seconds
+        for model, usage in other.by_model.items():
+            self.by_model.setdefault(model, UsageSummary()).merge(usage)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_hit_ratio": round(self.cache_hit_ratio, 4),
+            "total_tokens": self.total_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "latency_seconds": round(self.latency_seconds, 4)
+        }
+        if self.by_model:
+            data["by_model"] = {model: usage.to_dict() for model, usage in self.by_model.items()}
+        return data
+
+
+# Actieve scopes van de huidige taak (en de taken die ze starten)
+_active_scopes: ContextVar[Tuple[UsageSummary, ...]] = ContextVar("mastermind_usage_scopes", default=())
+
+
+@contextmanager
+def track_usage(endpoint: Optional[str] = None, api_key: Optional[str] = None) -> Iterator[UsageSummary]:
+    """Tel alle LLM calls binnen dit blok op
+
+    Met endpoint worden de totalen bij het verlaten ook per endpoint en API
+    key vingerafdruk naar de metrics geschreven.
+    """
+    summary = UsageSummary()
+    token = _active_scopes.set(_active_scopes.get() + (summary,))
+    try:
+        yield summary
+    finally:
+        _active_scopes.reset(token)
+        if endpoint is not None:
+            key = api_key_id(api_key)
+            ENDPOINT_TOKENS.inc(summary.input_tokens, endpoint=endpoint, api_key=key, direction="input")
+            ENDPOINT_TOKENS.inc(summary.output_tokens, endpoint=endpoint, api_key=key, direction="output")
+            ENDPOINT_TOKENS.inc(summary.cache_write_tokens, endpoint=endpoint, api_key=key, direction="cache_write")
+            ENDPOINT_TOKENS.inc(summary.cache_read_tokens, endpoint=endpoint, api_key=key, direction="cache_read")
+            ENDPOINT_COST.inc(summary.cost_usd, endpoint=endpoint, api_key=key)
+
+
+def record_call(model: str, response: Any, latency_seconds: float, batch: bool = False) -> LLMCall:
+    """Registreer de usage van een Messages API response (batch: via de Batches API)"""
+    usage = getattr(response, "usage", None)
+    input_tokens = _as_int(getattr(usage, "input_tokens", 0))
+    output_tokens = _as_int(getattr(usage, "output_tokens", 0))
+    cache_write_tokens = _as_int(getattr(usage, "cache_creation_input_tokens", 0))
+    cache_read_tokens = _as_int(getattr(usage, "cache_read_input_tokens", 0))
+    cost_usd = estimate_cost(model, input_tokens, output_tokens, cache_write_tokens, cache_read_tokens)
+    call = LLMCall(
+        model=model,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        latency_seconds=latency_seconds,
+        cost_usd=cost_usd * BATCH_DISCOUNT if batch else cost_usd,
+        cache_write_tokens=cache_write_tokens,
+        cache_read_tokens=cache_read_tokens
+    )
+    LLM_TOKENS.inc(input_tokens, model=model, direction="input")
+    LLM_TOKENS.inc(output_tokens, model=model, direction="output")
+    LLM_TOKENS.inc(cache_write_tokens, model=model, direction="cache_write")
+    LLM_TOKENS.inc(cache_read_tokens, model=model, direction="cache_read")
+    LLM_COST.inc(call.cost_usd, model=model)
+    for scope in _active_scopes.get():
+        scope.add(call)
+    logger.debug(
+        "LLM usage %s: %d in (%d cache write, %d cache read), %d out, $%.6f",
+        model, input_tokens, cache_write_tokens, cache_read_tokens, output_tokens, call.cost_usd
+    )
+    return call
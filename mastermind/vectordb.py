@@ -1,88 +1,537 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional, Sequence, Union
+from dataclasses import dataclass
+from datetime import datetime
+import copy
 import logging
+import numpy as np
+from sqlalchemy import delete, func, or_, update
 from sqlalchemy.future import select
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import ColumnElement
 
-from .database import Memory, async_session, get_session
-from .database_protocol import DatabaseEntry
+from .database import Memory, async_session, get_session, write_session
+from .metrics import timed
 
 logger = logging.getLogger(__name__)
 
-class VectorEntry(DatabaseEntry):
-    """Uitgebreide database entry specifiek voor vector opslag"""
+CategoryFilter = Union[str, Sequence[str]]
+
+class VectorEntry:
+    """Compacte vector entry, zoals query_vectors en retrieve_knowledge die teruggeven
+
+    Velden staan in __slots__ in plaats van in een dict per entry. Entries
+    uit de database dragen hun echte rij id en timestamps; extra velden
+    (zoals parent_id en chunk_indices bij chunks) staan in extra. metadata
+    bouwt de oude dict weergave pas op als iemand erom vraagt.
+    """
+    __slots__ = (
+        'id', 'content', 'embedding', 'category', 'importance', 'score',
+        'collection', 'attributes', 'created_at', 'updated_at', 'extra'
+    )
+
     def __init__(
-        self, 
-        content: str, 
-        embedding: Optional[List[float]] = None,
+        self,
+        content: str,
+        embedding: Optional[Sequence[float]] = None,
         category: str = 'default',
         importance: float = 0.5,
+        id: Optional[int] = None,
+        score: Optional[float] = None,
+        collection: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        created_at: Optional[datetime] = None,
+        updated_at: Optional[datetime] = None,
         **kwargs: Any
     ) -> None:
-        meta_data = {
-            'content': str(content),
-            'embedding': embedding,
-            'category': str(category),
-            'importance': float(importance),
-            **kwargs
+        self.content = str(content)
+        self.embedding = embedding
+        self.category = str(category)
+        self.importance = float(importance)
+        self.id = id
+        self.score = score
+        self.collection = collection
+        self.attributes = attributes
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.extra = kwargs or None
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        """Alle velden als dict (een nieuwe dict per aanroep)"""
+        data: Dict[str, Any] = {
+            'content': self.content,
+            'embedding': self.embedding,
+            'category': self.category,
+            'importance': self.importance
         }
-        super().__init__(metadata=meta_data)
+        for name in ('id', 'score', 'collection', 'attributes', 'created_at', 'updated_at'):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def with_score(self, score: float) -> "VectorEntry":
+        """Kopie met een andere score"""
+        entry = copy.copy(self)
+        entry.score = score
+        return entry
+
+    def to_dict(self, include_embedding: bool = False) -> Dict[str, Any]:
+        """JSON-vriendelijke weergave, standaard zonder embedding"""
+        data = self.metadata
+        if not include_embedding:
+            data.pop('embedding')
+        elif self.embedding is not None:
+            data['embedding'] = [float(x) for x in self.embedding]
+        for name in ('created_at', 'updated_at'):
+            if name in data:
+                data[name] = data[name].isoformat()
+        return data
+
+    def __repr__(self) -> str:
+        return f"VectorEntry(id={self.id!r}, score={self.score!r}, content={self.content[:40]!r})"
+
+# Kolommen voor het opbouwen van een VectorEntry, zonder ORM objecten
+_ENTRY_COLUMNS = (
+    Memory.id, Memory.content, Memory.category, Memory.importance, Memory.collection,
+    Memory.attributes, Memory.parent_id, Memory.chunk_index, Memory.created_at, Memory.updated_at
+)
+
+@dataclass
+class EmbeddingBatch:
+    """Kolommen van een reeks rijen met embedding, op volgorde van id"""
+    ids: np.ndarray
+    categories: np.ndarray
+    importance: np.ndarray
+    matrix: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Any]) -> "EmbeddingBatch":
+        return cls(
+            ids=np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows)),
+            categories=np.array([str(row.category) for row in rows]),
+            importance=np.fromiter((row.importance for row in rows), dtype=np.float64, count=len(rows)),
+            matrix=np.vstack([np.frombuffer(row.embedding, dtype=np.float32) for row in rows])
+        )
+
+def _to_blob(embedding: List[float]) -> bytes:
+    """Sla een embedding op als genormaliseerde float32 bytes"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector = vector / norm
+    return vector.tobytes()
+
+def normalize_categories(category: Optional[CategoryFilter]) -> List[str]:
+    """Zet een enkele categorie of een reeks categorieën om naar een lijst"""
+    if category is None:
+        return []
+    if isinstance(category, str):
+        return [category]
+    return [str(c) for c in category]
+
+@dataclass(frozen=True)
+class Glob:
+    """Attribuutfilter op een glob patroon (SQLite GLOB: *, ? en [...], hoofdlettergevoelig)
+
+    Bijvoorbeeld metadata_filter={'path': Glob('src/*.py')}.
+    """
+    pattern: str
+
+def _attribute_predicate(key: str, value: Any) -> ColumnElement[bool]:
+    """Bouw een SQL predicaat voor een sleutel in de JSON attributen kolom"""
+    element = Memory.attributes[key]
+    if isinstance(value, Glob):
+        return element.as_string().op("GLOB")(value.pattern)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return or_(*(_attribute_predicate(key, v) for v in value))
+    if isinstance(value, bool):
+        return element.as_boolean() == value
+    if isinstance(value, int):
+        return element.as_integer() == value
+    if isinstance(value, float):
+        return element.as_float() == value
+    return element.as_string() == str(value)
 
 class VectorDatabase:
-    """Gespecialiseerde vector database met extra functionaliteiten"""
-    
+    """Gespecialiseerde vector database met extra functionaliteiten
+
+    Elke collectie is een eigen partitie van de memories tabel. Filters op
+    collectie, categorie, belang en attributen worden in SQL toegepast
+    voordat er gerankt wordt, zodat een gefilterde zoekopdracht alleen de
+    bijpassende partitie scant.
+    """
+
     def __init__(self, collection_name: Optional[str] = None) -> None:
         self.collection_name = collection_name
-    
-    async def store_vector(self, content: str, embedding: List[float], category: str = 'default', importance: float = 0.5) -> str:
+
+    def _apply_filters(
+        self,
+        query: Select[Any],
+        category: Optional[CategoryFilter] = None,
+        min_importance: float = 0.0,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> Select[Any]:
+        """Pas partitie-, categorie-, belang- en attribuutfilters toe"""
+        if self.collection_name:
+            query = query.filter(Memory.collection == self.collection_name)
+        categories = normalize_categories(category)
+        if len(categories) == 1:
+            query = query.filter(Memory.category == categories[0])
+        elif categories:
+            query = query.filter(Memory.category.in_(categories))
+        if min_importance > 0:
+            query = query.filter(Memory.importance >= min_importance)
+        for key, value in (metadata_filter or {}).items():
+            query = query.filter(_attribute_predicate(key, value))
+        return query
+
+    @timed("db_write")
+    async def store_vector(
+        self,
+        content: str,
+        embedding: List[float],
+        category: str = 'default',
+        importance: float = 0.5,
+        attributes: Optional[Dict[str, Any]] = None
+    ) -> str:
         """Sla een vector op met extra metadata"""
-        async with async_session() as session:
+        async with write_session() as session:
             memory = Memory(
                 content=str(content),
                 category=str(category),
-                importance=float(importance)
+                importance=float(importance),
+                collection=self.collection_name,
+                embedding=_to_blob(embedding),
+                attributes=attributes
             )
             session.add(memory)
             await session.commit()
             return f"Vector opgeslagen met ID: {memory.id}"
 
-    async def query_vectors(self, n_results: int = 5, category: Optional[str] = None, min_importance: float = 0.0) -> List[VectorEntry]:
-        """Zoek vectoren op basis van categorie en belang"""
+    @timed("db_write")
+    async def store_chunked_vector(
+        self,
+        content: str,
+        chunks: Sequence[str],
+        embeddings: Sequence[List[float]],
+        category: str = 'default',
+        importance: float = 0.5,
+        attributes: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Sla lange content op als parent rij met geëmbedde chunks
+
+        De parent bewaart de volledige tekst zonder embedding; elke chunk
+        verwijst er via parent_id naar en wordt afzonderlijk doorzocht.
+        """
+        async with write_session() as session:
+            parent = Memory(
+                content=str(content),
+                category=str(category),
+                importance=float(importance),
+                collection=self.collection_name,
+                attributes={**(attributes or {}), 'chunk_count': len(chunks)}
+            )
+            session.add(parent)
+            await session.flush()
+            session.add_all([
+                Memory(
+                    content=str(chunk),
+                    category=str(category),
+                    importance=float(importance),
+                    collection=self.collection_name,
+                    embedding=_to_blob(embedding),
+                    attributes=attributes,
+                    parent_id=parent.id,
+                    chunk_index=index
+                )
+                for index, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+            ])
+            await session.commit()
+            return f"Vector opgeslagen met ID: {parent.id}"
+
+    @timed("db_query")
+    async def query_vectors(
+        self,
+        n_results: int = 5,
+        category: Optional[CategoryFilter] = None,
+        min_importance: float = 0.0,
+        query_embedding: Optional[List[float]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        max_chunks_per_parent: int = 2,
+        include_embeddings: bool = False
+    ) -> List[VectorEntry]:
+        """Zoek vectoren op basis van categorie en belang
+
+        Zonder query_embedding worden de belangrijkste entries teruggegeven.
+        Met query_embedding worden alleen de embeddings uit de gefilterde
+        partitie geladen en op cosine similarity gerankt; daarna worden
+        enkel de top resultaten volledig opgehaald.
+
+        Chunks worden per parent samengevoegd: een parent scoort als zijn
+        beste chunk en bevat als content alleen de best passende chunks
+        (maximaal max_chunks_per_parent), in volgorde van de brontekst.
+        Met include_embeddings krijgt elke entry de (genormaliseerde)
+        embedding van zijn beste hit mee, bijvoorbeeld voor deduplicatie.
+        """
+        if n_results <= 0:
+            return []
         async with async_session() as session:
-            query = select(Memory)
-            if category:
-                query = query.filter_by(category=category)
-            if min_importance > 0:
-                query = query.filter(Memory.importance >= min_importance)
-            
-            result = await session.execute(query.limit(n_results))
-            memories = result.scalars().all()
-            
-            return [
-                VectorEntry(
-                    content=str(memory.content),
-                    category=str(memory.category),
-                    importance=float(memory.importance)
-                ) for memory in memories
-            ]
+            if query_embedding is None:
+                query = self._apply_filters(
+                    select(*_ENTRY_COLUMNS).filter(Memory.parent_id.is_(None)),
+                    category, min_importance, metadata_filter
+                ).order_by(Memory.importance.desc())
+                result = await session.execute(query.limit(n_results))
+                return [self._to_entry(row) for row in result.all()]
+
+            candidates = await session.execute(
+                self._apply_filters(
+                    select(Memory.id, Memory.parent_id, Memory.embedding)
+                    .filter(Memory.embedding.is_not(None)),
+                    category, min_importance, metadata_filter
+                )
+            )
+            rows = candidates.all()
+            if not rows:
+                return []
+
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_norm = float(np.linalg.norm(query_vector))
+            if query_norm > 0:
+                query_vector = query_vector / query_norm
+            matrix = np.vstack([np.frombuffer(row.embedding, dtype=np.float32) for row in rows])
+            scores = matrix @ query_vector
+
+            groups = self._group_top_hits(rows, scores, n_results, max_chunks_per_parent)
+            hit_ids = [int(rows[i].id) for indices in groups.values() for i in indices]
+            # Alleen de top hits volledig ophalen, als kolommen
+            result = await session.execute(select(*_ENTRY_COLUMNS).filter(Memory.id.in_(hit_ids)))
+            memories = {row.id: row for row in result.all()}
+
+            entries = []
+            for key, indices in groups.items():
+                hits = sorted((memories[int(rows[i].id)] for i in indices),
+                              key=lambda memory: memory.chunk_index or 0)
+                score = float(scores[indices[0]])
+                embedding = matrix[indices[0]].copy() if include_embeddings else None
+                if hits[0].parent_id is None:
+                    entries.append(self._to_entry(hits[0], score=score, embedding=embedding))
+                else:
+                    entries.append(self._to_entry(
+                        hits[0],
+                        score=score,
+                        embedding=embedding,
+                        content="\n\n".join(memory.content for memory in hits),
+                        id=key,
+                        parent_id=key,
+                        chunk_indices=[memory.chunk_index for memory in hits]
+                    ))
+            return entries
+
+    @staticmethod
+    def _group_top_hits(
+        rows: Sequence[Any],
+        scores: np.ndarray,
+        n_results: int,
+        max_chunks_per_parent: int
+    ) -> Dict[int, List[int]]:
+        """Kies de n_results beste parents met hun best scorende chunks
+
+        Geeft parent id -> rij indices (aflopende score). Rankt eerst een
+        begrensde top via argpartition en sorteert alleen alles als daarin
+        te weinig verschillende parents zitten.
+        """
+        keys = [row.parent_id if row.parent_id is not None else row.id for row in rows]
+        limit = min(len(rows), n_results * max(max_chunks_per_parent, 1) * 4)
+        while True:
+            if limit < len(rows):
+                top = np.argpartition(-scores, limit - 1)[:limit]
+                order = top[np.argsort(-scores[top])]
+            else:
+                order = np.argsort(-scores)
+
+            groups: Dict[int, List[int]] = {}
+            for i in order:
+                key = int(keys[i])
+                if key in groups:
+                    if len(groups[key]) < max_chunks_per_parent:
+                        groups[key].append(int(i))
+                elif len(groups) < n_results:
+                    groups[key] = [int(i)]
+            if len(groups) >= n_results or limit >= len(rows):
+                return groups
+            limit = len(rows)
+
+    def _to_entry(
+        self,
+        row: Any,
+        score: Optional[float] = None,
+        content: Optional[str] = None,
+        embedding: Optional[Sequence[float]] = None,
+        **extra: Any
+    ) -> VectorEntry:
+        """Zet een memories rij (kolommen uit _ENTRY_COLUMNS) om naar een VectorEntry"""
+        fields: Dict[str, Any] = {
+            'id': int(row.id),
+            'collection': row.collection,
+            'score': score,
+            'attributes': dict(row.attributes or {}),
+            'created_at': row.created_at,
+            'updated_at': row.updated_at,
+            **extra
+        }
+        return VectorEntry(
+            content=str(row.content if content is None else content),
+            embedding=embedding,
+            category=str(row.category),
+            importance=float(row.importance),
+            **fields
+        )
+
+    async def iter_embedding_batches(
+        self,
+        batch_size: int = 4096,
+        after_id: int = 0,
+        before_id: Optional[int] = None,
+        category: Optional[CategoryFilter] = None
+    ) -> AsyncIterator[EmbeddingBatch]:
+        """Loop in batches over de rijen met embedding (zonder chunks)
+
+        Keyset paginering op id: elke batch is een eigen korte query, zodat
+        nooit de hele embedding matrix tegelijk in het geheugen staat.
+        """
+        last_id = after_id
+        while True:
+            query = self._apply_filters(
+                select(Memory.id, Memory.category, Memory.importance, Memory.embedding)
+                .filter(Memory.parent_id.is_(None), Memory.embedding.is_not(None), Memory.id > last_id),
+                category
+            )
+            if before_id is not None:
+                query = query.filter(Memory.id < before_id)
+            async with async_session() as session:
+                rows = (await session.execute(query.order_by(Memory.id).limit(batch_size))).all()
+            if not rows:
+                return
+            batch = EmbeddingBatch.from_rows(rows)
+            yield batch
+            last_id = int(batch.ids[-1])
+            if len(rows) < batch_size:
+                return
+
+    async def load_embeddings(self, ids: Sequence[int]) -> EmbeddingBatch:
+        """Embeddings, categorie en belang van specifieke rijen"""
+        async with async_session() as session:
+            result = await session.execute(
+                self._apply_filters(
+                    select(Memory.id, Memory.category, Memory.importance, Memory.embedding)
+                    .filter(Memory.id.in_([int(i) for i in ids]), Memory.embedding.is_not(None))
+                ).order_by(Memory.id)
+            )
+            rows = result.all()
+        if not rows:
+            return EmbeddingBatch(
+                ids=np.zeros(0, dtype=np.int64),
+                categories=np.zeros(0, dtype=str),
+                importance=np.zeros(0),
+                matrix=np.zeros((0, 0), dtype=np.float32)
+            )
+        return EmbeddingBatch.from_rows(rows)
+
+    @timed("db_write")
+    async def merge_vectors(
+        self,
+        representative_id: int,
+        member_ids: Sequence[int],
+        importance: float,
+        attributes: Dict[str, Any]
+    ) -> int:
+        """Voeg rijen samen in één representatieve rij
+
+        De representant krijgt het nieuwe belang en de extra attributen, en
+        in merged_ids de ids van alle rijen die hij nu vertegenwoordigt (ook
+        uit eerdere merges). De andere rijen (en hun chunks) worden
+        verwijderd. Geeft het aantal verwijderde rijen.
+        """
+        members = [int(i) for i in member_ids if int(i) != int(representative_id)]
+        async with write_session() as session:
+            representative = await session.get(Memory, int(representative_id))
+            if representative is None:
+                return 0
+            result = await session.execute(
+                select(Memory.id, Memory.attributes).filter(Memory.id.in_(members))
+            )
+            merged_ids = list((representative.attributes or {}).get('merged_ids', []))
+            for row in result.all():
+                merged_ids.append(int(row.id))
+                merged_ids.extend((row.attributes or {}).get('merged_ids', []))
+            representative.importance = float(importance)
+            representative.attributes = {
+                **(representative.attributes or {}),
+                **attributes,
+                'merged_ids': merged_ids,
+                'merged_count': len(merged_ids) + 1
+            }
+            result = await session.execute(
+                delete(Memory).where(or_(Memory.id.in_(members), Memory.parent_id.in_(members)))
+            )
+            await session.commit()
+            return int(result.rowcount or 0)
 
     async def update_importance(self, entry_id: int, new_importance: float) -> bool:
-        """Update de belang score van een vector"""
+        """Update de belang score van een vector (en van zijn chunks)"""
+        async with write_session() as session:
+            result = await session.execute(
+                update(Memory)
+                .where(or_(Memory.id == entry_id, Memory.parent_id == entry_id))
+                .values(importance=float(new_importance))
+            )
+            await session.commit()
+            return bool(result.rowcount)
+
+    @timed("db_query")
+    async def count_by_attribute(self, key: str) -> Dict[str, int]:
+        """Aantal vectoren (zonder chunks) per waarde van een attribuut"""
+        element = Memory.attributes[key].as_string()
         async with async_session() as session:
-            memory = await session.get(Memory, entry_id)
-            if memory:
-                memory.importance = float(new_importance)
-                await session.commit()
-                return True
-            return False
+            result = await session.execute(
+                self._apply_filters(
+                    select(element, func.count()).filter(Memory.parent_id.is_(None), element.is_not(None))
+                ).group_by(element)
+            )
+            return {str(value): int(count) for value, count in result.all()}
+
+    @timed("db_write")
+    async def delete_vectors(self, metadata_filter: Dict[str, Any]) -> int:
+        """Verwijder alle vectoren (en hun chunks) met de gegeven attributen"""
+        async with write_session() as session:
+            result = await session.execute(
+                self._apply_filters(select(Memory.id), metadata_filter=metadata_filter)
+            )
+            ids = [int(row.id) for row in result.all()]
+            if not ids:
+                return 0
+            await session.execute(
+                delete(Memory).where(or_(Memory.id.in_(ids), Memory.parent_id.in_(ids)))
+            )
+            await session.commit()
+            return len(ids)
 
     async def cleanup_vectors(self, min_importance: float = 0.3) -> List[int]:
         """Verwijder laag-belangrijke vectoren"""
-        async with async_session() as session:
-            query = select(Memory).filter(Memory.importance < min_importance)
+        async with write_session() as session:
+            query = self._apply_filters(select(Memory)).filter(Memory.importance < min_importance)
             result = await session.execute(query)
             memories_to_delete = result.scalars().all()
-            
+
             deleted_ids = [int(memory.id) for memory in memories_to_delete]
             for memory in memories_to_delete:
                 await session.delete(memory)
             await session.commit()
-            return deleted_ids
\ No newline at end of file
+            return deleted_ids
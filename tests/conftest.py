@@ -1,4 +1,26 @@
 """Test configuration for Project MasterMind."""
+import os
+import tempfile
+
+import pytest
+
+# Gebruik een tijdelijke database zodat tests memories.db niet aanraken
+os.environ.setdefault(
+    "MASTERMIND_DATABASE_URL",
+    f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'test_memories.db')}"
+)
 
 # Register the asyncio plugin
 pytest_plugins = ['pytest_asyncio']
+
+
+@pytest.fixture
+async def clean_db():
+    """Lege memories tabel in de tijdelijke test database"""
+    from sqlalchemy import delete
+    from mastermind.database import Memory, async_session, init_db
+
+    await init_db()
+    async with async_session() as session:
+        await session.execute(delete(Memory))
+        await session.commit()
@@ -0,0 +1,94 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from anthropic.types import TextBlock
+
+from mastermind.bulk import BulkProcessor, LocalBatchClient, iter_tasks
+from mastermind.core import Orchestrator
+
+
+class EchoMessages:
+    """messages.create dat het laatste content blok herhaalt"""
+    def __init__(self):
+        self.calls = 0
+        self.prompts = []
+
+    def create(self, model, max_tokens, messages, **kwargs):
+        self.calls += 1
+        content = messages[0]["content"]
+        prompt = content if isinstance(content, str) else content[-1]["text"]
+        self.prompts.append(prompt)
+        return SimpleNamespace(
+            content=[TextBlock(type="text", text=f"{model}: {prompt[:60]}")],
+            usage=SimpleNamespace(input_tokens=100, output_tokens=10)
+        )
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FlakyBatchClient(LocalBatchClient):
+    """Stopt de run bij het ophalen van de zoveelste batch"""
+    def __init__(self, client, fail_at):
+        super().__init__(client)
+        self.fail_at = fail_at
+
+    async def results(self, batch_id):
+        if len(self.submitted) == self.fail_at:
+            raise Interrupted(batch_id)
+        return await super().results(batch_id)
+
+
+def _orchestrator(workers=2):
+    orchestrator = Orchestrator(api_key="sk-test")
+    for _ in range(workers):
+        orchestrator.add_worker()
+    return orchestrator
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_stages_are_pipelined_across_tasks_in_batches(tmp_path):
+    client = SimpleNamespace(messages=EchoMessages())
+    batches = LocalBatchClient(client)
+    processor = BulkProcessor(_orchestrator(), batches, str(tmp_path / "ckpt"), max_batch_requests=4)
+
+    report = await processor.run([f"task {i}" for i in range(5)], str(tmp_path / "out.jsonl"))
+
+    results = _lines(tmp_path / "out.jsonl")
+    assert sorted(r["index"] for r in results) == list(range(5))
+    assert all(r["success"] and r["workers"] == {"completed": 2, "failed": 0} for r in results)
+    assert report.usage.calls == client.messages.calls == 5 * 4
+    # Elke batch is zo vol als de stappen toelaten: 20 requests in 6 rondes i.p.v. 15 stappen
+    assert max(batches.submitted) <= 4 and sum(batches.submitted) == 20
+    assert len(batches.submitted) == report.batches == 6
+    # De synthese krijgt de worker resultaten, zoals bij process_task
+    synthesis = [p for p in client.messages.prompts if p.startswith("worker_results:")]
+    assert len(synthesis) == 5
+    assert all("TaskResult(success=True, data='claude-3-haiku: " in p for p in synthesis)
+
+
+@pytest.mark.asyncio
+async def test_interrupted_run_resumes_without_duplicates(tmp_path):
+    tasks = tmp_path / "tasks.jsonl"
+    tasks.write_text("".join(json.dumps({"id": f"job-{i}", "task": f"task {i}"}) + "\n" for i in range(6)))
+    output, checkpoint = tmp_path / "out.jsonl", str(tmp_path / "ckpt")
+    client = SimpleNamespace(messages=EchoMessages())
+
+    with pytest.raises(Interrupted):
+        await BulkProcessor(_orchestrator(), FlakyBatchClient(client, fail_at=4), checkpoint, 5).run(str(tasks), str(output))
+    done_before = _lines(output)
+    assert 0 < len(done_before) < 6
+
+    report = await BulkProcessor(_orchestrator(), LocalBatchClient(client), checkpoint, 5).run(str(tasks), str(output))
+
+    results = _lines(output)
+    assert report.resumed and report.succeeded == 6 - len(done_before)
+    assert sorted(r["id"] for r in results) == [f"job-{i}" for i in range(6)]
+    assert results[:len(done_before)] == done_before
+    assert list(iter_tasks(str(tasks)))[0] == ("job-0", "task 0")
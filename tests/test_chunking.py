@@ -0,0 +1,55 @@
+import pytest
+from mastermind.chunking import TextChunker, estimate_tokens
+from mastermind.embeddings import HashEmbeddingBackend
+from mastermind.knowledge_cluster import KnowledgeCluster
+
+
+def _sentences(count: int) -> str:
+    return " ".join(f"Sentence number {i} talks about topic {i % 7}." for i in range(count))
+
+
+def test_chunks_respect_token_window_and_overlap():
+    text = _sentences(60)
+    chunker = TextChunker(max_tokens=40, overlap_tokens=8)
+    chunks = chunker.chunk(text)
+
+    assert len(chunks) > 1
+    assert all(chunk.token_count <= 40 for chunk in chunks)
+    assert all(text[c.start_char:c.end_char] == c.text for c in chunks)
+    # Opeenvolgende chunks overlappen en dekken samen de hele tekst
+    assert all(b.start_char < a.end_char for a, b in zip(chunks, chunks[1:]))
+    assert chunks[0].start_char == 0 and chunks[-1].end_char == len(text)
+
+
+def test_streaming_fragments_match_whole_text():
+    text = _sentences(30)
+    chunker = TextChunker(max_tokens=25, overlap_tokens=5)
+    fragments = [text[i:i + 13] for i in range(0, len(text), 13)]
+
+    assert [c.text for c in chunker.iter_chunks(fragments)] == [c.text for c in chunker.chunk(text)]
+
+
+def test_short_text_is_a_single_chunk():
+    chunker = TextChunker(max_tokens=50, overlap_tokens=10)
+    assert not chunker.needs_chunking("a short answer")
+    assert [c.text for c in chunker.chunk("  a short answer ")] == ["a short answer"]
+    assert estimate_tokens("a short answer") == 3
+
+
+@pytest.mark.asyncio
+async def test_long_content_is_retrieved_per_parent(clean_db):
+    cluster = KnowledgeCluster(
+        embedding_backend=HashEmbeddingBackend(),
+        chunker=TextChunker(max_tokens=30, overlap_tokens=5)
+    )
+    filler = " ".join("generic filler words here." for _ in range(40))
+    long_text = f"{filler} The zebra migration crosses the river. {filler}"
+    await cluster.store_knowledge(long_text, category="chat_response")
+
+    results = await cluster.retrieve_knowledge("zebra migration river", max_results=3)
+
+    assert len(results) == 1
+    entry = results[0].metadata
+    assert "zebra migration" in entry['content']
+    assert len(entry['content']) < len(long_text)
+    assert entry['id'] == entry['parent_id']
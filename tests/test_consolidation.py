@@ -0,0 +1,64 @@
+import math
+
+import pytest
+from mastermind.consolidation import MemoryConsolidator, combined_importance
+from mastermind.embeddings import HashEmbeddingBackend
+from mastermind.knowledge_cluster import KnowledgeCluster
+
+
+def _angle(degrees):
+    return [math.cos(math.radians(degrees)), math.sin(math.radians(degrees))]
+
+
+async def _ids(db):
+    return [int(i) async for batch in db.iter_embedding_batches() for i in batch.ids]
+
+
+@pytest.fixture
+async def cluster(clean_db):
+    # chunk_size 2 zodat het vergelijken echt over meerdere batches loopt
+    return KnowledgeCluster(
+        embedding_backend=HashEmbeddingBackend(),
+        consolidator=MemoryConsolidator(threshold=0.9, chunk_size=2)
+    )
+
+
+@pytest.mark.asyncio
+async def test_near_duplicates_are_merged_incrementally(cluster):
+    db = cluster.short_term_db
+    for degrees, category in [(0, "chat"), (1, "chat"), (2, "chat"), (90, "chat"), (0, "code")]:
+        await db.store_vector(f"memory at {degrees}", _angle(degrees), category=category, importance=0.5)
+
+    report = (await cluster.consolidate_memories())["short_term_memory"]
+    assert (report.scanned, report.clusters, report.merged) == (5, 1, 2)
+    representative = report.representatives[0]
+    assert len(await _ids(db)) == 3
+
+    [merged] = [e for e in await db.query_vectors(n_results=5) if e.metadata['id'] == representative]
+    assert merged.metadata['importance'] == pytest.approx(combined_importance([0.5, 0.5, 0.5]))
+    assert merged.metadata['attributes']['merged_count'] == 3
+    assert await cluster.verify_cluster(representative)
+
+    # Alleen nieuwe rijen worden vergeleken, en een nieuw duplicaat sluit aan bij de representant
+    await db.store_vector("late duplicate", _angle(1.5), category="chat", importance=0.2)
+    assert not await cluster.verify_cluster(representative)
+    report = (await cluster.consolidate_memories())["short_term_memory"]
+    assert (report.scanned, report.merged) == (1, 1)
+    assert report.representatives == [representative]
+    assert await cluster.verify_cluster(representative)
+    assert (await cluster.consolidate_memories())["short_term_memory"].scanned == 0
+
+
+@pytest.mark.asyncio
+async def test_chained_cluster_keeps_members_far_from_medoid(cluster):
+    db = cluster.short_term_db
+    for degrees in (0, 20, 40, 60):
+        await db.store_vector(f"memory at {degrees}", _angle(degrees), category="chat")
+    ids = await _ids(db)
+
+    representative = await cluster.process_cluster(ids)
+
+    remaining = await _ids(db)
+    assert representative in remaining and len(remaining) == 2
+    assert await cluster.verify_cluster(representative)
+    assert await cluster.process_cluster(remaining) is None
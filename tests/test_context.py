@@ -0,0 +1,42 @@
+from mastermind.chunking import estimate_tokens
+from mastermind.context import ContextBuilder, memory_payload
+from mastermind.vectordb import VectorEntry
+
+
+def _memory(content, score, embedding=None):
+    return VectorEntry(content=content, embedding=embedding, score=score)
+
+
+def test_build_orders_by_score_and_reports_tokens():
+    builder = ContextBuilder(token_budget=200)
+    built = builder.build("what now?", [_memory("low score memory", 0.2), _memory("high score memory", 0.9)])
+
+    assert built.text.splitlines()[0] == "Relevante herinnering: high score memory"
+    assert built.text.endswith("Oorspronkelijke bericht: what now?")
+    assert built.tokens_used == sum(estimate_tokens(block) for block in built.text.split("\n\n"))
+
+
+def test_build_respects_token_budget():
+    long_memory = " ".join(["word"] * 500)
+    builder = ContextBuilder(token_budget=120, min_memory_tokens=16)
+    built = builder.build("question", [_memory(long_memory, 0.9), _memory("small one", 0.5)])
+
+    assert built.tokens_used <= 120
+    assert built.truncated == 1
+    assert built.over_budget_dropped == 1
+    assert [m.metadata['score'] for m in built.memories] == [0.9]
+
+
+def test_build_drops_near_duplicates():
+    builder = ContextBuilder(dedup_threshold=0.95)
+    memories = [
+        _memory("the answer is 42", 0.9, [1.0, 0.0]),
+        _memory("the answer is forty-two", 0.8, [0.99, 0.01]),
+        _memory("unrelated fact", 0.7, [0.0, 1.0]),
+        _memory("The  answer is 42", 0.6),
+    ]
+    built = builder.build("question", memories)
+
+    assert [m.metadata['content'] for m in built.memories] == ["the answer is 42", "unrelated fact"]
+    assert built.duplicates_dropped == 2
+    assert "embedding" not in memory_payload(built.memories[0])
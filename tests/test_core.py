@@ -1,6 +1,9 @@
+import asyncio
+import time
 import pytest
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
-from mastermind.core import ModelType, TaskResult, WorkerAgent, StrategistAgent
+from mastermind.core import ModelType, Orchestrator, TaskBudget, TaskResult, WorkerAgent, StrategistAgent
 from anthropic.types import Message, MessageParam, TextBlock
 
 
@@ -39,7 +42,7 @@ async def test_worker_agent():
     assert result.data == "test response"
     
 @pytest.mark.asyncio
-async def test_strategist_agent():
+async def test_strategist_agent(monkeypatch):
     # Create a mock client
     mock_client = AsyncMock()
 
@@ -47,7 +50,7 @@ async def test_strategist_agent():
     mock_think_result = "1. Decompose task\n2. Strategy details\n3. Challenges\n4. Solution path"
 
     # Mock the `think` method of the agent
-    StrategistAgent.think = AsyncMock(return_value=mock_think_result)
+    monkeypatch.setattr(StrategistAgent, "think", AsyncMock(return_value=mock_think_result))
 
     # Instantiate the StrategistAgent with the mock client
     agent = StrategistAgent(mock_client)
@@ -58,3 +61,58 @@ async def test_strategist_agent():
     # Assertions
     assert result.success, f"Expected success but got error: {result.error}"
     assert result.data == mock_think_result, f"Expected data to be '{mock_think_result}' but got {result.data}"
+
+
+class TimedMessages:
+    """Async messages.create; workers (Haiku) antwoorden na de gegeven vertragingen"""
+    def __init__(self, worker_delays):
+        self.worker_delays = list(worker_delays)
+        self.prompts = []
+
+    async def create(self, model, max_tokens, messages, **kwargs):
+        self.prompts.append((model, str(messages)))
+        if model == ModelType.HAIKU.value:
+            await asyncio.sleep(self.worker_delays.pop(0))
+        return SimpleNamespace(
+            content=[TextBlock(type="text", text=f"answer from {model}")],
+            usage=SimpleNamespace(input_tokens=1000, output_tokens=100)
+        )
+
+
+def _orchestrator(worker_delays):
+    orchestrator = Orchestrator(api_key="sk-test")
+    client = SimpleNamespace(messages=TimedMessages(worker_delays))
+    orchestrator.strategist.client = client
+    for _ in worker_delays:
+        orchestrator.add_worker()
+        orchestrator.workers[-1].client = client
+    return orchestrator, client.messages
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_cancels_stragglers_at_deadline():
+    orchestrator, messages = _orchestrator([0.01, 0.02, 30.0])
+
+    started = time.monotonic()
+    result = await orchestrator.process_task("Plan a release", TaskBudget(deadline_s=0.5, synthesis_share=0.4))
+
+    assert time.monotonic() - started < 1.0
+    assert result.success and result.metadata["partial"]
+    run = result.metadata["run"]
+    assert (run["workers_completed"], run["workers_cancelled"], run["stopped_by"]) == (2, 1, "deadline")
+    synthesis_prompt = messages.prompts[-1][1]
+    assert "Only 2 of 3 worker results arrived" in synthesis_prompt
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_stops_at_cost_budget_and_completes_without_limits():
+    orchestrator, _ = _orchestrator([0.01, 30.0])
+    # De strategie ($0.0045) past binnen het plafond, plus één Haiku worker niet meer
+    result = await orchestrator.process_task("Plan a release", TaskBudget(max_cost_usd=0.0047))
+    assert result.metadata["partial"] and result.metadata["run"]["stopped_by"] == "budget"
+    assert result.metadata["run"]["workers_cancelled"] == 1
+
+    orchestrator, _ = _orchestrator([0.01, 0.01])
+    result = await orchestrator.process_task("Plan a release")
+    assert result.success and not result.metadata["partial"]
+    assert result.metadata["run"]["workers_completed"] == 2
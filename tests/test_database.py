@@ -0,0 +1,54 @@
+import json
+
+import httpx
+import pytest
+from sqlalchemy.exc import SQLAlchemyError
+
+from mastermind.database import iter_memory_pages, iter_memories
+from mastermind.vectordb import VectorDatabase
+
+
+async def _store(count):
+    db = VectorDatabase("short_term_memory")
+    for i in range(count):
+        await db.store_vector(f"memory {i}", [1.0, float(i)], category="chat" if i % 2 else "code")
+    await db.store_chunked_vector("long", ["lo", "ng"], [[1.0, 0.0], [0.0, 1.0]], category="chat")
+
+
+@pytest.mark.asyncio
+async def test_iter_memories_pages_by_id(clean_db):
+    await _store(7)
+
+    pages = [[m.id for m in page] async for page in iter_memory_pages(page_size=3, include_chunks=False)]
+    assert [len(page) for page in pages] == [3, 3, 2]
+    ids = [i for page in pages for i in page]
+    assert ids == sorted(ids)
+
+    chat = [m async for m in iter_memories(category="chat", after_id=ids[2], page_size=2)]
+    assert [m.content for m in chat] == ["memory 3", "memory 5", "long", "lo", "ng"]
+    with pytest.raises(SQLAlchemyError):
+        chat[0].embedding
+    assert [m async for m in iter_memories(include_embeddings=True)][0].embedding is not None
+
+
+@pytest.mark.asyncio
+async def test_memories_endpoint_streams_ndjson_with_cursor(clean_db):
+    from mastermind.server import app
+
+    await _store(5)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        seen, cursor = [], 0
+        while cursor is not None:
+            response = await client.get("/memories", params={"cursor": cursor, "limit": 2})
+            assert response.headers["content-type"] == "application/x-ndjson"
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            cursor = lines[-1]["next_cursor"]
+            seen.extend(lines[:-1])
+
+        code = await client.get("/memories", params={"category": "code"})
+    assert [m["content"] for m in seen] == [f"memory {i}" for i in range(5)] + ["long"]
+    assert seen[0]["created_at"] and "embedding" not in seen[0]
+    assert [json.loads(line).get("content") for line in code.text.splitlines()] == [
+        "memory 0", "memory 2", "memory 4", None
+    ]
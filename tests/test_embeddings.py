@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from mastermind.embeddings import HashEmbeddingBackend, create_embedding_backend
+from mastermind.knowledge_cluster import KnowledgeCluster
+
+
+def test_hash_backend_is_deterministic_and_normalized():
+    backend = HashEmbeddingBackend(dimension=64)
+    first = backend.encode(["hello vector world", ""])
+    second = backend.encode(["hello vector world", ""])
+
+    assert first.shape == (2, 64)
+    assert first.dtype == np.float32
+    assert np.array_equal(first, second)
+    assert np.linalg.norm(first[0]) == pytest.approx(1.0)
+    assert not first[1].any()
+
+
+def test_hash_backend_similarity_follows_word_overlap():
+    backend = HashEmbeddingBackend()
+    query, close, far = backend.encode([
+        "python code generation",
+        "generation of python code",
+        "weather forecast tomorrow",
+    ])
+    assert query @ close > query @ far
+
+
+def test_create_embedding_backend_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        create_embedding_backend("does-not-exist")
+
+
+@pytest.mark.asyncio
+async def test_knowledge_cluster_with_hash_backend(clean_db):
+    cluster = KnowledgeCluster(embedding_backend=HashEmbeddingBackend())
+    await cluster.store_knowledge("sorting a list in python", category="code", importance=0.8)
+    await cluster.store_knowledge("the weather is sunny", category="chat_response")
+
+    results = await cluster.retrieve_knowledge("python list sorting", max_results=1, category="code")
+
+    assert cluster.is_model_loaded
+    assert [r.metadata['content'] for r in results] == ["sorting a list in python"]
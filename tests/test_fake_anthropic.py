@@ -0,0 +1,47 @@
+import anthropic
+import pytest
+from benchmarks.fake_anthropic import FakeAnthropicServer, FakeConfig
+from mastermind.llm import create_message
+from mastermind.usage import track_usage
+
+
+@pytest.mark.asyncio
+async def test_fake_messages_api_works_with_the_sdk():
+    config = FakeConfig(latency_ms=1, jitter_ms=0, tokens_per_s=0, output_tokens=12)
+    with FakeAnthropicServer(config) as fake:
+        client = anthropic.Anthropic(api_key="fake", base_url=fake.url, max_retries=0)
+        with track_usage() as usage:
+            message = await create_message(
+                client, model="claude-3-haiku-20240307", max_tokens=100,
+                messages=[{"role": "user", "content": "hello there"}]
+            )
+        assert message.content[0].text.split() == ["lorem"] * 12
+        assert usage.output_tokens == 12 and usage.input_tokens > 0
+
+        config.error_rate = 1.0
+        with pytest.raises(anthropic.APIStatusError):
+            await create_message(client, model="claude-3-haiku-20240307", max_tokens=10, messages=[])
+        assert fake.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_fake_api_simulates_prompt_caching():
+    config = FakeConfig(latency_ms=1, jitter_ms=0, tokens_per_s=0, output_tokens=1, cache_min_tokens=50)
+    prefix = [
+        {"type": "text", "text": "stable " * 100},
+        {"type": "text", "text": "history " * 100, "cache_control": {"type": "ephemeral"}},
+    ]
+    with FakeAnthropicServer(config) as fake:
+        client = anthropic.Anthropic(api_key="fake", base_url=fake.url, max_retries=0)
+        usages = []
+        for question in ("first question", "second question"):
+            with track_usage() as usage:
+                await create_message(
+                    client, model="claude-3-haiku-20240307", max_tokens=10,
+                    messages=[{"role": "user", "content": prefix + [{"type": "text", "text": question}]}]
+                )
+            usages.append(usage)
+
+    assert usages[0].cache_write_tokens > 0 and usages[0].cache_read_tokens == 0
+    assert usages[1].cache_read_tokens == usages[0].cache_write_tokens
+    assert usages[1].input_tokens == usages[0].input_tokens
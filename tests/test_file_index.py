@@ -0,0 +1,102 @@
+import os
+import pytest
+from sqlalchemy import delete
+from mastermind.database import Memory, async_session
+from mastermind.embeddings import HashEmbeddingBackend
+from mastermind.file_index import FileIndex
+from mastermind.knowledge_cluster import KnowledgeCluster
+from mastermind.mcp import FileSystemProvider, MCPManager
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "database.py").write_text("def init_db():\n    create sqlite tables for memories\n")
+    (tmp_path / "README.md").write_text("Mastermind multi agent orchestrator documentation")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "lib.js").write_text("ignored dependency")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\0\0")
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_scan_is_incremental(clean_db, project):
+    cluster = KnowledgeCluster(embedding_backend=HashEmbeddingBackend())
+    index = FileIndex(cluster, str(project))
+
+    first = await index.scan()
+    assert (first.indexed, first.unchanged) == (2, 0)
+    assert sorted(index.files) == ["README.md", os.path.join("src", "database.py")]
+
+    # Alleen aanraken: geen herindexering, wel een bijgewerkt manifest
+    os.utime(project / "README.md", ns=(1, 1))
+    second = await index.scan()
+    assert (second.indexed, second.unchanged) == (0, 2)
+
+    (project / "README.md").write_text("Totally different readme about deployment")
+    (project / "src" / "database.py").unlink()
+    third = await index.scan()
+    assert (third.indexed, third.unchanged, third.removed) == (1, 0, 1)
+
+    # Een nieuwe index leest het manifest en hoeft niets te doen
+    reloaded = FileIndex(cluster, str(project))
+    assert (await reloaded.scan()).indexed == 0
+    # Het manifest en de lock staan naast de database, niet in het project
+    assert not os.path.dirname(index.manifest_path).startswith(str(project))
+    assert os.path.exists(index.manifest_path)
+    assert not [p for p in os.listdir(project) if p.startswith(".mastermind")]
+
+
+@pytest.mark.asyncio
+async def test_manifest_drift_from_database_is_repaired(clean_db, project):
+    cluster = KnowledgeCluster(embedding_backend=HashEmbeddingBackend())
+    index = FileIndex(cluster, str(project))
+    await index.scan()
+
+    # Lege database (of een andere, zoals na een restore): alles opnieuw
+    async with async_session() as session:
+        await session.execute(delete(Memory))
+        await session.commit()
+    assert (await FileIndex(cluster, str(project)).scan()).indexed == 2
+
+    # Dubbele rijen (snapshot import) en rijen van een onbekend bestand
+    await index.db.store_vector("README.md", [1.0, 0.0], attributes={"path": "README.md"})
+    await index.db.store_vector("gone.md", [1.0, 0.0], attributes={"path": "gone.md"})
+    stats = await FileIndex(cluster, str(project)).scan()
+    assert (stats.indexed, stats.unchanged, stats.removed) == (1, 1, 1)
+    assert await index.db.count_by_attribute("path") == {"README.md": 1, os.path.join("src", "database.py"): 1}
+
+
+@pytest.mark.asyncio
+async def test_search_tool_and_resources(clean_db, project):
+    cluster = KnowledgeCluster(embedding_backend=HashEmbeddingBackend())
+    index = FileIndex(cluster, str(project))
+    await index.scan()
+
+    manager = MCPManager(cluster)
+    provider = FileSystemProvider(index=index)
+    index.add_listener(lambda stats: manager.invalidate(provider.name))
+    await manager.register_provider(provider)
+    await manager.load_providers()
+
+    assert "README.md" in manager.resources
+    results = await manager.use_tool("search_files", query="sqlite tables memories", max_results=1)
+    assert results[0]["path"] == os.path.join("src", "database.py")
+    filtered = await manager.use_tool("search_files", query="sqlite tables memories", pattern="*.md")
+    assert [r["path"] for r in filtered] == ["README.md"]
+
+
+@pytest.mark.asyncio
+async def test_search_pattern_is_applied_before_ranking(clean_db, tmp_path):
+    for i in range(20):
+        (tmp_path / f"note{i:02d}.txt").write_text("sqlite tables for memories " * 3)
+    for i in range(3):
+        (tmp_path / f"doc{i}.md").write_text(f"deployment guide {i} mentions sqlite once")
+    cluster = KnowledgeCluster(embedding_backend=HashEmbeddingBackend())
+    index = FileIndex(cluster, str(tmp_path))
+    await index.scan()
+
+    # De .txt bestanden scoren allemaal beter; toch drie .md treffers
+    results = await index.search("sqlite tables for memories", max_results=3, pattern="*.md")
+    assert sorted(r["path"] for r in results) == ["doc0.md", "doc1.md", "doc2.md"]
+    assert len(await index.search("sqlite tables", max_results=5)) == 5
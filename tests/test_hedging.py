@@ -0,0 +1,122 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import mastermind.llm as llm
+from mastermind.hedging import HedgePolicy
+from mastermind.llm import create_message
+from mastermind.metrics import LLM_HEDGES
+from mastermind.usage import track_usage
+
+
+class SlowMessages:
+    """Async messages.create met een vertraging per call, in volgorde"""
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.started = 0
+        self.cancelled = 0
+
+    async def create(self, model, **kwargs):
+        delay = self.delays[self.started]
+        self.started += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return SimpleNamespace(content=[], usage=None, attempt=self.started)
+
+
+def test_deadline_follows_recent_quantile():
+    policy = HedgePolicy(quantile=0.95, min_samples=20, min_delay=0.0)
+    assert policy.delay("m") is None
+    for i in range(1, 101):
+        policy.observe("m", i / 100)
+    assert policy.delay("m") == pytest.approx(0.95, abs=0.01)
+    assert HedgePolicy(min_samples=20, initial_delay=2.0).delay("m") == 2.0
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_loser_cancelled(monkeypatch):
+    policy = HedgePolicy(min_samples=1, min_delay=0.0, initial_delay=0.05, budget=1.0)
+    monkeypatch.setattr(llm, "hedge_policy", policy)
+    messages = SlowMessages([2.0, 0.01])
+    won = LLM_HEDGES.value(model="hedge-test", outcome="won")
+
+    response = await asyncio.wait_for(
+        create_message(SimpleNamespace(messages=messages), model="hedge-test", hedge=True, max_tokens=10),
+        timeout=1.0
+    )
+
+    assert response.attempt == 2
+    await asyncio.sleep(0)
+    assert messages.cancelled == 1
+    assert LLM_HEDGES.value(model="hedge-test", outcome="won") == won + 1
+
+
+@pytest.mark.asyncio
+async def test_hedges_stay_within_budget(monkeypatch):
+    policy = HedgePolicy(enabled=True, min_samples=1, max_delay=0.01, budget=0.5, burst=1.0)
+    monkeypatch.setattr(llm, "hedge_policy", policy)
+    messages = SlowMessages([0.05] * 20)
+    client = SimpleNamespace(messages=messages)
+
+    for _ in range(8):
+        await create_message(client, model="budget-test", max_tokens=10)
+
+    # De eerste call heeft nog geen metingen; daarna krijgt met budget 0.5
+    # per call elke tweede trage call een hedge
+    assert messages.started == 8 + 4
+    assert LLM_HEDGES.value(model="budget-test", outcome="fired") == 4
+    assert LLM_HEDGES.value(model="budget-test", outcome="budget_exhausted") == 3
+    # Zonder hedging (de standaard) wordt er nooit een tweede call gestart
+    started = messages.started
+    await create_message(client, model="budget-test", hedge=False, max_tokens=10)
+    assert messages.started == started + 1
+
+
+class SyncMessages:
+    """Synchrone messages.create (draait in een executor thread) met usage"""
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.started = 0
+
+    def create(self, model, **kwargs):
+        delay = self.delays[self.started]
+        self.started += 1
+        time.sleep(delay)
+        return SimpleNamespace(content=[], usage=SimpleNamespace(input_tokens=100, output_tokens=10))
+
+
+@pytest.mark.asyncio
+async def test_cancelled_original_is_observed_as_censored_latency(monkeypatch):
+    policy = HedgePolicy(min_samples=1, min_delay=0.0, initial_delay=0.05, budget=1.0)
+    monkeypatch.setattr(llm, "hedge_policy", policy)
+
+    await create_message(SimpleNamespace(messages=SlowMessages([2.0, 0.01])), model="censor-test", hedge=True)
+
+    samples = sorted(policy._latencies["censor-test"])
+    # De snelle hedge plus de afgebroken eerste poging (minstens deadline + hedge)
+    assert len(samples) == 2
+    assert samples[0] < 0.05 and samples[1] >= 0.06
+
+
+@pytest.mark.asyncio
+async def test_usage_of_losing_sync_attempt_is_recorded(monkeypatch):
+    policy = HedgePolicy(min_samples=1, min_delay=0.0, initial_delay=0.05, budget=1.0)
+    monkeypatch.setattr(llm, "hedge_policy", policy)
+    messages = SyncMessages([0.3, 0.01])
+
+    with track_usage() as usage:
+        await create_message(SimpleNamespace(messages=messages), model="claude-3-haiku", hedge=True)
+        assert usage.calls == 1
+        # De thread van de verliezer loopt uit; zijn tokens tellen daarna mee
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if usage.calls == 2:
+                break
+    assert usage.calls == 2 and usage.input_tokens == 200
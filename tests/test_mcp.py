@@ -0,0 +1,362 @@
+import asyncio
+import os
+import stat
+import time
+import pytest
+from mastermind.mcp import MCPManager, MCPProvider, MCPResource, MCPTool
+from mastermind.vectordb import VectorEntry
+
+
+class SlowProvider(MCPProvider):
+    def __init__(self, label: str, delay: float = 0.1):
+        self.label = label
+        self.delay = delay
+        self.loads = 0
+
+    @property
+    def name(self) -> str:
+        return self.label
+
+    async def get_resources(self):
+        self.loads += 1
+        await asyncio.sleep(self.delay)
+        return [MCPResource(name=f"{self.label}_docs", type="text",
+                            content=f"{self.label} deployment guide", metadata={})]
+
+    async def get_tools(self):
+        await asyncio.sleep(self.delay)
+        return [MCPTool(name=f"{self.label}_tool", description="", function=self._tool, parameters={})]
+
+    async def _tool(self) -> str:
+        return self.label
+
+
+class FakeCluster:
+    async def retrieve_knowledge(self, query, max_results=5, **kwargs):
+        return [VectorEntry(content="remembered fact", score=0.9)]
+
+
+@pytest.mark.asyncio
+async def test_providers_load_concurrently_and_are_cached():
+    manager = MCPManager(FakeCluster(), cache_ttl=60)
+    providers = [SlowProvider("alpha"), SlowProvider("beta")]
+    for provider in providers:
+        await manager.register_provider(provider)
+
+    start = time.perf_counter()
+    await manager.load_providers()
+    assert time.perf_counter() - start < 0.35
+    assert set(manager.tools) == {"alpha_tool", "beta_tool"}
+
+    await manager.ensure_fresh()
+    assert [p.loads for p in providers] == [1, 1]
+    assert await manager.use_tool("beta_tool") == "beta"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_refreshes_in_background():
+    manager = MCPManager(FakeCluster(), cache_ttl=60)
+    provider = SlowProvider("alpha", delay=0.05)
+    await manager.register_provider(provider)
+    await manager.load_providers()
+
+    manager.invalidate("alpha")
+    await manager.ensure_fresh()
+    assert provider.loads == 1  # Request wacht niet op de refresh
+    await asyncio.sleep(0.2)
+    assert provider.loads == 2
+
+
+class FailingProvider(SlowProvider):
+    def __init__(self, label: str, failures: int):
+        super().__init__(label, delay=0.0)
+        self.failures = failures
+
+    async def get_resources(self):
+        resources = await super().get_resources()
+        if self.loads <= self.failures:
+            raise ConnectionError("provider down")
+        return resources
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_failed_provider_is_retried_in_background_with_backoff(monkeypatch):
+    import mastermind.mcp as mcp
+    clock = FakeClock()
+    # Alleen de klok van mcp; asyncio blijft de echte gebruiken
+    monkeypatch.setattr(mcp, "time", clock)
+    monkeypatch.setattr(mcp, "RETRY_DELAY", 1.0)
+    manager = MCPManager(FakeCluster(), cache_ttl=60)
+    provider = FailingProvider("alpha", failures=2)
+    await manager.register_provider(provider)
+
+    async def request() -> None:
+        await manager.ensure_fresh()
+        if manager._refresh_task is not None:
+            await manager._refresh_task
+
+    await manager.ensure_fresh()
+    assert provider.loads == 1 and "alpha_tool" not in manager.tools
+    # Binnen de backoff: geen nieuwe poging
+    clock.now += 0.9
+    await request()
+    assert provider.loads == 1
+
+    # Na de backoff op de achtergrond: het request zelf wacht niet
+    clock.now += 0.1
+    await manager.ensure_fresh()
+    assert provider.loads == 1 and manager._refresh_task is not None
+    await manager._refresh_task
+    assert provider.loads == 2 and "alpha_tool" not in manager.tools
+
+    # Tweede mislukking: de backoff verdubbelt naar 2 seconden
+    clock.now += 1.5
+    await request()
+    assert provider.loads == 2
+    clock.now += 0.5
+    await request()
+    assert provider.loads == 3 and "alpha_tool" in manager.tools
+    # Daarna geldt weer de gewone TTL
+    clock.now += 30
+    await request()
+    assert provider.loads == 3
+
+
+@pytest.mark.asyncio
+async def test_close_cancels_background_refresh():
+    manager = MCPManager(FakeCluster(), cache_ttl=60)
+    provider = SlowProvider("alpha", delay=1.0)
+    await manager.register_provider(provider)
+    manager._provider_cache["alpha"].attempted_at = time.monotonic()
+
+    await manager.ensure_fresh()
+    refresh = manager._refresh_task
+    assert refresh is not None and not refresh.done()
+    await asyncio.wait_for(manager.close(), timeout=0.5)
+    assert refresh.cancelled() and manager._refresh_task is None
+
+
+@pytest.mark.asyncio
+async def test_get_context_combines_memories_and_resources():
+    manager = MCPManager(FakeCluster())
+    await manager.register_provider(SlowProvider("alpha", delay=0))
+    await manager.register_provider(SlowProvider("beta", delay=0))
+
+    built = await manager.get_context("how does the beta deployment work?")
+
+    assert "Relevante herinnering: remembered fact" in built.text
+    assert "beta deployment guide" in built.text
+    assert built.text.endswith("Oorspronkelijke bericht: how does the beta deployment work?")
+    assert manager.search_resources("beta deployment")[0].name == "beta_docs"
+
+
+def _executor_with(*tools):
+    from mastermind.tool_executor import ToolExecutor
+    registry = {tool.name: tool for tool in tools}
+    return ToolExecutor(lambda: registry)
+
+
+@pytest.mark.asyncio
+async def test_batch_runs_in_parallel_with_concurrency_limit():
+    from mastermind.tool_executor import ToolCall
+    active = {"now": 0, "peak": 0}
+
+    async def slow(n: int) -> int:
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.05)
+        active["now"] -= 1
+        return n * 2
+
+    executor = _executor_with(MCPTool(name="slow", description="", function=slow,
+                                      parameters={}, max_concurrency=2))
+    start = time.perf_counter()
+    results = await executor.execute_batch([ToolCall("slow", {"n": i}) for i in range(4)])
+
+    assert [r.result for r in results] == [0, 2, 4, 6]
+    assert active["peak"] == 2
+    assert time.perf_counter() - start < 0.18
+    assert max(r.queued_seconds for r in results) > 0.03
+
+
+@pytest.mark.asyncio
+async def test_timeout_and_cancel_on_failure():
+    from mastermind.tool_executor import ToolCall
+
+    async def hang() -> None:
+        await asyncio.sleep(10)
+
+    async def fail() -> None:
+        raise RuntimeError("boom")
+
+    executor = _executor_with(
+        MCPTool(name="hang_briefly", description="", function=hang, parameters={}, timeout=0.05),
+        MCPTool(name="hang", description="", function=hang, parameters={}),
+        MCPTool(name="fail", description="", function=fail, parameters={}),
+    )
+    timed_out = await executor.execute(ToolCall("hang_briefly"))
+    assert not timed_out.success and "timed out" in timed_out.error
+
+    results = await executor.execute_batch([ToolCall("hang"), ToolCall("fail")], cancel_on_failure=True)
+    assert results[0].cancelled
+    assert results[1].error == "boom"
+
+
+@pytest.mark.asyncio
+async def test_sharer_takes_over_when_original_call_is_cancelled():
+    from mastermind.tool_executor import ToolCall
+    calls = {"read": 0}
+
+    async def read(path: str) -> str:
+        calls["read"] += 1
+        await asyncio.sleep(0.05)
+        return f"contents of {path}"
+
+    async def fail() -> None:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    executor = _executor_with(
+        MCPTool(name="read", description="", function=read, parameters={}, pure=True),
+        MCPTool(name="fail", description="", function=fail, parameters={}),
+    )
+    same, other = ToolCall("read", {"path": "a.txt"}), ToolCall("read", {"path": "a.txt"})
+    # Batch A annuleert zijn read; batch B deelt die read en annuleerde niets
+    first, second = await asyncio.gather(
+        executor.execute_batch([same, ToolCall("fail")], cancel_on_failure=True),
+        executor.execute_batch([other], cancel_on_failure=True),
+    )
+
+    assert first[0].cancelled and first[1].error == "boom"
+    assert second[0].success and not second[0].cancelled
+    assert second[0].result == "contents of a.txt"
+    assert calls["read"] == 2
+
+
+@pytest.mark.asyncio
+async def test_read_file_is_memoized_by_mtime(tmp_path):
+    from mastermind.mcp import FileSystemProvider
+    manager = MCPManager(FakeCluster())
+    await manager.register_provider(FileSystemProvider())
+    await manager.load_providers()
+    path = tmp_path / "notes.txt"
+    path.write_text("first")
+
+    assert await manager.use_tool("read_file", path=str(path)) == "first"
+    assert await manager.use_tool("read_file", path=str(path)) == "first"
+    assert [t.cached for t in manager.executor.traces] == [False, True]
+
+    path.write_text("second version")
+    assert await manager.use_tool("read_file", path=str(path)) == "second version"
+
+
+@pytest.mark.asyncio
+async def test_ranged_and_line_window_reads(tmp_path):
+    from mastermind.mcp import FileSystemProvider
+    provider = FileSystemProvider(root=str(tmp_path), mmap_threshold=1024)
+    provider.LINE_CHECKPOINT_INTERVAL = 10
+    path = tmp_path / "big.log"
+    path.write_text("".join(f"line {i}\n" for i in range(500)))
+
+    head = await provider._read_range(str(path), offset=0, length=7)
+    assert head["data"] == "line 0\n" and not head["eof"]
+    tail = await provider._read_range(str(path), offset=path.stat().st_size - 9, length=100)
+    assert tail["data"] == "line 499\n" and tail["eof"]
+
+    window = await provider._read_lines(str(path), start_line=250, max_lines=3)
+    assert window["lines"] == ["line 250", "line 251", "line 252"]
+    assert window["next_line"] == 253
+    again = await provider._read_lines(str(path), start_line=120, max_lines=1)
+    assert again["lines"] == ["line 120"]
+    last = await provider._read_lines(str(path), start_line=498, max_lines=10)
+    assert last["lines"] == ["line 498", "line 499"] and last["eof"]
+
+
+@pytest.mark.asyncio
+async def test_reads_see_appends_despite_stat_cache(tmp_path):
+    from mastermind.mcp import FileSystemProvider
+    manager = MCPManager(FakeCluster())
+    await manager.register_provider(FileSystemProvider(root=str(tmp_path), stat_cache_ttl=60.0))
+    await manager.load_providers()
+    path = tmp_path / "grow.log"
+    path.write_text("12345")
+    await manager.use_tool("list_directory", path=".")
+
+    first = await manager.use_tool("read_range", path=str(path), offset=0, length=100)
+    assert first["data"] == "12345"
+    with open(path, "a") as f:
+        f.write("67890\n")
+    grown = await manager.use_tool("read_range", path=str(path), offset=0, length=100)
+    assert grown["data"] == "1234567890\n" and grown["size"] == 11
+    lines = await manager.use_tool("read_lines", path=str(path), start_line=0, max_lines=5)
+    assert lines["lines"] == ["1234567890"]
+
+
+@pytest.mark.asyncio
+async def test_streaming_and_atomic_chunked_writes(tmp_path):
+    from mastermind.mcp import FileSystemProvider
+    provider = FileSystemProvider(root=str(tmp_path), chunk_size=4)
+    path = tmp_path / "out.txt"
+    await provider._write_file(str(path), "hello streaming world")
+    assert path.read_text() == "hello streaming world"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.txt"]
+
+    blocks = [block async for block in provider.stream_file(str(path))]
+    assert blocks[0] == b"hell" and b"".join(blocks) == b"hello streaming world"
+
+    async def failing_chunks():
+        yield "partial"
+        raise RuntimeError("stream broke")
+
+    with pytest.raises(RuntimeError):
+        await provider.write_chunks(str(path), failing_chunks())
+    assert path.read_text() == "hello streaming world"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.txt"]
+
+
+@pytest.mark.asyncio
+async def test_chunked_writes_keep_file_mode(tmp_path, monkeypatch):
+    from mastermind.mcp import FileSystemProvider
+    provider = FileSystemProvider(root=str(tmp_path))
+    old_umask = os.umask(0o022)
+
+    def no_umask(mask):
+        raise AssertionError("de proces umask mag niet (tijdelijk) veranderen")
+
+    monkeypatch.setattr(os, "umask", no_umask)
+    try:
+        fresh = tmp_path / "fresh.txt"
+        await provider._write_file(str(fresh), "new")
+        assert stat.S_IMODE(fresh.stat().st_mode) == 0o644
+
+        script = tmp_path / "run.sh"
+        script.write_text("echo old")
+        script.chmod(0o755)
+        await provider._write_file(str(script), "echo new")
+        assert stat.S_IMODE(script.stat().st_mode) == 0o755
+    finally:
+        monkeypatch.undo()
+        os.umask(old_umask)
+
+
+@pytest.mark.asyncio
+async def test_list_directory_globs(tmp_path):
+    from mastermind.mcp import FileSystemProvider
+    provider = FileSystemProvider(root=str(tmp_path))
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("x = 1")
+    (tmp_path / "README.md").write_text("docs")
+
+    entries = await provider._list_directory(".", pattern="*.py", recursive=True)
+    assert [e["path"] for e in entries] == ["pkg/a.py"]
+    assert entries[0]["size"] == 5 and not entries[0]["is_dir"]
+    top = await provider._list_directory(".")
+    assert sorted(e["path"] for e in top) == ["README.md", "pkg"]
@@ -0,0 +1,62 @@
+import pytest
+from unittest.mock import MagicMock
+from mastermind.llm import create_message
+from mastermind.metrics import LLM_ERRORS, LLM_SECONDS, STAGE_SECONDS, MetricsRegistry, span, summarize, trace
+
+
+def test_histogram_renders_prometheus_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "Test latency", ("stage",), buckets=(0.1, 1.0))
+    latency.observe(0.05, stage="db")
+    latency.observe(0.5, stage="db")
+    latency.observe(5.0, stage="db")
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{stage="db",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="db",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{stage="db",le="+Inf"} 3' in text
+    assert 'test_seconds_count{stage="db"} 3' in text
+    assert latency.quantile(0.5, stage="db") == 1.0
+    with pytest.raises(ValueError):
+        latency.observe(1.0, model="x")
+
+
+def test_spans_are_collected_per_trace():
+    before = STAGE_SECONDS.count(stage="unit_test")
+    with trace() as spans:
+        with span("unit_test"):
+            pass
+        with span("unit_test"):
+            pass
+    with span("unit_test"):
+        pass
+    assert [stage for stage, _ in spans] == ["unit_test", "unit_test"]
+    assert set(summarize(spans)) == {"unit_test"}
+    assert STAGE_SECONDS.count(stage="unit_test") == before + 3
+
+
+@pytest.mark.asyncio
+async def test_create_message_records_latency_and_errors():
+    client = MagicMock()
+    client.messages.create.return_value = "response"
+    before = LLM_SECONDS.count(model="test-model")
+    assert await create_message(client, model="test-model", max_tokens=10, messages=[]) == "response"
+    assert LLM_SECONDS.count(model="test-model") == before + 1
+
+    client.messages.create.side_effect = RuntimeError("overloaded")
+    with pytest.raises(RuntimeError):
+        await create_message(client, model="test-model", max_tokens=10, messages=[])
+    assert LLM_ERRORS.value(model="test-model", error="RuntimeError") == 1
+
+
+def test_metrics_endpoint():
+    from fastapi.testclient import TestClient
+    from mastermind.server import app
+
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "mastermind_stage_seconds" in response.text
+    # De eerste scrape is zelf ook gemeten
+    assert 'mastermind_http_request_seconds_count{path="/metrics",status="200"}' in TestClient(app).get("/metrics").text
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from mastermind.chunking import estimate_tokens
+from mastermind.context import ContextBuilder
+from mastermind.sessions import Session, SessionStore
+from mastermind.vectordb import VectorEntry
+
+
+def _memory(memory_id, content, embedding):
+    return VectorEntry(content=content, embedding=embedding, id=memory_id, score=0.0)
+
+
+@pytest.mark.asyncio
+async def test_history_is_compacted_into_summary():
+    session = Session("s", history_token_budget=80, summary_token_budget=40)
+    for i in range(20):
+        await session.add_turn("user", f"Question number {i}. " + "filler " * 10)
+        await session.add_turn("assistant", f"Answer number {i}. " + "filler " * 10)
+        assert session.history_tokens <= 80
+
+    assert session.summarized_turns > 0
+    assert "Answer number 19." in session.history_blocks()[-1]
+    assert estimate_tokens(session.summary) <= 40
+
+
+@pytest.mark.asyncio
+async def test_similar_query_reuses_cached_memories():
+    session = Session("s", reuse_threshold=0.9)
+    fetched = []
+
+    async def fetch(embedding):
+        fetched.append(embedding)
+        return [_memory(1, "about cats", [1.0, 0.0]), _memory(2, "about dogs", [0.0, 1.0])]
+
+    first = await session.relevant_memories([1.0, 0.0], fetch, max_results=2)
+    again = await session.relevant_memories([0.99, 0.05], fetch, max_results=2)
+    other = await session.relevant_memories([0.0, 1.0], fetch, max_results=1)
+
+    assert len(fetched) == 2
+    assert session.reused_retrievals == 1
+    assert [m.metadata['content'] for m in first] == ["about cats", "about dogs"]
+    assert again[0].metadata['content'] == "about cats"
+    assert other[0].metadata['content'] == "about dogs"
+    assert other[0].metadata['score'] == pytest.approx(1.0)
+
+
+def test_store_evicts_least_recently_used_and_expired():
+    store = SessionStore(max_sessions=2, ttl_seconds=60)
+    a, b = store.get("a"), store.get("b")
+    store.get("a")
+    store.get("c")
+    assert store.peek("b") is None
+    assert store.peek("a") is a and store.evicted == 1
+
+    a.last_used = time.monotonic() - 120
+    assert store.peek("a") is None
+    assert store.get().id not in ("a", "b", "c")
+    assert b is not store.get("b")
+
+
+def test_pinned_blocks_are_always_included_as_cached_prefix():
+    builder = ContextBuilder(token_budget=60)
+    memory = VectorEntry(content=" ".join(["word"] * 200), score=0.9)
+    built = builder.build("question", [memory], pinned_blocks=["Recente berichten:\nuser: hi"])
+
+    assert built.text.startswith("Recente berichten:\nuser: hi\n\nRelevante herinnering: word")
+    assert built.text.endswith("Oorspronkelijke bericht: question")
+    assert built.tokens_used <= 60
+    content = built.content_blocks()
+    assert [block.get("cache_control") for block in content] == [{"type": "ephemeral"}, None, None]
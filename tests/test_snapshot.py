@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy import delete
+
+import mastermind.snapshot as snapshot
+from mastermind.database import Memory, async_session, engine
+from mastermind.snapshot import MANIFEST, export_snapshot, import_snapshot
+from mastermind.vectordb import VectorDatabase
+
+
+async def _store(db):
+    await db.store_vector("cats purr", [1.0, 0.0, 0.0], category="chat", importance=0.7,
+                          attributes={"source": "test"})
+    await db.store_vector("dogs bark", [0.0, 1.0, 0.0], category="chat")
+    await db.store_chunked_vector("long text. second part.", ["long text.", "second part."],
+                                  [[0.0, 0.0, 1.0], [0.6, 0.8, 0.0]], category="docs")
+
+
+async def _clear():
+    async with async_session() as session:
+        await session.execute(delete(Memory))
+        await session.commit()
+
+
+def _summary(entries):
+    return [(e.id, e.content, e.category, round(e.score, 5), e.importance, e.created_at) for e in entries]
+
+
+@pytest.mark.asyncio
+async def test_export_and_restore_keeps_ids_embeddings_and_results(clean_db, tmp_path):
+    db = VectorDatabase("short_term_memory")
+    await _store(db)
+    await VectorDatabase("other").store_vector("elsewhere", [1.0, 0.0, 0.0])
+    before = _summary(await db.query_vectors(n_results=10, query_embedding=[1.0, 0.1, 0.0]))
+
+    stats = await export_snapshot(str(tmp_path), collections=["short_term_memory"], chunk_rows=2)
+    assert (stats.rows, stats.embeddings, stats.parts) == (5, 4, 3)
+    manifest = json.loads((tmp_path / MANIFEST).read_text())
+    assert [part["rows"] for part in manifest["parts"]] == [2, 2, 1]
+
+    await _clear()
+    restored = await import_snapshot(str(tmp_path), verify=True)
+    assert restored.rows == 5
+    assert _summary(await db.query_vectors(n_results=10, query_embedding=[1.0, 0.1, 0.0])) == before
+    assert await VectorDatabase("other").query_vectors(query_embedding=[1.0, 0.0, 0.0]) == []
+
+
+@pytest.mark.asyncio
+async def test_import_into_populated_db_offsets_ids_and_parents(clean_db, tmp_path):
+    db = VectorDatabase("short_term_memory")
+    await _store(db)
+    await export_snapshot(str(tmp_path))
+
+    await import_snapshot(str(tmp_path))
+    async with async_session() as session:
+        rows = (await session.execute(
+            Memory.__table__.select().order_by(Memory.id)
+        )).all()
+    assert len(rows) == 10
+    by_id = {row.id: row for row in rows}
+    chunks = [row for row in rows if row.parent_id is not None]
+    assert len(chunks) == 4
+    for chunk in chunks:
+        assert by_id[chunk.parent_id].attributes == {"chunk_count": 2}
+    assert len({row.parent_id for row in chunks}) == 2
+
+    # Een onvolledige snapshot (zonder manifest) wordt geweigerd
+    os.unlink(tmp_path / MANIFEST)
+    with pytest.raises(ValueError):
+        await import_snapshot(str(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_export_is_consistent_while_writes_happen_between_pages(clean_db, tmp_path, monkeypatch):
+    db = VectorDatabase("short_term_memory")
+    for i in range(4):
+        await db.store_vector(f"memory {i}", [1.0, float(i)])
+    write_part = snapshot._write_part
+
+    def write_part_then_modify(directory, index, rows, compress):
+        if index == 0:
+            # Andere verbinding: verwijder een rij van de volgende pagina en voeg er een toe
+            with sqlite3.connect(engine.url.database) as other:
+                other.execute("DELETE FROM memories WHERE content = 'memory 3'")
+                other.execute(
+                    "INSERT INTO memories (content, category, collection, importance) "
+                    "VALUES ('late', 'general', 'short_term_memory', 0.5)"
+                )
+        return write_part(directory, index, rows, compress)
+
+    monkeypatch.setattr(snapshot, "_write_part", write_part_then_modify)
+    stats = await export_snapshot(str(tmp_path), chunk_rows=2)
+    assert stats.rows == 4
+
+    await _clear()
+    await import_snapshot(str(tmp_path))
+    async with async_session() as session:
+        contents = (await session.execute(Memory.__table__.select().order_by(Memory.id))).all()
+    assert [row.content for row in contents] == [f"memory {i}" for i in range(4)]
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+
+def _loaded_modules_after(import_statement: str) -> set:
+    code = f"import sys; {import_statement}; print(' '.join(sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return set(output.split())
+
+
+def test_core_import_is_lightweight():
+    loaded = _loaded_modules_after("from mastermind.core import WorkerAgent")
+    assert "mastermind.server" not in loaded
+    assert "sentence_transformers" not in loaded
+    assert "sqlalchemy" not in loaded
+
+
+def test_server_import_does_not_load_embedding_model():
+    loaded = _loaded_modules_after("import mastermind.server")
+    assert "sentence_transformers" not in loaded
+
+
+def test_package_exports_resolve_lazily():
+    import mastermind
+    from mastermind.core import WorkerAgent
+    assert mastermind.WorkerAgent is WorkerAgent
+    assert "WorkerAgent" in dir(mastermind)
@@ -0,0 +1,106 @@
+import pytest
+from types import SimpleNamespace
+from anthropic.types import TextBlock
+from mastermind.core import STRATEGIST_INSTRUCTIONS, Orchestrator
+from mastermind.llm import create_message
+from mastermind.usage import ENDPOINT_TOKENS, api_key_id, estimate_cost, track_usage
+
+
+class FakeMessages:
+    """Synchrone messages.create met vaste usage per model"""
+    def __init__(self):
+        self.calls = []
+        self.requests = []
+
+    def create(self, model, max_tokens, messages, **kwargs):
+        self.calls.append(model)
+        self.requests.append({"model": model, "messages": messages, **kwargs})
+        return SimpleNamespace(
+            content=[TextBlock(type="text", text=f"answer from {model}")],
+            usage=SimpleNamespace(input_tokens=100, output_tokens=20)
+        )
+
+
+def fake_client():
+    return SimpleNamespace(messages=FakeMessages(), api_key="sk-test")
+
+
+def test_cost_uses_longest_model_prefix():
+    assert estimate_cost("claude-3-haiku-20240307", 1_000_000, 0) == 0.25
+    assert estimate_cost("claude-3-opus-20240229", 0, 1_000_000) == 75.0
+    assert estimate_cost("unknown-model", 1000, 1000) == 0.0
+    assert api_key_id("sk-secret").startswith("sha256:") and "secret" not in api_key_id("sk-secret")
+
+
+@pytest.mark.asyncio
+async def test_nested_scopes_and_endpoint_metrics():
+    client = fake_client()
+    key = api_key_id("sk-test")
+    before = ENDPOINT_TOKENS.value(endpoint="/test", api_key=key, direction="input")
+    with track_usage(endpoint="/test", api_key="sk-test") as outer:
+        await create_message(client, model="claude-3-haiku-20240307", max_tokens=10, messages=[])
+        with track_usage() as inner:
+            await create_message(client, model="claude-3-opus-20240229", max_tokens=10, messages=[])
+
+    assert (outer.calls, outer.input_tokens, outer.output_tokens) == (2, 200, 40)
+    assert inner.calls == 1 and set(inner.by_model) == {"claude-3-opus-20240229"}
+    assert outer.to_dict()["by_model"]["claude-3-haiku-20240307"]["calls"] == 1
+    assert ENDPOINT_TOKENS.value(endpoint="/test", api_key=key, direction="input") == before + 200
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_reports_usage_per_run_and_stage():
+    orchestrator = Orchestrator(api_key="sk-test")
+    client = fake_client()
+    orchestrator.client = client
+    orchestrator.strategist.client = client
+    orchestrator.add_worker()
+    orchestrator.add_worker()
+
+    result = await orchestrator.process_task("Plan a release")
+    assert result.success
+    usage = result.metadata["usage"]
+    assert usage["calls"] == 4 and usage["input_tokens"] == 400
+    stages = result.metadata["usage_by_stage"]
+    assert {name: stage["calls"] for name, stage in stages.items()} == {"strategy": 1, "workers": 2, "synthesis": 1}
+    assert orchestrator.strategist.usage.calls == 2
+    assert orchestrator.workers[0].usage.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_tokens_are_tracked_and_priced():
+    client = fake_client()
+    client.messages.create = lambda **kwargs: SimpleNamespace(
+        content=[TextBlock(type="text", text="ok")],
+        usage=SimpleNamespace(
+            input_tokens=100, output_tokens=0,
+            cache_creation_input_tokens=0, cache_read_input_tokens=900
+        )
+    )
+    with track_usage() as usage:
+        await create_message(client, model="claude-3-opus-20240229", max_tokens=10, messages=[])
+
+    assert (usage.cache_read_tokens, usage.prompt_tokens) == (900, 1000)
+    assert usage.to_dict()["cache_hit_ratio"] == 0.9
+    assert usage.cost_usd == pytest.approx(estimate_cost("claude-3-opus", 190, 0))
+    assert estimate_cost("claude-3-opus", 0, 0, cache_write_tokens=1000) == pytest.approx(
+        1.25 * estimate_cost("claude-3-opus", 1000, 0)
+    )
+
+
+@pytest.mark.asyncio
+async def test_strategist_sends_cacheable_prefix_shared_with_synthesis():
+    orchestrator = Orchestrator(api_key="sk-test")
+    client = fake_client()
+    orchestrator.client = client
+    orchestrator.strategist.client = client
+    orchestrator.add_worker()
+
+    await orchestrator.process_task("Plan a release")
+    strategy, _, synthesis = client.messages.requests
+    for request in (strategy, synthesis):
+        assert request["system"] == [
+            {"type": "text", "text": STRATEGIST_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}}
+        ]
+    assert synthesis["messages"][0]["content"][0] == strategy["messages"][0]["content"][0]
+    assert "cache_control" in strategy["messages"][0]["content"][0]
@@ -0,0 +1,69 @@
+import pytest
+from mastermind.vectordb import VectorDatabase
+
+
+@pytest.fixture
+async def vector_db(clean_db):
+    return VectorDatabase(collection_name="test_memory")
+
+
+@pytest.mark.asyncio
+async def test_query_vectors_ranks_by_similarity(vector_db):
+    await vector_db.store_vector("north", [1.0, 0.0], category="code", importance=0.5)
+    await vector_db.store_vector("east", [0.0, 1.0], category="code", importance=0.9)
+
+    results = await vector_db.query_vectors(n_results=1, query_embedding=[0.9, 0.1])
+
+    assert [r.metadata['content'] for r in results] == ["north"]
+    assert results[0].metadata['score'] == pytest.approx(0.9 / (0.82 ** 0.5), rel=1e-5)
+
+
+@pytest.mark.asyncio
+async def test_query_vectors_prefilters_categories(vector_db):
+    await vector_db.store_vector("chat", [1.0, 0.0], category="chat_response")
+    await vector_db.store_vector("code", [0.0, 1.0], category="code")
+    await vector_db.store_vector("docs", [0.7, 0.7], category="docs")
+
+    results = await vector_db.query_vectors(
+        n_results=5, category=["code", "docs"], query_embedding=[1.0, 0.0]
+    )
+
+    assert [r.metadata['content'] for r in results] == ["docs", "code"]
+
+
+@pytest.mark.asyncio
+async def test_query_vectors_metadata_filter_and_collections(vector_db):
+    other_db = VectorDatabase(collection_name="other_memory")
+    await vector_db.store_vector("py", [1.0, 0.0], attributes={"language": "python"})
+    await vector_db.store_vector("rs", [1.0, 0.0], attributes={"language": "rust"})
+    await other_db.store_vector("other", [1.0, 0.0], attributes={"language": "python"})
+
+    results = await vector_db.query_vectors(
+        query_embedding=[1.0, 0.0], metadata_filter={"language": "python"}
+    )
+
+    assert [r.metadata['content'] for r in results] == ["py"]
+    assert results[0].metadata['attributes'] == {"language": "python"}
+
+
+@pytest.mark.asyncio
+async def test_results_are_compact_with_real_ids_and_timestamps(vector_db):
+    await vector_db.store_vector("first", [1.0, 0.0])
+    await vector_db.store_vector("second", [0.9, 0.1])
+
+    results = await vector_db.query_vectors(n_results=2, query_embedding=[1.0, 0.0], include_embeddings=True)
+
+    assert not hasattr(results[0], "__dict__")
+    assert len({r.id for r in results}) == 2 and all(isinstance(r.id, int) for r in results)
+    assert all(r.created_at is not None for r in results)
+    assert results[0].metadata['id'] == results[0].id
+    assert results[0].to_dict()['created_at'] == results[0].created_at.isoformat()
+    assert 'embedding' not in results[0].to_dict()
+
+
+def test_database_entries_get_their_own_id_and_timestamp():
+    from mastermind.database_protocol import DatabaseEntry
+
+    first, second = DatabaseEntry(metadata={}), DatabaseEntry(metadata={})
+    assert first.id != second.id
+    assert first.created_at <= second.created_at
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import numpy as np
+import pytest
+from mastermind.embedding_service import EmbeddingServer, RemoteEmbeddingBackend
+from mastermind.embeddings import HashEmbeddingBackend
+from mastermind.knowledge_cluster import KnowledgeCluster
+
+
+@pytest.mark.asyncio
+async def test_remote_backend_matches_local_and_shares_cache(tmp_path):
+    socket_path = str(tmp_path / "embeddings.sock")
+    local = HashEmbeddingBackend()
+    server = EmbeddingServer(HashEmbeddingBackend(), socket_path, batch_window=0.01)
+    await server.start()
+    try:
+        cluster = KnowledgeCluster(embedding_backend=RemoteEmbeddingBackend(socket_path))
+        texts = [f"worker {i} embeds a sentence" for i in range(8)]
+        # Parallelle requests (zoals van meerdere workers) komen in één batch
+        vectors = await asyncio.gather(*(cluster.get_vector_embedding(t) for t in texts))
+        np.testing.assert_allclose(np.array(vectors), local.encode(texts), rtol=1e-6)
+        assert server.encoded == 8
+
+        await cluster.get_vector_embeddings(texts[:3])
+        assert server.cache_hits == 3 and server.encoded == 8
+        assert server.info()["dimension"] == local.dimension
+    finally:
+        await server.close()
+    assert not os.path.exists(socket_path)
+
+
+def test_server_built_outside_the_loop_serves_requests(tmp_path):
+    # Zoals main(): de server wordt gebouwd voordat asyncio.run een loop start
+    server = EmbeddingServer(HashEmbeddingBackend(), str(tmp_path / "embeddings.sock"))
+    assert server._queue is None
+
+    async def run():
+        await server.start()
+        try:
+            return await server.encode(["built before the loop"])
+        finally:
+            await server.close()
+
+    vectors = asyncio.run(run())
+    np.testing.assert_allclose(vectors, HashEmbeddingBackend().encode(["built before the loop"]), rtol=1e-6)
+
+
+@pytest.mark.asyncio
+async def test_close_disconnects_open_clients(tmp_path):
+    socket_path = str(tmp_path / "embeddings.sock")
+    server = EmbeddingServer(HashEmbeddingBackend(), socket_path)
+    await server.start()
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    await asyncio.sleep(0.01)
+    assert len(server._clients) == 1
+
+    await asyncio.wait_for(server.close(), timeout=1.0)
+    assert server._clients == {}
+    assert await asyncio.wait_for(reader.read(), timeout=1.0) == b""
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_write_lock_uses_lock_file_between_processes(clean_db, monkeypatch):
+    from mastermind import database
+    from mastermind.vectordb import VectorDatabase
+
+    monkeypatch.setattr(database, "WRITE_LOCK", True)
+    db = VectorDatabase(collection_name="locked")
+    await asyncio.gather(*(db.store_vector(f"memory {i}", [1.0, float(i)]) for i in range(5)))
+    assert os.path.exists(database._lock_file_path())
+    assert len(await db.query_vectors(n_results=10)) == 5
+
+
+@pytest.mark.asyncio
+async def test_cancelled_lock_wait_does_not_leak_the_file_lock(clean_db, monkeypatch):
+    import fcntl
+    from mastermind import database
+
+    monkeypatch.setattr(database, "WRITE_LOCK", True)
+    path = database._lock_file_path()
+    # Een ander proces houdt de lock vast
+    other = database._acquire_file_lock(path)
+
+    async def write():
+        async with database.write_lock():
+            pass
+
+    waiter = asyncio.create_task(write())
+    await asyncio.sleep(0.05)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    database._release_file_lock(other)
+
+    # De thread die nog in flock wachtte krijgt de lock en geeft hem meteen terug
+    for _ in range(50):
+        await asyncio.sleep(0.02)
+        fd = os.open(path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            continue
+        finally:
+            os.close(fd)
+        break
+    else:
+        pytest.fail("file lock leaked by the cancelled waiter")
+    async with database.write_lock():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_only_the_leader_consolidates(clean_db, monkeypatch):
+    import fcntl
+    from mastermind import database, server
+
+    monkeypatch.setattr(database, "WRITE_LOCK", True)
+    rounds = []
+
+    async def consolidate():
+        rounds.append(1)
+
+    monkeypatch.setattr(server.knowledge_cluster, "consolidate_memories", consolidate)
+    # Een andere worker is leider
+    path = database._lock_file_path("consolidation")
+    other = os.open(path, os.O_CREAT | os.O_RDWR)
+    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    task = asyncio.create_task(server._consolidate_periodically(0.01))
+    await asyncio.sleep(0.05)
+    assert rounds == []
+    os.close(other)
+    await asyncio.sleep(0.05)
+    assert rounds
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    # Na de shutdown kan een andere worker het overnemen
+    other = os.open(path, os.O_RDWR)
+    try:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    finally:
+        os.close(other)
+
+
+@pytest.mark.asyncio
+async def test_only_one_file_index_scans(clean_db, tmp_path):
+    from mastermind.file_index import FileIndex
+
+    (tmp_path / "notes.md").write_text("shared project notes")
+    cluster = KnowledgeCluster(embedding_backend=HashEmbeddingBackend())
+    leader, follower = FileIndex(cluster, str(tmp_path)), FileIndex(cluster, str(tmp_path))
+    changes = []
+    follower.add_listener(changes.append)
+
+    assert leader._try_lead() and not follower._try_lead()
+    await leader.scan()
+    follower._follow_manifest()
+    assert list(follower.files) == ["notes.md"] and len(changes) == 1
+    await leader.stop_watching()
+    assert follower._try_lead()
+    await follower.stop_watching()